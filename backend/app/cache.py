@@ -0,0 +1,236 @@
+# app/cache.py
+import os
+import copy
+import json
+import re
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+
+from app.concurrency import run_cpu
+
+# Lookup result for "not in memory", since None is the miss value callers see
+_MISSING = object()
+
+def normalize_question(text: str) -> str:
+    """Cache key form of a question: casefolded, punctuation stripped, whitespace collapsed"""
+    text = re.sub(r"[^\w\s&]", " ", text.casefold())
+    return re.sub(r"\s+", " ", text).strip()
+
+class SqliteStore:
+    """
+    Optional on-disk backend for TTLCache. Entries survive restarts and are visible to
+    every process that opens the same file. Values must be JSON serializable.
+    Each process opens its own connection on first use: SQLite connections must not cross
+    a fork, and under a preloading server this object is created before the workers fork.
+    With max_entries/max_bytes set, every write evicts the entries closest to expiry until
+    the namespace fits; a TTLCache hands its own limits to a store that has none.
+    """
+
+    def __init__(self, path: str, namespace: str, max_entries: int = None, max_bytes: int = None):
+        self.path = path
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._writes = 0
+        # Per-process (lock, connection); entries inherited from a parent are never touched
+        self._connections = {}
+        self._connect_lock = threading.Lock()
+
+    def _connection(self) -> tuple:
+        pid = os.getpid()
+        connection = self._connections.get(pid)
+        if connection is None:
+            with self._connect_lock:
+                connection = self._connections.get(pid)
+                if connection is None:
+                    conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                    with conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute(
+                            "CREATE TABLE IF NOT EXISTS cache (namespace TEXT, key TEXT, value TEXT, expires_at REAL, "
+                            "size INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (namespace, key))"
+                        )
+                        # Files written before entries were sized
+                        if "size" not in {row[1] for row in conn.execute("PRAGMA table_info(cache)")}:
+                            conn.execute("ALTER TABLE cache ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                            conn.execute("UPDATE cache SET size = length(value)")
+                    connection = self._connections[pid] = (threading.Lock(), conn)
+        return connection
+
+    def get(self, key: str):
+        """(value, expires_at) of a live entry, or None"""
+        lock, conn = self._connection()
+        with lock:
+            row = conn.execute(
+                "SELECT value, expires_at FROM cache WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key: str, value, expires_at: float):
+        lock, conn = self._connection()
+        with lock, conn:
+            encoded = json.dumps(value)
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (namespace, key, value, expires_at, size) VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, encoded, expires_at, len(encoded)),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if not self.max_entries and not self.max_bytes:
+            return
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE namespace = ?", (self.namespace,)
+        ).fetchone()
+        excess_entries = count - self.max_entries if self.max_entries else 0
+        excess_bytes = total - self.max_bytes if self.max_bytes else 0
+        if excess_entries <= 0 and excess_bytes <= 0:
+            return
+        victims = []
+        for key, size in conn.execute(
+            "SELECT key, size FROM cache WHERE namespace = ? ORDER BY expires_at", (self.namespace,)
+        ):
+            if excess_entries <= 0 and excess_bytes <= 0:
+                break
+            victims.append((self.namespace, key))
+            excess_entries -= 1
+            excess_bytes -= size
+        conn.executemany("DELETE FROM cache WHERE namespace = ? AND key = ?", victims)
+
+    def clear(self):
+        lock, conn = self._connection()
+        with lock, conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry expiry and hit/miss counters.
+    With max_bytes set, entries are also weighed by their JSON size and evicted
+    least-recently-used first until the total fits.
+    An optional SqliteStore is consulted on in-memory misses and written through on set;
+    coroutines use get_async/set_async so that store I/O stays off the event loop.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: float = 3600,
+                 store: SqliteStore = None, max_bytes: int = None):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.store = store
+        if store is not None and not store.max_entries and not store.max_bytes:
+            store.max_entries, store.max_bytes = max_entries, max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = self._load(key, self.store.get(key) if self.store else None)
+        return value
+
+    async def get_async(self, key: str):
+        """get() for coroutines: memory hits are answered inline, store lookups run on the CPU executor"""
+        value = self._lookup(key)
+        if value is _MISSING:
+            value = self._load(key, await run_cpu(self.store.get, key) if self.store else None)
+        return value
+
+    def set(self, key: str, value):
+        value, expires_at = self._set_local(key, value)
+        if self.store:
+            self._persist(key, value, expires_at)
+
+    async def set_async(self, key: str, value):
+        """set() for coroutines; the write-through to the store runs on the CPU executor"""
+        value, expires_at = self._set_local(key, value)
+        if self.store:
+            await run_cpu(self._persist, key, value, expires_at)
+
+    def _lookup(self, key: str):
+        """A copy of the in-memory value for `key`, or _MISSING"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at >= time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                self._remove(key)
+        return _MISSING
+
+    def _load(self, key: str, entry):
+        """Count the outcome of a store lookup and keep a found value in memory until it expires there"""
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            self.hits += 1
+            self._put(key, value, expires_at)
+        return copy.deepcopy(value)
+
+    def _set_local(self, key: str, value) -> tuple:
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._put(key, value, expires_at)
+        return value, expires_at
+
+    def _persist(self, key: str, value, expires_at: float):
+        try:
+            self.store.set(key, value, expires_at)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logging.warning(f"{self.name} cache: failed to persist entry: {e}")
+
+    def _put(self, key: str, value, expires_at: float):
+        size = len(json.dumps(value, default=str)) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            logging.info(f"{self.name} cache: {size} byte entry exceeds the cache budget, not kept in memory")
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, expires_at, size)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or (self.max_bytes and self.bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+        if self.store:
+            self.store.clear()
+        logging.info(f"{self.name} cache cleared")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "persistent": self.store is not None,
+            }
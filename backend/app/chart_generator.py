@@ -1,9 +1,11 @@
 import matplotlib
 matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+import matplotlib.style
+from matplotlib.figure import Figure
 import seaborn as sns
 import pandas as pd
 import numpy as np
+import os
 import base64
 from io import BytesIO
 import logging
@@ -12,16 +14,50 @@ import logging
 MONDELEZ_PALETTE = ["#5F2C56", "#9A3D88", "#D75C9C", "#E884BE", "#78C4D4", "#4CAF50", "#FF9800", "#9C27B0"]
 BENCHMARK_COLOR = "#666666"
 
-def render_chart(chart_spec: dict) -> str:
+# Output encodings and their data URI media types
+CHART_FORMATS = {"png": "image/png", "webp": "image/webp", "svg": "image/svg+xml"}
+# Deployment defaults for requests that don't choose; figures are always 12x7 inches
+CHART_FORMAT = os.getenv("CHART_FORMAT", "png")
+CHART_DPI = int(os.getenv("CHART_DPI", "100"))
+CHART_MIN_DPI, CHART_MAX_DPI = 30, 200
+# Approximate pixel width of thumbnails when a request sets chart_thumbnails
+CHART_THUMBNAIL_WIDTH = int(os.getenv("CHART_THUMBNAIL_WIDTH", "400"))
+FIGURE_SIZE = (12, 7)
+
+_style_applied = False
+
+def apply_chart_style():
+    """Set the chart style and palette once per process; new Figures pick them up from rcParams"""
+    global _style_applied
+    if not _style_applied:
+        matplotlib.style.use('seaborn-v0_8-whitegrid')
+        sns.set_palette(MONDELEZ_PALETTE)
+        _style_applied = True
+
+def chart_output_options(fmt: str = None, dpi: int = None, width: int = None) -> dict:
     """
-    Enhanced chart renderer with multiple chart types and compact layout
+    Normalize requested output settings: unknown formats fall back to CHART_FORMAT, a pixel
+    width is converted to the DPI that produces it, and DPI is clamped to a sane range.
+    """
+    fmt = (fmt or CHART_FORMAT).lower()
+    if fmt not in CHART_FORMATS:
+        fmt = CHART_FORMAT if CHART_FORMAT in CHART_FORMATS else "png"
+    if width:
+        dpi = width / FIGURE_SIZE[0]
+    dpi = int(round(min(max(dpi or CHART_DPI, CHART_MIN_DPI), CHART_MAX_DPI)))
+    return {"format": fmt, "dpi": dpi}
+
+def render_chart(chart_spec: dict, options: dict = None) -> str:
+    """
+    Enhanced chart renderer with multiple chart types and compact layout.
+    Uses standalone Figure objects rather than pyplot, so renders share no global figure state.
+    `options` (see chart_output_options) picks the encoding and resolution; returns a data URI.
     """
     try:
         logging.info(f"Rendering chart with spec keys: {list(chart_spec.keys())}")
         
         # Set compact styling
-        plt.style.use('seaborn-v0_8-whitegrid')
-        sns.set_palette(MONDELEZ_PALETTE)
+        apply_chart_style()
         
         chart_type = chart_spec.get('chart_type', chart_spec.get('type', 'bar'))
         title = chart_spec.get('title', 'Chart')
@@ -38,24 +74,26 @@ def render_chart(chart_spec: dict) -> str:
         logging.info(f"Chart DataFrame columns: {list(df.columns)}")
         
         # Compact figure size for stacked layout
-        fig, ax = plt.subplots(figsize=(12, 7))
+        fig = Figure(figsize=FIGURE_SIZE)
+        ax = fig.add_subplot()
         
         if chart_type == 'combination':
-            return _render_combination_chart(df, benchmark_data, title, fig, ax)
+            fig = _render_combination_chart(df, benchmark_data, title, fig, ax)
         elif chart_type == 'stacked_bar':
-            return _render_stacked_bar_chart(df, benchmark_data, title, fig, ax)
+            fig = _render_stacked_bar_chart(df, benchmark_data, title, fig, ax)
         elif chart_type == 'line':
-            return _render_line_chart(df, benchmark_data, title, fig, ax)
+            fig = _render_line_chart(df, benchmark_data, title, fig, ax)
         elif chart_type == 'pie':
-            return _render_pie_chart(df, title, fig, ax)
+            fig = _render_pie_chart(df, title, fig, ax)
         elif chart_type == 'scatter':
-            return _render_scatter_chart(df, benchmark_data, title, fig, ax)
+            fig = _render_scatter_chart(df, benchmark_data, title, fig, ax)
         elif chart_type == 'box':
-            return _render_box_chart(df, title, fig, ax)
+            fig = _render_box_chart(df, title, fig, ax)
         elif chart_type == 'waterfall':
-            return _render_waterfall_chart(df, title, fig, ax)
+            fig = _render_waterfall_chart(df, title, fig, ax)
         else:
-            return _render_bar_chart(df, benchmark_data, title, fig, ax)
+            fig = _render_bar_chart(df, benchmark_data, title, fig, ax)
+        return _save_chart(fig, options) if fig is not None else None
             
     except Exception as e:
         logging.error(f"Error rendering chart: {e}", exc_info=True)
@@ -92,7 +130,7 @@ def _render_combination_chart(df, benchmark_data, title, fig, ax):
             ax.legend()
     
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in combination chart: {e}")
         return None
@@ -116,7 +154,7 @@ def _render_stacked_bar_chart(df, benchmark_data, title, fig, ax):
         
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in stacked bar chart: {e}")
         return None
@@ -147,7 +185,7 @@ def _render_line_chart(df, benchmark_data, title, fig, ax):
             ax.legend()
         
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in line chart: {e}")
         return None
@@ -172,7 +210,7 @@ def _render_pie_chart(df, title, fig, ax):
                 autotext.set_fontweight('bold')
         
         ax.set_title(title, fontsize=14, fontweight='bold', pad=20)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in pie chart: {e}")
         return None
@@ -196,7 +234,7 @@ def _render_scatter_chart(df, benchmark_data, title, fig, ax):
             ax.plot(df['x'], p(df['x']), "--", alpha=0.8, color=MONDELEZ_PALETTE[1])
         
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in scatter chart: {e}")
         return None
@@ -224,7 +262,7 @@ def _render_box_chart(df, title, fig, ax):
                 patch.set_alpha(0.7)
         
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in box chart: {e}")
         return None
@@ -247,7 +285,7 @@ def _render_waterfall_chart(df, title, fig, ax):
                        f'{value:+.1f}', ha='center', va='bottom', fontweight='bold')
         
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in waterfall chart: {e}")
         return None
@@ -278,7 +316,7 @@ def _render_bar_chart(df, benchmark_data, title, fig, ax):
             ax.legend()
         
         _finalize_chart(fig, ax, title)
-        return _save_chart(fig)
+        return fig
     except Exception as e:
         logging.error(f"Error in bar chart: {e}")
         return None
@@ -294,21 +332,20 @@ def _finalize_chart(fig, ax, title):
         ax.spines['top'].set_visible(False)
         ax.spines['right'].set_visible(False)
         
-        plt.tight_layout()
+        fig.tight_layout()
     except Exception as e:
         logging.error(f"Error finalizing chart: {e}")
 
-def _save_chart(fig):
-    """Save chart to base64 string"""
+def _save_chart(fig, options: dict = None):
+    """Save chart to a base64 data URI in the requested format and resolution"""
     try:
+        options = options or chart_output_options()
         buf = BytesIO()
-        plt.savefig(buf, format='png', dpi=100, bbox_inches='tight', 
+        fig.savefig(buf, format=options['format'], dpi=options['dpi'], bbox_inches='tight', 
                     facecolor='white', edgecolor='none')
         buf.seek(0)
         img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        plt.close(fig)
-        return f"data:image/png;base64,{img_base64}"
+        return f"data:{CHART_FORMATS[options['format']]};base64,{img_base64}"
     except Exception as e:
         logging.error(f"Error saving chart: {e}")
-        plt.close(fig)
         return None
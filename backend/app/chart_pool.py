@@ -0,0 +1,101 @@
+# app/chart_pool.py
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.chart_generator import render_chart, apply_chart_style
+from app.concurrency import run_cpu
+from app.profiling import profiling_active
+
+# Chart rendering processes per web worker; 0 renders on the CPU thread pool instead
+CHART_POOL_WORKERS = int(os.getenv("CHART_POOL_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Seconds one chart may take before the response goes out without it
+CHART_RENDER_TIMEOUT = float(os.getenv("CHART_RENDER_TIMEOUT", "20"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def _init_worker():
+    """Runs once in each pool process: matplotlib/seaborn are imported and styled before the first chart"""
+    apply_chart_style()
+
+def _ready() -> bool:
+    return True
+
+def get_chart_pool() -> ProcessPoolExecutor:
+    """
+    Lazily start the pool in the current process. Workers are spawned rather than forked,
+    so they never inherit the web worker's threads or event loop.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=CHART_POOL_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                logging.info(f"Started chart rendering pool with {CHART_POOL_WORKERS} processes")
+    return _pool
+
+def _reset_pool(broken: ProcessPoolExecutor):
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def _recycle_pool(stuck: ProcessPoolExecutor):
+    """
+    Replace a pool after a render timed out. The hung process is killed along with its
+    siblings (their in-flight renders fail), since an abandoned future never frees its slot.
+    """
+    processes = list((stuck._processes or {}).values())
+    _reset_pool(stuck)
+    for process in processes:
+        process.terminate()
+
+async def warm_chart_pool():
+    """Start every pool process now so the first request doesn't pay for spawning and imports"""
+    if CHART_POOL_WORKERS <= 0:
+        return
+    loop = asyncio.get_running_loop()
+    pool = get_chart_pool()
+    await asyncio.gather(*(loop.run_in_executor(pool, _ready) for _ in range(CHART_POOL_WORKERS)))
+
+def shutdown_chart_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+async def render_chart_async(chart_spec: dict, options: dict = None):
+    """Render one chart spec off the event loop; returns the data URI, or None on failure or timeout"""
+    try:
+        # Profiled requests render in this process, where the sampler can see matplotlib
+        if CHART_POOL_WORKERS <= 0 or profiling_active.get():
+            return await asyncio.wait_for(run_cpu(render_chart, chart_spec, options), CHART_RENDER_TIMEOUT)
+        pool = get_chart_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(pool, render_chart, chart_spec, options), CHART_RENDER_TIMEOUT)
+        except BrokenProcessPool:
+            logging.error("Chart rendering pool crashed, restarting it")
+            _reset_pool(pool)
+            return None
+        except asyncio.TimeoutError:
+            logging.error(f"Chart '{chart_spec.get('title', 'Chart')}' timed out after {CHART_RENDER_TIMEOUT}s, recycling the pool")
+            _recycle_pool(pool)
+            return None
+    except asyncio.TimeoutError:
+        logging.error(f"Chart '{chart_spec.get('title', 'Chart')}' timed out after {CHART_RENDER_TIMEOUT}s")
+        return None
+    except Exception as e:
+        logging.error(f"Chart rendering failed: {e}", exc_info=True)
+        return None
@@ -0,0 +1,233 @@
+# app/chart_specs.py
+import json
+import math
+import logging
+
+from app.chart_generator import MONDELEZ_PALETTE, BENCHMARK_COLOR
+
+VEGA_LITE_SCHEMA = "https://vega.github.io/schema/vega-lite/v5.json"
+SERIES_NAMES = {"Act": "Actual", "rf": "Reforecast", "py": "Prior Year"}
+# Fields the chart prompt uses for numbers; coerced wherever they appear
+NUMERIC_FIELDS = ["value", "Act", "rf", "py", "x", "y", "Revenue", "Volume"]
+CHART_HEIGHT = 350
+
+def _number(value):
+    """Coerce a spec value to a finite float; nulls and junk become 0 like the PNG renderer's prompt asks"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return number if math.isfinite(number) else 0.0
+
+def _clean_rows(rows, numeric=()) -> list:
+    """Keep dict rows with a label, stringify labels and coerce the named numeric fields"""
+    cleaned = []
+    for row in rows or []:
+        if not isinstance(row, dict):
+            continue
+        row = dict(row)
+        if "label" in row:
+            if row["label"] is None:
+                continue
+            row["label"] = str(row["label"])
+        for col in numeric:
+            if col in row:
+                row[col] = _number(row[col])
+        cleaned.append(row)
+    return cleaned
+
+def _numeric_columns(rows) -> list:
+    columns = []
+    for row in rows:
+        for col, value in row.items():
+            if col not in ("label", "category") and col not in columns and isinstance(value, (int, float)) and not isinstance(value, bool):
+                columns.append(col)
+    return columns
+
+def _label_axis():
+    return {"field": "label", "type": "nominal", "sort": None, "title": None, "axis": {"labelAngle": -45}}
+
+def _series_color(series: list):
+    return {
+        "field": "series", "type": "nominal", "title": None, "sort": series,
+        "scale": {"domain": series, "range": MONDELEZ_PALETTE[:len(series)]},
+    }
+
+def _fold(columns: list) -> list:
+    """Long-format transform: one row per (label, series) with human series names"""
+    return [
+        {"fold": columns, "as": ["series_key", "amount"]},
+        {"calculate": " : ".join(f"datum.series_key == {json.dumps(col)} ? {json.dumps(SERIES_NAMES.get(col, col))}"
+                                 for col in columns) + " : datum.series_key", "as": "series"},
+    ]
+
+def _measure_columns(rows) -> list:
+    return [col for col in ("Act", "rf", "py") if any(col in row for row in rows)]
+
+def _series(columns: list) -> list:
+    return [SERIES_NAMES.get(col, col) for col in columns]
+
+def _bar(rows):
+    measures = _measure_columns(rows)
+    if any("value" in row for row in rows):
+        return {"mark": {"type": "bar", "color": MONDELEZ_PALETTE[0]},
+                "encoding": {"x": _label_axis(), "y": {"field": "value", "type": "quantitative", "title": None}}}
+    if measures:
+        return {"transform": _fold(measures), "mark": "bar",
+                "encoding": {"x": _label_axis(), "xOffset": {"field": "series", "sort": _series(measures)},
+                             "y": {"field": "amount", "type": "quantitative", "title": None},
+                             "color": _series_color(_series(measures))}}
+    numeric = _numeric_columns(rows)
+    if not numeric:
+        return None
+    return {"mark": {"type": "bar", "color": MONDELEZ_PALETTE[0]},
+            "encoding": {"x": _label_axis(), "y": {"field": numeric[0], "type": "quantitative", "title": None}}}
+
+def _line(rows):
+    measures = _measure_columns(rows)
+    if any("value" in row for row in rows):
+        return {"mark": {"type": "line", "point": True, "strokeWidth": 3, "color": MONDELEZ_PALETTE[0]},
+                "encoding": {"x": _label_axis(), "y": {"field": "value", "type": "quantitative", "title": None}}}
+    if measures:
+        return {"transform": _fold(measures), "mark": {"type": "line", "point": True, "strokeWidth": 3},
+                "encoding": {"x": _label_axis(), "y": {"field": "amount", "type": "quantitative", "title": None},
+                             "color": _series_color(_series(measures))}}
+    return None
+
+def _combination(rows):
+    if any("Revenue" in row for row in rows) and any("Volume" in row for row in rows):
+        return {"layer": [
+            {"mark": {"type": "bar", "color": MONDELEZ_PALETTE[0], "opacity": 0.8},
+             "encoding": {"x": _label_axis(), "y": {"field": "Revenue", "type": "quantitative", "title": "Revenue (M)"}}},
+            {"mark": {"type": "line", "point": True, "strokeWidth": 3, "color": MONDELEZ_PALETTE[1]},
+             "encoding": {"x": _label_axis(), "y": {"field": "Volume", "type": "quantitative", "title": "Volume (MM Kgs)"}}},
+        ], "resolve": {"scale": {"y": "independent"}}}
+    bars = [col for col in ("Act", "rf") if any(col in row for row in rows)]
+    if not bars:
+        return _bar(rows)
+    layers = [{"transform": _fold(bars), "mark": "bar",
+               "encoding": {"x": _label_axis(), "xOffset": {"field": "series", "sort": _series(bars)},
+                            "y": {"field": "amount", "type": "quantitative", "title": None},
+                            "color": _series_color(_series(bars))}}]
+    if any("py" in row for row in rows):
+        layers.append({"mark": {"type": "line", "point": {"shape": "square"}, "strokeWidth": 3, "color": MONDELEZ_PALETTE[2]},
+                       "encoding": {"x": _label_axis(), "y": {"field": "py", "type": "quantitative", "title": None}}})
+    return {"layer": layers}
+
+def _stacked_bar(rows):
+    numeric = _numeric_columns(rows)
+    if not numeric:
+        return _bar(rows)
+    rows[:] = _clean_rows(rows, numeric)
+    return {"transform": _fold(numeric), "mark": "bar",
+            "encoding": {"x": _label_axis(), "y": {"field": "amount", "type": "quantitative", "stack": "zero", "title": None},
+                         "color": _series_color(_series(numeric))}}
+
+def _pie(rows):
+    rows[:] = [row for row in rows if row.get("value", 0) > 0]
+    if not rows:
+        return None
+    labels = [row["label"] for row in rows]
+    return {"mark": {"type": "arc", "tooltip": True},
+            "encoding": {"theta": {"field": "value", "type": "quantitative", "stack": True},
+                         "color": {"field": "label", "type": "nominal", "title": None, "sort": labels,
+                                   "scale": {"domain": labels, "range": MONDELEZ_PALETTE}}}}
+
+def _scatter(rows):
+    if not all("x" in row and "y" in row for row in rows):
+        return None
+    encoding = {"x": {"field": "x", "type": "quantitative"}, "y": {"field": "y", "type": "quantitative"}}
+    return {"layer": [
+        {"mark": {"type": "point", "filled": True, "size": 100, "color": MONDELEZ_PALETTE[0]},
+         "encoding": {**encoding, "tooltip": [{"field": "label"}, {"field": "x"}, {"field": "y"}]}},
+        {"transform": [{"regression": "y", "on": "x"}],
+         "mark": {"type": "line", "strokeDash": [4, 4], "color": MONDELEZ_PALETTE[1]}, "encoding": encoding},
+    ]}
+
+def _box(rows):
+    # One value per row, so the client computes the quartiles
+    flat = []
+    for row in rows:
+        values = row.get("values")
+        if isinstance(values, str):
+            try:
+                values = json.loads(values)
+            except json.JSONDecodeError:
+                pass
+        values = values if isinstance(values, list) else [values]
+        flat.extend({"category": str(row.get("category")), "value": _number(value)} for value in values)
+    if not flat:
+        return None
+    rows[:] = flat
+    return {"mark": {"type": "boxplot", "color": MONDELEZ_PALETTE[0]},
+            "encoding": {"x": {"field": "category", "type": "nominal", "sort": None, "title": None},
+                         "y": {"field": "value", "type": "quantitative", "title": None}}}
+
+def _waterfall(rows):
+    if not all("value" in row for row in rows):
+        return None
+    running = 0.0
+    for row in rows:
+        row["start"], running = running, running + row["value"]
+        row["end"] = running
+    return {"layer": [
+        {"mark": "bar",
+         "encoding": {"x": _label_axis(), "y": {"field": "start", "type": "quantitative", "title": None},
+                      "y2": {"field": "end"},
+                      "color": {"condition": {"test": "datum.value >= 0", "value": MONDELEZ_PALETTE[0]},
+                                "value": MONDELEZ_PALETTE[2]}}},
+        {"mark": {"type": "text", "dy": -8, "fontWeight": "bold"},
+         "encoding": {"x": _label_axis(), "y": {"field": "end", "type": "quantitative"},
+                      "text": {"field": "value", "format": "+.1f"}}},
+    ]}
+
+BUILDERS = {
+    "bar": _bar, "line": _line, "combination": _combination, "stacked_bar": _stacked_bar,
+    "pie": _pie, "scatter": _scatter, "box": _box, "waterfall": _waterfall,
+}
+
+def _benchmark_layer(benchmark_rows, chart_type: str):
+    field = "Revenue" if chart_type == "combination" and any("Revenue" in row for row in benchmark_rows) else "value"
+    mark = ({"type": "line", "point": True, "strokeDash": [6, 4], "color": BENCHMARK_COLOR, "opacity": 0.7}
+            if chart_type == "line" else {"type": "tick", "thickness": 3, "color": BENCHMARK_COLOR})
+    return {"data": {"values": benchmark_rows}, "mark": mark,
+            "encoding": {"x": _label_axis(), "y": {"field": field, "type": "quantitative", "title": None},
+                         "tooltip": [{"field": "label"}, {"field": field, "title": "Benchmark"}]}}
+
+def to_vega_lite(chart_spec: dict):
+    """
+    Translate one LLM chart spec into a self-contained Vega-Lite v5 spec with cleaned data,
+    covering the same chart types and field conventions as chart_generator.render_chart.
+    Returns None when the spec has nothing drawable.
+    """
+    if not isinstance(chart_spec, dict):
+        return None
+    chart_type = chart_spec.get("chart_type", chart_spec.get("type", "bar"))
+    if chart_type not in BUILDERS:
+        chart_type = "bar"
+    rows = _clean_rows(chart_spec.get("data"), NUMERIC_FIELDS)
+    if not rows:
+        logging.warning("No data provided for chart spec")
+        return None
+    view = BUILDERS[chart_type](rows)
+    if view is None:
+        logging.warning(f"Chart spec of type {chart_type} has no usable fields")
+        return None
+
+    spec = {
+        "$schema": VEGA_LITE_SCHEMA,
+        "title": str(chart_spec.get("title", "Chart")),
+        "width": "container",
+        "height": CHART_HEIGHT,
+        "data": {"values": rows},
+    }
+    benchmark_rows = _clean_rows(chart_spec.get("benchmark_data"), ["value", "Revenue"])
+    if benchmark_rows and chart_type in ("bar", "line", "combination"):
+        resolve = view.pop("resolve", None)
+        layers = view["layer"] if "layer" in view else [view]
+        spec["layer"] = layers + [_benchmark_layer(benchmark_rows, chart_type)]
+        if resolve:
+            spec["resolve"] = resolve
+    else:
+        spec.update(view)
+    return spec
@@ -0,0 +1,67 @@
+# app/chart_store.py
+import os
+import re
+import json
+import base64
+import hashlib
+import tempfile
+
+from app.cache import TTLCache, SqliteStore
+
+# Rendered charts keyed by a hash of their spec. The sqlite file lets any web worker serve
+# a chart URL that another worker rendered; set CHART_CACHE_PATH="" to keep charts in memory only.
+# Each process opens the file on first use, and the accessors below read and write it off the event loop
+CHART_CACHE_PATH = os.getenv("CHART_CACHE_PATH", os.path.join(tempfile.gettempdir(), "marco_charts.sqlite"))
+chart_cache = TTLCache(
+    "chart",
+    max_entries=int(os.getenv("CHART_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("CHART_CACHE_TTL", str(7 * 24 * 3600))),
+    store=SqliteStore(CHART_CACHE_PATH, "chart") if CHART_CACHE_PATH else None,
+    max_bytes=int(os.getenv("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+CHART_URL_PREFIX = "/api/charts/"
+CHART_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+DATA_URI_PATTERN = re.compile(r"^data:([\w/+.-]+);base64,")
+# Cache entries holding the spec and output options a key was rendered from
+RECIPE_PREFIX = "recipe:"
+
+def chart_key(chart_spec: dict, options: dict = None) -> str:
+    """
+    Content address of a chart: identical specs (after key ordering) rendered with the same
+    output options share one image. Without options the key covers the spec alone.
+    """
+    content = [chart_spec, options] if options else chart_spec
+    normalized = json.dumps(content, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(normalized.encode()).hexdigest()[:32]
+
+def chart_url(key: str, fmt: str = "png") -> str:
+    return f"{CHART_URL_PREFIX}{key}.{fmt}"
+
+async def get_chart(key: str):
+    """Cached data URI for a chart key, or None"""
+    return await chart_cache.get_async(key)
+
+async def put_chart(key: str, data_uri: str):
+    await chart_cache.set_async(key, data_uri)
+
+async def put_recipe(key: str, chart_spec: dict, options: dict):
+    """Remember how to render `key`, so its URL can be served even before or after the image is cached"""
+    await chart_cache.set_async(RECIPE_PREFIX + key, {"spec": chart_spec, "options": options})
+
+async def get_recipe(key: str):
+    if not CHART_KEY_PATTERN.match(key):
+        return None
+    return await chart_cache.get_async(RECIPE_PREFIX + key)
+
+def decode_chart(data_uri: str):
+    """(bytes, media type) of a chart data URI, or None if it isn't one"""
+    found = DATA_URI_PATTERN.match(data_uri or "")
+    if not found:
+        return None
+    return base64.b64decode(data_uri[found.end():]), found.group(1)
+
+async def chart_image(key: str):
+    """(bytes, media type) for a cached chart key, or None when the key is malformed or not cached"""
+    if not CHART_KEY_PATTERN.match(key):
+        return None
+    return decode_chart(await chart_cache.get_async(key))
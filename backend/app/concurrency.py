@@ -0,0 +1,86 @@
+# app/concurrency.py
+import os
+import copy
+import time
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from app.metrics import COALESCED
+
+# CPU-bound pandas and prompt-building work runs here so it never blocks the event loop
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4)))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+# Set SINGLE_FLIGHT=0 to let identical concurrent requests each do their own work
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") != "0"
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a blocking function on the CPU executor and await its result"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, functools.partial(func, *args, **kwargs))
+
+class SharedBackoff:
+    """
+    Pause shared by concurrent callers of one rate-limited service: when any caller is
+    told to slow down, every caller waits out the same window before its next attempt.
+    """
+
+    def __init__(self):
+        self.resume_at = 0.0
+
+    def pause(self, seconds: float):
+        self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    async def wait(self):
+        delay = self.resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller starts the work and every
+    caller that arrives before it finishes awaits the same result (or exception). The work
+    runs in its own task, so it carries on while anyone still waits for it and is cancelled
+    once nobody does. Callers get a deep copy of the result unless `copy_result` is False,
+    for results they only read.
+    """
+
+    def __init__(self, name: str, copy_result: bool = True):
+        self.name = name
+        self.copy_result = copy_result
+        self._flights = {}
+
+    async def run(self, key, func, *args, **kwargs):
+        if not SINGLE_FLIGHT:
+            return await func(*args, **kwargs)
+        flight = self._flights.get(key)
+        if flight is not None and flight.task.get_loop() is asyncio.get_running_loop():
+            COALESCED.inc(flight=self.name)
+        else:
+            flight = _Flight(asyncio.ensure_future(func(*args, **kwargs)))
+            self._flights[key] = flight
+            flight.task.add_done_callback(functools.partial(self._finished, key, flight))
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.task.cancel()
+                self._finished(key, flight)
+        return copy.deepcopy(result) if self.copy_result else result
+
+    def _finished(self, key, flight: _Flight, task: asyncio.Task = None):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if task is not None and not task.cancelled():
+            # Marks a failure nobody was left to see as retrieved
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._flights)
@@ -0,0 +1,31 @@
+# app/convert_dataset.py
+"""
+Convert the financials CSV into the memory-mappable Arrow IPC format.
+
+    python -m app.convert_dataset [--source data.csv] [--output data.arrow]
+"""
+import argparse
+import logging
+import os
+import time
+
+from app.dataset import DATA_PATH, BINARY_DATA_PATH, load_financials, write_binary
+
+def convert(source: str = DATA_PATH, output: str = BINARY_DATA_PATH) -> str:
+    started = time.time()
+    df = load_financials(source)
+    write_binary(df, output)
+    logging.info(f"Wrote {len(df)} rows to {output} ({os.path.getsize(output) / 1e6:.2f} MB) "
+                 f"in {time.time() - started:.2f}s")
+    return output
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the financials CSV to an Arrow IPC file")
+    parser.add_argument("--source", default=DATA_PATH, help="CSV extract to convert")
+    parser.add_argument("--output", default=BINARY_DATA_PATH, help="Arrow file to write")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    convert(args.source, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+# app/cube.py
+import logging
+import pandas as pd
+
+from app.indexing import build_index, match
+
+# Dimensions the query planner can filter or group on, and the measures it sums
+CUBE_DIMENSIONS = ["region", "country_text", "brand_text", "leg_cat_text", "market_type_text", "kpi_text", "month"]
+CUBE_MEASURES = ["Act", "rf", "py"]
+# Roll-ups are materialized for at most one slicing dimension, with and without month
+ROLLUP_DIMENSIONS = ["region", "country_text", "brand_text", "leg_cat_text", "market_type_text"]
+
+class CubeLevel:
+    """One materialized grouping set: the summed measures plus inverted indexes over its keys"""
+
+    def __init__(self, dims: tuple, frame: pd.DataFrame):
+        self.dims = frozenset(dims)
+        self.frame = frame
+        self.index = {col: build_index(frame[col], str.lower) for col in dims if col != "month"}
+        self.month_index = build_index(frame["month"], int) if "month" in dims else {}
+
+class AggregateCube:
+    """
+    Pre-aggregated sums of Act/rf/py over the planner's dimensions.
+    The base level groups by every dimension; roll-ups keep kpi_text (and optionally
+    month) plus at most one other dimension, so "total X for Y in month Z" resolves to
+    a single indexed row. query() picks the smallest level that covers the request.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        dims = [col for col in CUBE_DIMENSIONS if col in df.columns]
+        measures = df[CUBE_MEASURES].astype("float64")
+        base = pd.concat([df[dims], measures], axis=1).groupby(dims, observed=True, dropna=False, sort=False)[CUBE_MEASURES].sum().reset_index()
+        grouping_sets = {tuple(dims)}
+        for time_dims in (("kpi_text", "month"), ("kpi_text",)):
+            grouping_sets.add(time_dims)
+            for col in ROLLUP_DIMENSIONS:
+                grouping_sets.add(time_dims + (col,))
+        self.levels = []
+        for level_dims in grouping_sets:
+            level_dims = [col for col in dims if col in level_dims]
+            if set(level_dims) == set(dims):
+                frame = base
+            else:
+                frame = base.groupby(level_dims, observed=True, dropna=False, sort=False)[CUBE_MEASURES].sum().reset_index()
+            self.levels.append(CubeLevel(tuple(level_dims), frame))
+        self.levels.sort(key=lambda level: len(level.frame))
+        logging.info(f"Built aggregate cube: {len(self.levels)} levels, base level {len(base)} rows from {len(df)}")
+
+    def supports(self, filters: dict, group_by=()) -> bool:
+        needed = {col for col, value in filters.items() if value not in (None, "")} | set(group_by)
+        return needed <= set(CUBE_DIMENSIONS)
+
+    def query(self, filters: dict, months=None, group_by=()):
+        """
+        Sum Act/rf/py for the filtered slice, grouped by `group_by`.
+        Returns None when the request needs a dimension the cube doesn't hold.
+        """
+        # A single column name groups by that column, as it does in pandas
+        group_by = [group_by] if isinstance(group_by, str) else list(group_by)
+        filters = {col: value for col, value in filters.items() if value not in (None, "")}
+        if not self.supports(filters, group_by):
+            return None
+        needed = set(filters) | set(group_by) | ({"month"} if months else set())
+        level = next((level for level in self.levels if needed <= level.dims), None)
+        if level is None:
+            return None
+
+        positions = match(level.index, level.month_index, filters, months)
+        if positions is not None and len(positions) == 0:
+            return pd.DataFrame(columns=group_by + CUBE_MEASURES)
+        rows = level.frame if positions is None else level.frame.iloc[positions]
+        if group_by:
+            result = rows.groupby(group_by, observed=True)[CUBE_MEASURES].sum().reset_index()
+        else:
+            result = rows[CUBE_MEASURES].sum().to_frame().T
+        result[CUBE_MEASURES] = result[CUBE_MEASURES].round(2)
+        return result
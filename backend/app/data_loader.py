@@ -1,81 +1,90 @@
-import pandas as pd
 import os
+import pandas as pd
 import json
 import logging
-import time
 import random
-from app.llm_client import call_openai_json  # CHANGED
+import asyncio
+from app.llm_client import call_openai_json_async, stream_openai_json_async
 from app.prompts import build_insight_and_charting_prompt, build_synthesis_prompt, build_simple_answer_prompt
-from app.chart_generator import render_chart
+from app.concurrency import run_cpu, SharedBackoff
+from app.metrics import LLM_RETRIES, FALLBACKS, timed
+from app.llm_gateway import LLMUnavailableError, is_retryable, is_rate_limited, retry_budget
+from app.cube import CUBE_MEASURES
+from app.prompt_encoding import encode_frame
+from app.reduction import AGGREGATE_PROMPTS, reduce_for_prompt
+from app.streaming import TextAnswerExtractor
+from app.dataset import get_dataset
+from app.local_answer import local_simple_answer
 
-DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/synthetic_financials.csv")
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 def _as_str(s: pd.Series) -> pd.Series:
     return s.astype('string')
 
-def _iexact(s: pd.Series, value: str) -> pd.Series:
-    return _as_str(s).str.lower().eq(value.lower())
-
 def _icontains(s: pd.Series, value: str) -> pd.Series:
     return _as_str(s).str.contains(value, case=False, na=False)
 
-def load_financials():
-    if not os.path.exists(DATA_PATH):
-        raise FileNotFoundError(f"Dataset not found at {DATA_PATH}. Please ensure it exists.")
-    df = pd.read_csv(DATA_PATH)
-    return df
-
 def get_dynamic_data(brand_text=None, region=None, country_text=None, kpi_text=None, 
                      leg_cat_text=None, market_type_text=None, months=None, 
-                     bu_text=None, area=None, bsp_text=None, brand_segment_text=None):
-    df = load_financials()
-    mask = pd.Series(True, index=df.index)
-
-    if brand_text:
-        mask &= _iexact(df["brand_text"], brand_text)
-    if region:
-        mask &= _iexact(df["region"], region)
-    if country_text:
-        mask &= _iexact(df["country_text"], country_text)
-    if kpi_text:
-        mask &= _iexact(df["kpi_text"], kpi_text)
-    if leg_cat_text:
-        mask &= _iexact(df["leg_cat_text"], leg_cat_text)
-    if market_type_text:
-        mask &= _iexact(df["market_type_text"], market_type_text)
-    if months:
-        mask &= df["month"].isin(months)
-    if bu_text:
-        mask &= _iexact(df["bu_text"], bu_text)
-    if area:
-        mask &= _iexact(df["area"], area)
-    if bsp_text:
-        mask &= _iexact(df["bsp_text"], bsp_text)
-    if brand_segment_text:
-        mask &= _iexact(df["brand_segment_text"], brand_segment_text)
-
-    result_df = df[mask].copy()
+                     bu_text=None, area=None, bsp_text=None, brand_segment_text=None, dataset=None):
+    if dataset is None:
+        dataset = get_dataset()
+    filters = {
+        "brand_text": brand_text,
+        "region": region,
+        "country_text": country_text,
+        "kpi_text": kpi_text,
+        "leg_cat_text": leg_cat_text,
+        "market_type_text": market_type_text,
+        "bu_text": bu_text,
+        "area": area,
+        "bsp_text": bsp_text,
+        "brand_segment_text": brand_segment_text,
+    }
+    positions = dataset.match(filters, months)
+
+    result_df = dataset.take(positions)
     if result_df.empty:
         logging.warning("Query returned an empty DataFrame. The requested combination of filters may not exist in the dataset.")
     return result_df
 
+def _query_cube(filters: dict, group_by):
+    """Answer a filtered Act/rf/py sum from the dataset's aggregate cube, or None if it can't"""
+    filters = dict(filters)
+    dataset = filters.pop("dataset", None)
+    if dataset is None:
+        dataset = get_dataset()
+    months = filters.pop("months", None)
+    if dataset.cube is None:
+        return None
+    return dataset.cube.query(filters, months=months, group_by=group_by)
+
 def get_aggregated_data(group_by_cols, agg_cols, **filters):
+    if isinstance(group_by_cols, str):
+        group_by_cols = [group_by_cols]
+    if isinstance(agg_cols, dict) and set(agg_cols) <= set(CUBE_MEASURES) and all(func == "sum" for func in agg_cols.values()):
+        result = _query_cube(filters, group_by_cols)
+        if result is not None:
+            return result[list(group_by_cols) + list(agg_cols)]
     df = get_dynamic_data(**filters)
     if df.empty:
         return df
-    grouped_df = df.groupby(group_by_cols).agg(agg_cols).reset_index()
+    grouped_df = df.groupby(group_by_cols, observed=True).agg(agg_cols).reset_index()
     return grouped_df
 
 def get_performance_summary(filters):
-    df = get_dynamic_data(**filters)
-    if df.empty:
-        return df
-    summary = df.groupby(['kpi_text']).agg({
-        'Act': 'sum',
-        'rf': 'sum', 
-        'py': 'sum'
-    }).reset_index()
+    summary = _query_cube(filters, ['kpi_text'])
+    if summary is None:
+        df = get_dynamic_data(**filters)
+        if df.empty:
+            return df
+        summary = df.groupby(['kpi_text'], observed=True).agg({
+            'Act': 'sum',
+            'rf': 'sum', 
+            'py': 'sum'
+        }).reset_index()
+    elif summary.empty:
+        return summary
     summary['vs_rf'] = ((summary['Act'] - summary['rf']) / summary['rf'] * 100).round(2)
     summary['vs_py'] = ((summary['Act'] - summary['py']) / summary['py'] * 100).round(2)
     return summary
@@ -93,120 +102,183 @@ def _render_charts_if_needed(result_obj: dict) -> dict:
     """Pass through - main.py will handle chart rendering"""
     return {"text_answer": result_obj.get("text_answer", ""), "charts": result_obj.get("charts", [])}
 
-def call_llm_with_retry(prompt, max_retries=3):
-    """Call LLM with exponential backoff retry for 503 errors and enhanced error handling"""
+# Comprehensive-analysis batches sent to the LLM at the same time
+LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", "8"))
+
+def _check_llm_response(response):
+    # Check if response is valid
+    if response is None:
+        raise Exception("API returned None response")
+    if not isinstance(response, str) or len(response.strip()) == 0:
+        raise Exception("API returned empty or invalid response")
+
+def _retry_delay(error, attempt, max_retries):
+    """
+    Seconds to wait before the next attempt, or None when the error should not be retried.
+    Every retry is drawn from the budget shared by all requests, so an outage can't multiply load.
+    """
+    if is_retryable(error) and attempt < max_retries - 1 and retry_budget.try_withdraw():
+        return (2 ** attempt) + random.uniform(0, 1)
+    return None
+
+async def call_llm_with_retry_async(prompt, max_retries=3, backoff: SharedBackoff = None):
+    """
+    Call the LLM with exponential backoff on retryable errors (503s, rate limits), returning
+    None once the attempts or the shared retry budget run out. Concurrent callers passing
+    the same `backoff` all pause when any of them is rate limited.
+    """
+    retry_budget.deposit()
     for attempt in range(max_retries):
         try:
+            if backoff is not None:
+                await backoff.wait()
             logging.info(f"LLM API call attempt {attempt + 1}")
-            response = call_openai_json(prompt)
-            
-            # Check if response is valid
-            if response is None:
-                raise Exception("API returned None response")
-            
-            if not isinstance(response, str) or len(response.strip()) == 0:
-                raise Exception("API returned empty or invalid response")
-            
+            response = await call_openai_json_async(prompt)
+            _check_llm_response(response)
             logging.info(f"LLM API call successful on attempt {attempt + 1}")
             return response
-            
+
         except Exception as e:
-            error_msg = str(e).lower()
             logging.warning(f"API call attempt {attempt + 1} failed: {e}")
-            
-            # Check for specific retry conditions
-            should_retry = any(keyword in error_msg for keyword in [
-                '503', 'overloaded', 'unavailable', 'timeout', 'connection', 'rate limit'
-            ])
-            
-            if should_retry and attempt < max_retries - 1:
-                wait_time = (2 ** attempt) + random.uniform(0, 1)
-                logging.warning(f"Retrying in {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
-                continue
-            else:
+            wait_time = _retry_delay(e, attempt, max_retries)
+            if wait_time is None:
                 logging.error(f"All retry attempts failed. Final error: {e}")
                 break
+            logging.warning(f"Retrying in {wait_time:.1f}s... (attempt {attempt + 1}/{max_retries})")
+            LLM_RETRIES.inc(reason="rate_limit" if is_rate_limited(e) else "transient")
+            if backoff is not None and is_rate_limited(e):
+                backoff.pause(wait_time)
+                continue
+            await asyncio.sleep(wait_time)
+
+    return None
+
+async def stream_llm_with_retry_async(prompt, on_text, max_retries=3):
+    """
+    Stream the LLM response, passing each new piece of its text_answer to `await on_text(delta)`.
+    Falls back to call_llm_with_retry_async if the stream fails before any text was sent.
+    """
+    extractor = TextAnswerExtractor()
+    chunks = []
+    sent_text = False
+    try:
+        async for chunk in stream_openai_json_async(prompt):
+            chunks.append(chunk)
+            delta = extractor.feed(chunk)
+            if delta:
+                sent_text = True
+                await on_text(delta)
+        response = "".join(chunks)
+        _check_llm_response(response)
+        return response
+    except Exception as e:
+        logging.warning(f"Streaming LLM call failed: {e}")
+        FALLBACKS.inc(reason="stream_failed")
+        if sent_text or isinstance(e, LLMUnavailableError) or not retry_budget.try_withdraw():
+            return None
+        return await call_llm_with_retry_async(prompt, max_retries)
+
+def _build_simple_answer_request(user_question: str, df: pd.DataFrame, filters: dict):
+    """Pre-aggregate data for quick facts; returns (summary_df, prompt)"""
+    summary_df = _query_cube(filters, ['brand_text', 'kpi_text']) if filters is not None else None
+    if summary_df is not None:
+        pass
+    elif 'brand_text' in df.columns and 'Act' in df.columns:
+        # Group by brand and KPI for brand-specific questions
+        summary_df = df.groupby(['brand_text', 'kpi_text'], observed=True).agg({
+            'Act': 'sum',
+            'rf': 'sum',
+            'py': 'sum'
+        }).reset_index()
+    elif 'kpi_text' in df.columns and 'Act' in df.columns:
+        # Group by KPI only
+        summary_df = df.groupby(['kpi_text'], observed=True).agg({
+            'Act': 'sum',
+            'rf': 'sum',
+            'py': 'sum'
+        }).reset_index()
+    else:
+        # Fallback - use raw data sample
+        summary_df = df.head(10)
+    
+    # Convert to simple JSON for LLM
+    summary_json = summary_df.to_json(orient='records')
     
-    return None  # Explicitly return None if all attempts failed
+    # Simple prompt for direct answers
+    return summary_df, build_simple_answer_prompt(user_question, summary_json)
 
-def simple_fact_answer(user_question: str, df: pd.DataFrame):
+@timed("parse")
+def _parse_simple_answer(llm_response_str, summary_df: pd.DataFrame):
+    if not llm_response_str:
+        # Fallback to basic summary
+        if 'Act' in summary_df.columns:
+            total_value = summary_df['Act'].sum()
+            return {
+                "text_answer": f"Based on available data, the total value is {total_value:,.2f}M.",
+                "charts": [],
+                "degraded": True
+            }
+        else:
+            return {"text_answer": "Unable to provide a specific answer with available data.", "charts": [], "degraded": True}
+    
+    # Parse JSON response
+    result = json.loads(llm_response_str)
+    result = _render_charts_if_needed(result)
+    
+    logging.info("Simple fact answer generated successfully")
+    return result
+
+def _simple_answer_failure(df: pd.DataFrame, e: Exception):
+    if isinstance(e, json.JSONDecodeError):
+        logging.error(f"JSON parsing error in simple answer: {e}")
+        return {"text_answer": "Answer generated but formatting failed. Please try again.", "charts": [], "degraded": True}
+    logging.error(f"Simple fact answer generation failed: {e}")
+    # Final fallback
+    if 'Act' in df.columns:
+        total_value = df['Act'].sum()
+        return {
+            "text_answer": f"Based on the available data, the total value is approximately {total_value:,.2f}M.",
+            "charts": [],
+            "degraded": True
+        }
+    return {"text_answer": "I'm unable to provide a specific answer with the available data.", "charts": [], "degraded": True}
+
+async def simple_fact_answer_async(user_question: str, df: pd.DataFrame, filters: dict = None):
     """
-    Generate simple, direct answers for factual questions
+    Generate simple, direct answers for factual questions.
+    When the filters that produced `df` are passed, the summary comes from the aggregate cube.
     """
     if df.empty:
         return {"text_answer": "No data found for your query.", "charts": []}
-    
+
     logging.info(f"Generating simple answer for: {user_question}")
-    
-    # Pre-aggregate data for quick facts
+
+    # Template answers straight from the cube skip the LLM round trip entirely
+    if filters is not None:
+        local_result = await run_cpu(local_simple_answer, user_question, filters)
+        if local_result:
+            return local_result
+
     try:
-        if 'brand_text' in df.columns and 'Act' in df.columns:
-            # Group by brand and KPI for brand-specific questions
-            summary_df = df.groupby(['brand_text', 'kpi_text']).agg({
-                'Act': 'sum',
-                'rf': 'sum',
-                'py': 'sum'
-            }).reset_index()
-        elif 'kpi_text' in df.columns and 'Act' in df.columns:
-            # Group by KPI only
-            summary_df = df.groupby(['kpi_text']).agg({
-                'Act': 'sum',
-                'rf': 'sum',
-                'py': 'sum'
-            }).reset_index()
-        else:
-            # Fallback - use raw data sample
-            summary_df = df.head(10)
-        
-        # Convert to simple JSON for LLM
-        summary_json = summary_df.to_json(orient='records')
-        
-        # Simple prompt for direct answers
-        simple_prompt = build_simple_answer_prompt(user_question, summary_json)
-        
-        # Use retry logic for API calls
-        llm_response_str = call_llm_with_retry(simple_prompt)
-        
-        if not llm_response_str:
-            # Fallback to basic summary
-            if 'Act' in summary_df.columns:
-                total_value = summary_df['Act'].sum()
-                return {
-                    "text_answer": f"Based on available data, the total value is {total_value:,.2f}M.",
-                    "charts": []
-                }
-            else:
-                return {"text_answer": "Unable to provide a specific answer with available data.", "charts": []}
-        
-        # Parse JSON response
-        result = json.loads(llm_response_str)
-        result = _render_charts_if_needed(result)
-        
-        logging.info("Simple fact answer generated successfully")
-        return result
-        
-    except json.JSONDecodeError as e:
-        logging.error(f"JSON parsing error in simple answer: {e}")
-        return {"text_answer": "Answer generated but formatting failed. Please try again.", "charts": []}
+        summary_df, simple_prompt = await run_cpu(_build_simple_answer_request, user_question, df, filters)
+        llm_response_str = await call_llm_with_retry_async(simple_prompt)
+        return _parse_simple_answer(llm_response_str, summary_df)
     except Exception as e:
-        logging.error(f"Simple fact answer generation failed: {e}")
-        # Final fallback
-        if 'Act' in df.columns:
-            total_value = df['Act'].sum()
-            return {
-                "text_answer": f"Based on the available data, the total value is approximately {total_value:,.2f}M.",
-                "charts": []
-            }
-        return {"text_answer": "I'm unable to provide a specific answer with the available data.", "charts": []}
+        return _simple_answer_failure(df, e)
+
+def aggregated_data_block(user_question: str, df: pd.DataFrame, query_plan: dict = None) -> str:
+    """Prompt data block of exact aggregates at the granularity the question needs"""
+    reduced = reduce_for_prompt(df, user_question, query_plan)
+    return (f"Aggregated from {len(df)} rows. Total rows are exact sums over all of them; "
+            f"vs_rf/vs_py are Act minus rf/py and *_pct the same as a percentage.\n"
+            + encode_frame(reduced, user_question, query_plan=query_plan))
+
+def _build_analysis_prompt(user_question: str, df: pd.DataFrame, query_plan: dict = None):
+    if AGGREGATE_PROMPTS:
+        prompt = build_insight_and_charting_prompt(user_question, aggregated_data_block(user_question, df, query_plan))
+        logging.info(f"Prompt length: {len(prompt)} characters")
+        return prompt
 
-def optimized_single_analysis(user_question: str, df: pd.DataFrame):
-    """Optimized analysis for datasets under 1000 rows - designed for your 750-row dataset"""
-    if df.empty:
-        return {"text_answer": "No data available for analysis.", "charts": []}
-    
-    logging.info(f"Starting optimized single analysis for {len(df)} rows")
-    
     # Determine sampling strategy based on query type
     is_complex_query = any(word in user_question.lower() for word in [
         'dashboard', 'top', 'bottom', 'rank', 'compare all', 'benchmark', 'vs', 'summarize', 'total market'
@@ -228,134 +300,181 @@ def optimized_single_analysis(user_question: str, df: pd.DataFrame):
         logging.info(f"Using {len(sample_df)} representative rows from {len(df)} total rows")
         df = sample_df
     
-    # Convert to JSON for LLM
+    # Compact CSV encoding for the LLM
+    data_block = encode_frame(df, user_question, query_plan=query_plan)
+    prompt = build_insight_and_charting_prompt(user_question, data_block)
+    
+    # Add debug logging
+    logging.info(f"Prompt length: {len(prompt)} characters")
+    return prompt
+
+@timed("parse")
+def _parse_analysis_response(llm_response_str):
+    # Check if LLM response is None or empty
+    if not llm_response_str:
+        logging.error("LLM returned None or empty response")
+        return {"text_answer": "Unable to process request due to service issues. Please try a simpler query or try again later.", "charts": [], "degraded": True}
+    
+    # Add debug logging for LLM response
+    logging.info(f"Raw LLM Response (first 500 chars): {llm_response_str[:500]}")
+    
+    # Parse JSON response with additional error handling
     try:
-        batch_json = df.to_json(orient='records')
-        prompt = build_insight_and_charting_prompt(user_question, batch_json)
-        
-        # Add debug logging
-        logging.info(f"Prompt length: {len(prompt)} characters")
-        
-        # Use retry logic for API calls - ENHANCED ERROR HANDLING
-        llm_response_str = call_llm_with_retry(prompt)
-        
-        # Check if LLM response is None or empty
-        if not llm_response_str:
-            logging.error("LLM returned None or empty response")
-            return {"text_answer": "Unable to process request due to service issues. Please try a simpler query or try again later.", "charts": []}
-        
-        # Add debug logging for LLM response
-        logging.info(f"Raw LLM Response (first 500 chars): {llm_response_str[:500]}")
-        
-        # Parse JSON response with additional error handling
-        try:
-            result = json.loads(llm_response_str)
-        except json.JSONDecodeError as json_error:
-            logging.error(f"JSON parsing failed: {json_error}")
-            logging.error(f"Raw response that failed to parse: {llm_response_str[:1000]}")
-            return {"text_answer": "Analysis completed but response formatting failed. Please try again.", "charts": []}
-        
-        # Validate result structure
-        if not isinstance(result, dict):
-            logging.error(f"LLM returned non-dict result: {type(result)}")
-            return {"text_answer": "Invalid response format received. Please try again.", "charts": []}
-        
-        # Debug chart specifications
-        if 'charts' in result:
-            logging.info(f"Chart specs found: {len(result.get('charts', []))}")
-            logging.info(f"Chart spec types: {[type(spec) for spec in result.get('charts', [])]}")
-        
-        # Process charts safely
+        result = json.loads(llm_response_str)
+    except json.JSONDecodeError as json_error:
+        logging.error(f"JSON parsing failed: {json_error}")
+        logging.error(f"Raw response that failed to parse: {llm_response_str[:1000]}")
+        return {"text_answer": "Analysis completed but response formatting failed. Please try again.", "charts": [], "degraded": True}
+    
+    # Validate result structure
+    if not isinstance(result, dict):
+        logging.error(f"LLM returned non-dict result: {type(result)}")
+        return {"text_answer": "Invalid response format received. Please try again.", "charts": [], "degraded": True}
+    
+    # Debug chart specifications
+    if 'charts' in result:
+        logging.info(f"Chart specs found: {len(result.get('charts', []))}")
+        logging.info(f"Chart spec types: {[type(spec) for spec in result.get('charts', [])]}")
+    
+    # Process charts safely
+    result = _render_charts_if_needed(result)
+    
+    logging.info("Optimized single analysis completed successfully")
+    return result
+
+def _analysis_failure(e: Exception):
+    logging.error(f"Optimized analysis failed with exception: {e}", exc_info=True)
+    return {"text_answer": f"Analysis encountered an error: {str(e)}. Please try a simpler query.", "charts": [], "degraded": True}
+
+async def optimized_single_analysis_async(user_question: str, df: pd.DataFrame, query_plan: dict = None, on_text=None):
+    """
+    Single-call analysis for datasets under 1000 rows, with prompt building on the CPU executor.
+    With `on_text`, the answer text is streamed to it as the model writes it.
+    """
+    if df.empty:
+        return {"text_answer": "No data available for analysis.", "charts": []}
+
+    logging.info(f"Starting optimized single analysis for {len(df)} rows")
+
+    try:
+        prompt = await run_cpu(_build_analysis_prompt, user_question, df, query_plan)
+        if on_text is not None:
+            llm_response_str = await stream_llm_with_retry_async(prompt, on_text)
+        else:
+            llm_response_str = await call_llm_with_retry_async(prompt)
+        return _parse_analysis_response(llm_response_str)
+    except Exception as e:
+        return _analysis_failure(e)
+
+def _split_batches(df: pd.DataFrame, batch_size_rows: int):
+    return [df[i:i + batch_size_rows] for i in range(0, len(df), batch_size_rows)]
+
+@timed("parse")
+def _parse_batch_response(i: int, total: int, llm_response_str):
+    if llm_response_str:
+        result = json.loads(llm_response_str)
         result = _render_charts_if_needed(result)
-        
-        logging.info("Optimized single analysis completed successfully")
+        logging.info(f"Successfully processed batch {i+1} of {total}")
         return result
-        
-    except Exception as e:
-        logging.error(f"Optimized analysis failed with exception: {e}", exc_info=True)
-        return {"text_answer": f"Analysis encountered an error: {str(e)}. Please try a simpler query.", "charts": []}
+    return {"text_answer": f"Batch {i+1} failed due to service issues", "charts": [], "degraded": True}
+
+def _batch_failure(i: int, e: Exception):
+    if isinstance(e, json.JSONDecodeError):
+        logging.error(f"Failed to parse JSON for batch {i+1}. Error: {e}")
+        return {"text_answer": f"Error parsing JSON for batch {i+1}", "charts": [], "degraded": True}
+    logging.error(f"Failed to process batch {i+1}. Error: {e}")
+    return {"text_answer": f"Error processing batch {i+1}: {str(e)}", "charts": [], "degraded": True}
 
-def comprehensive_analysis(user_question: str, df: pd.DataFrame, batch_size_rows=400):
+async def comprehensive_analysis_async(user_question: str, df: pd.DataFrame, batch_size_rows=400):
     """Multi-batch analysis for very large datasets (>1000 rows)"""
     if df.empty:
         return {"total_batches": 0, "batch_results": [], "original_data_count": 0}
-    
+
     num_rows = len(df)
-    
-    # For datasets under 1000 rows, use optimized single analysis
+
     if num_rows <= 1000:
         logging.info(f"Dataset ({num_rows} rows) fits single analysis, redirecting to optimized function...")
-        result = optimized_single_analysis(user_question, df)
+        result = await optimized_single_analysis_async(user_question, df)
         return {
             "total_batches": 1,
             "batch_results": [result],
             "original_data_count": num_rows
         }
-    
-    # Multi-batch processing for very large datasets
-    batch_results = []
-    batches = [df[i:i + batch_size_rows] for i in range(0, num_rows, batch_size_rows)]
-    logging.info(f"Large dataset - processing {num_rows} rows across {len(batches)} batches...")
-    
-    for i, batch_df in enumerate(batches):
-        if batch_df.empty:
-            continue
-            
-        try:
-            batch_json = batch_df.to_json(orient='records')
-            prompt = build_insight_and_charting_prompt(user_question, batch_json)
-            
-            # Use retry logic
-            llm_response_str = call_llm_with_retry(prompt)
-            
-            if llm_response_str:
-                result = json.loads(llm_response_str)
-                result = _render_charts_if_needed(result)
-                batch_results.append(result)
-                logging.info(f"Successfully processed batch {i+1} of {len(batches)}")
-            else:
-                batch_results.append({"text_answer": f"Batch {i+1} failed due to service issues", "charts": []})
-                
-        except json.JSONDecodeError as e:
-            logging.error(f"Failed to parse JSON for batch {i+1}. Error: {e}")
-            batch_results.append({"text_answer": f"Error parsing JSON for batch {i+1}", "charts": []})
-        except Exception as e:
-            logging.error(f"Failed to process batch {i+1}. Error: {e}")
-            batch_results.append({"text_answer": f"Error processing batch {i+1}: {str(e)}", "charts": []})
-    
+
+    batches = [batch_df for batch_df in _split_batches(df, batch_size_rows) if not batch_df.empty]
+    concurrency = max(1, min(LLM_BATCH_CONCURRENCY, len(batches)))
+    logging.info(f"Large dataset - processing {num_rows} rows across {len(batches)} batches, {concurrency} at a time...")
+
+    # Batches run concurrently up to the cap and share one rate-limit pause
+    semaphore = asyncio.Semaphore(concurrency)
+    backoff = SharedBackoff()
+
+    async def analyse_batch(i, batch_df):
+        async with semaphore:
+            try:
+                data_block = await run_cpu(encode_frame, batch_df, user_question)
+                prompt = build_insight_and_charting_prompt(user_question, data_block)
+                llm_response_str = await call_llm_with_retry_async(prompt, backoff=backoff)
+                return _parse_batch_response(i, len(batches), llm_response_str)
+            except Exception as e:
+                return _batch_failure(i, e)
+
+    # gather keeps the results in batch order regardless of completion order
+    batch_results = await asyncio.gather(*(analyse_batch(i, batch_df) for i, batch_df in enumerate(batches)))
+    failed_batches = [i + 1 for i, result in enumerate(batch_results) if result.get("degraded")]
+    if failed_batches:
+        logging.warning(f"{len(failed_batches)} of {len(batches)} batches failed: {failed_batches}")
+
     return {
         "total_batches": len(batches),
-        "batch_results": batch_results,
+        "batch_results": list(batch_results),
+        "failed_batches": failed_batches,
         "original_data_count": num_rows
     }
 
-def synthesize_comprehensive_analysis(synthesis_data):
-    """Synthesis step for multi-batch analysis"""
-    if synthesis_data["total_batches"] == 1:
-        # Single batch, return directly
-        return synthesis_data["batch_results"][0] if synthesis_data["batch_results"] else {"text_answer": "No results", "charts": []}
-    
+def _build_synthesis_request(synthesis_data):
     # Multi-batch synthesis
     batch_summary = ""
+    failed_batches = synthesis_data.get("failed_batches", [])
     for i, result in enumerate(synthesis_data['batch_results']):
+        if i + 1 in failed_batches:
+            continue
         batch_summary += f"\n\n--- Analysis from Batch {i+1} ---\n"
         batch_summary += result.get("text_answer", "")
+    if failed_batches:
+        batch_summary += (f"\n\nNote: batches {', '.join(map(str, failed_batches))} of {synthesis_data['total_batches']} "
+                          "could not be analysed; say that the answer covers part of the data.")
     
-    prompt = build_synthesis_prompt(
+    return build_synthesis_prompt(
         user_question="Synthesize the following batch analyses into a single, cohesive response with an executive summary, charts, and tables.",
         batch_summary=batch_summary
     )
-    
+
+@timed("parse")
+def _parse_synthesis_response(synthesis_data, final_response_str):
     try:
-        final_response_str = call_llm_with_retry(prompt)
         if final_response_str:
             final_response_data = json.loads(final_response_str)
             final_response_data = _render_charts_if_needed(final_response_data)
+            if any(result.get("degraded") for result in synthesis_data["batch_results"]):
+                final_response_data["degraded"] = True
+            if synthesis_data.get("failed_batches"):
+                final_response_data["failed_batches"] = synthesis_data["failed_batches"]
             return final_response_data
     except Exception as e:
         logging.error(f"Failed to parse final synthesis JSON: {e}")
     
-    return {"text_answer": "Synthesis completed with errors. Please try a more specific query.", "charts": []}
+    return {"text_answer": "Synthesis completed with errors. Please try a more specific query.", "charts": [], "degraded": True}
+
+async def synthesize_comprehensive_analysis_async(synthesis_data, on_text=None):
+    """Synthesis step for multi-batch analysis; streams the answer text to `on_text` when given"""
+    if synthesis_data["total_batches"] == 1:
+        return synthesis_data["batch_results"][0] if synthesis_data["batch_results"] else {"text_answer": "No results", "charts": []}
+
+    prompt = _build_synthesis_request(synthesis_data)
+    if on_text is not None:
+        return _parse_synthesis_response(synthesis_data, await stream_llm_with_retry_async(prompt, on_text))
+    return _parse_synthesis_response(synthesis_data, await call_llm_with_retry_async(prompt))
 
 def query_dispatcher(user_question: str, **filters):
     """Legacy function - maintained for backwards compatibility"""
@@ -365,4 +484,4 @@ def query_dispatcher(user_question: str, **filters):
         return {"text_answer": "I'm sorry, I could not find any data that matches your request. Please check your query parameters.", "charts": []}
     
     # Use optimized analysis for all cases now
-    return optimized_single_analysis(user_question, df)
+    return asyncio.run(optimized_single_analysis_async(user_question, df))
@@ -0,0 +1,291 @@
+# app/dataset.py
+import os
+import hashlib
+import logging
+import threading
+import time
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is only needed for the binary format
+    feather = None
+
+from app.cube import AggregateCube, CUBE_MEASURES
+from app.indexing import build_index, match
+from app.query_planner import LocalQueryPlanner
+
+DATA_PATH = os.path.join(os.path.dirname(__file__), "../data/synthetic_financials.csv")
+# Arrow IPC (Feather v2) copy of DATA_PATH, produced by `python -m app.convert_dataset`
+BINARY_DATA_PATH = os.path.splitext(DATA_PATH)[0] + ".arrow"
+BINARY_SUFFIXES = (".arrow", ".feather")
+
+# Explicit schema of the financials extract. Dimension columns are low-cardinality
+# strings and are stored as categoricals; measures are stored as float32.
+DIMENSION_COLUMNS = [
+    "load_date", "version", "timeframe", "reporting level", "region", "kpi_text",
+    "market_type_text", "bu", "bu_text", "leg_cat", "leg_cat_text", "country",
+    "country_text", "brand_text", "brand_segment_text", "sub_category_text",
+    "bsp", "bsp_text", "area",
+]
+MEASURE_COLUMNS = ["Act", "act_ytd", "py", "py_ytd", "rf", "rf_ytd", "ac"]
+SCHEMA = {
+    **{col: "category" for col in DIMENSION_COLUMNS},
+    "year": "int16",
+    "month": "int32",
+    **{col: "float32" for col in MEASURE_COLUMNS},
+}
+# Columns get_dynamic_data can filter on; each gets an inverted index at load time
+INDEXED_COLUMNS = [
+    "brand_text", "region", "country_text", "kpi_text", "leg_cat_text",
+    "market_type_text", "bu_text", "area", "bsp_text", "brand_segment_text",
+]
+# The extract carries two decimals; float32 storage is widened back on the way out
+MEASURE_DECIMALS = 2
+
+_dataset = None
+_dataset_lock = threading.Lock()
+_reload_lock = threading.Lock()
+_reload_listeners = []
+_reload_trigger = None
+
+def default_data_path() -> str:
+    """Prefer the memory-mappable binary copy when it exists and is not older than the CSV"""
+    if feather is not None and os.path.exists(BINARY_DATA_PATH):
+        if not os.path.exists(DATA_PATH) or os.path.getmtime(BINARY_DATA_PATH) >= os.path.getmtime(DATA_PATH):
+            return BINARY_DATA_PATH
+        logging.warning(f"{BINARY_DATA_PATH} is older than {DATA_PATH}, falling back to the CSV")
+    return DATA_PATH
+
+def load_financials(path: str = None) -> pd.DataFrame:
+    """Load the financials extract into the compact schema from CSV or a binary Arrow file"""
+    path = path or default_data_path()
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Dataset not found at {path}. Please ensure it exists.")
+    if path.endswith(BINARY_SUFFIXES):
+        return _load_binary(path)
+    df = pd.read_csv(path, dtype={col: dtype for col, dtype in SCHEMA.items() if col not in ("year", "month")})
+    for col in ("year", "month"):
+        if col in df.columns:
+            df[col] = df[col].astype(SCHEMA[col])
+    return df
+
+def _load_binary(path: str) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC file. The uncompressed, null-free numeric columns become zero-copy
+    views of the mapping, so their pages live in the OS page cache and are shared between
+    processes. Dimension columns are decoded into categoricals, which is a private copy of
+    their (small) codes. take() still copies the rows a request selects.
+    """
+    if feather is None:
+        raise RuntimeError(f"pyarrow is required to read {path}")
+    table = feather.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+def write_binary(df: pd.DataFrame, path: str = BINARY_DATA_PATH):
+    """Write a frame in the compact schema as an uncompressed (mmap-friendly) Arrow IPC file"""
+    if feather is None:
+        raise RuntimeError("pyarrow is required to write the binary dataset format")
+    tmp_path = path + ".tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    # Atomic rename so a running file watcher never sees a half-written file
+    os.replace(tmp_path, path)
+
+class FinancialDataset:
+    """
+    Read-only, process-wide view of the financials extract.
+    Loader functions resolve filters through match() and materialize rows with
+    take() instead of re-reading and re-scanning the file.
+    """
+
+    def __init__(self, df: pd.DataFrame, source: str = None):
+        self.df = df
+        self.source = source or DATA_PATH
+        self.schema = df.head(0).to_string()
+        self.loaded_at = time.time()
+        self.version = _snapshot_version(df)
+        self.fingerprint = _snapshot_fingerprint(df, self.version, self.source)
+        self.index = {col: build_index(df[col], str.lower) for col in INDEXED_COLUMNS if col in df.columns}
+        self.month_index = build_index(df["month"], int) if "month" in df.columns else {}
+        self.cube = AggregateCube(df) if set(CUBE_MEASURES) <= set(df.columns) else None
+        self.planner = LocalQueryPlanner(df)
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def memory_bytes(self) -> int:
+        return int(self.df.memory_usage(deep=True).sum())
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "fingerprint": self.fingerprint,
+            "source": os.path.abspath(self.source),
+            "rows": len(self.df),
+            "loaded_at": self.loaded_at,
+        }
+
+    def match(self, filters: dict, months=None):
+        """
+        Resolve case-insensitive equality filters and a month list to sorted row positions.
+        Returns None when nothing is filtered (all rows).
+        """
+        return match(self.index, self.month_index, filters, months)
+
+    def take(self, positions=None) -> pd.DataFrame:
+        """Materialize the given row positions as an independent frame"""
+        result = self.df if positions is None else self.df.iloc[positions]
+        result = result.copy()
+        measures = [col for col in MEASURE_COLUMNS if col in result.columns]
+        result[measures] = result[measures].astype("float64").round(MEASURE_DECIMALS)
+        return result
+
+def _snapshot_version(df: pd.DataFrame) -> str:
+    """Identify a snapshot by its extract version(s) and latest load date, e.g. 'public.RF08@2025-07-01'"""
+    parts = []
+    for col in ("version", "load_date"):
+        if col in df.columns and len(df):
+            values = sorted(str(v) for v in df[col].dropna().unique())
+            if col == "load_date":
+                values = values[-1:]
+            parts.append("+".join(v.split(" ")[0] for v in values))
+    return "@".join(parts) or "unversioned"
+
+def _snapshot_fingerprint(df: pd.DataFrame, version: str, source: str) -> str:
+    """Content fingerprint that changes whenever the data would give different answers"""
+    digest = hashlib.sha1(f"{version}|{len(df)}|{list(df.columns)}".encode())
+    try:
+        stat = os.stat(source)
+        digest.update(f"|{stat.st_size}|{stat.st_mtime_ns}".encode())
+    except OSError:
+        pass
+    measures = [col for col in MEASURE_COLUMNS if col in df.columns]
+    digest.update(df[measures].astype("float64").sum().round(4).to_string().encode())
+    return digest.hexdigest()[:16]
+
+def _build_dataset(path: str = None) -> FinancialDataset:
+    path = path or default_data_path()
+    started = time.time()
+    dataset = FinancialDataset(load_financials(path), source=path)
+    logging.info(f"Loaded financial dataset {dataset.version}: {len(dataset)} rows, "
+                 f"{dataset.memory_bytes / 1e6:.2f} MB resident, built in {time.time() - started:.2f}s")
+    return dataset
+
+def get_dataset() -> FinancialDataset:
+    """
+    Return the current dataset snapshot, loading it on first use.
+    Callers should hold on to the returned object for the whole request so that a
+    concurrent reload never mixes two snapshots in one answer.
+    """
+    global _dataset
+    if _dataset is None:
+        with _dataset_lock:
+            if _dataset is None:
+                _dataset = _build_dataset()
+    return _dataset
+
+def add_reload_listener(callback):
+    """Register callback(old, new) to run after a new snapshot has been swapped in"""
+    _reload_listeners.append(callback)
+
+def reload_dataset(path: str = None):
+    """
+    Build a new snapshot next to the live one and swap it in atomically.
+    Returns the new snapshot, or None if another reload is already running.
+    """
+    global _dataset
+    if not _reload_lock.acquire(blocking=False):
+        logging.info("Dataset reload already in progress, skipping")
+        return None
+    try:
+        new_dataset = _build_dataset(path)
+        with _dataset_lock:
+            old_dataset, _dataset = _dataset, new_dataset
+        logging.info(f"Swapped dataset snapshot {old_dataset.version if old_dataset else None} -> {new_dataset.version}")
+        for callback in _reload_listeners:
+            try:
+                callback(old_dataset, new_dataset)
+            except Exception as e:
+                logging.error(f"Dataset reload listener failed: {e}", exc_info=True)
+        return new_dataset
+    finally:
+        _reload_lock.release()
+
+def set_reload_trigger(trigger):
+    """
+    Hand reload requests to trigger() instead of reloading in this process. Under gunicorn
+    each worker asks the master, which loads the new snapshot once and forks fresh workers
+    that share it, so every worker moves to the same version.
+    """
+    global _reload_trigger
+    _reload_trigger = trigger
+
+def reload_is_delegated() -> bool:
+    return _reload_trigger is not None
+
+def reload_dataset_in_background(path: str = None):
+    """Start a reload of the default dataset; returns the reload thread, or None when it was handed off"""
+    if _reload_trigger is not None and path is None:
+        _reload_trigger()
+        return None
+
+    def run():
+        try:
+            reload_dataset(path)
+        except Exception as e:
+            logging.error(f"Dataset reload failed, keeping current snapshot: {e}", exc_info=True)
+
+    thread = threading.Thread(target=run, name="dataset-reload", daemon=True)
+    thread.start()
+    return thread
+
+def _source_signature(path: str):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def refresh_binary():
+    """
+    Bring the Arrow copy in line with a new CSV extract: rewrite it when one exists, and
+    remove it if that fails, so the next load never picks up the stale copy.
+    """
+    if not os.path.exists(BINARY_DATA_PATH):
+        return
+    try:
+        write_binary(load_financials(DATA_PATH), BINARY_DATA_PATH)
+        logging.info(f"Rebuilt {BINARY_DATA_PATH} from {DATA_PATH}")
+    except Exception as e:
+        logging.error(f"Could not rebuild {BINARY_DATA_PATH}, removing it: {e}", exc_info=True)
+        os.remove(BINARY_DATA_PATH)
+
+def start_dataset_watcher(interval: float, stop_event: threading.Event = None, on_change=None) -> threading.Event:
+    """
+    Poll the CSV extract every `interval` seconds. When it changes, the Arrow copy is
+    rebuilt from it and on_change() runs (by default reload_dataset in this process);
+    on_change returns False to have the same change retried on the next poll.
+    Returns the event that stops the watcher.
+    """
+    stop_event = stop_event or threading.Event()
+    on_change = on_change or (lambda: reload_dataset() is not None)
+    # The CSV is the source of truth; the Arrow file is only ever derived from it
+    path = DATA_PATH
+    initial = _source_signature(path)
+
+    def watch():
+        signature = initial
+        while not stop_event.wait(interval):
+            current = _source_signature(path)
+            if current is not None and current != signature:
+                logging.info(f"Dataset file {path} changed, reloading")
+                try:
+                    refresh_binary()
+                    if on_change() is not False:
+                        signature = current
+                except Exception as e:
+                    logging.error(f"Dataset reload failed, keeping current snapshot: {e}", exc_info=True)
+
+    threading.Thread(target=watch, name="dataset-watcher", daemon=True).start()
+    return stop_event
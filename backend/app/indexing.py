@@ -0,0 +1,69 @@
+# app/indexing.py
+import logging
+import numpy as np
+import pandas as pd
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+def build_index(column: pd.Series, normalize) -> dict:
+    """Map each normalized value of a column to the sorted positions of the rows holding it"""
+    codes, uniques = pd.factorize(column, sort=False)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes[codes >= 0], minlength=len(uniques)))
+    # Missing values (code -1) sort first and are not indexed
+    start = int((codes < 0).sum())
+    index = {}
+    for value, end in zip(uniques, bounds + start):
+        rows = order[start:end]
+        key = normalize(value)
+        index[key] = np.union1d(index[key], rows) if key in index else rows
+        start = end
+    return index
+
+def union(postings: list):
+    if not postings:
+        return EMPTY
+    return postings[0] if len(postings) == 1 else np.sort(np.concatenate(postings))
+
+def intersect(postings: list):
+    """Intersect sorted position arrays smallest-first so the work tracks the size of the result"""
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for rows in postings[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, rows, assume_unique=True)
+    return result
+
+def as_months(months):
+    result = []
+    for month in months:
+        try:
+            result.append(int(month))
+        except (TypeError, ValueError):
+            logging.warning(f"Ignoring unparseable month filter: {month!r}")
+    return result
+
+def match(index: dict, month_index: dict, filters: dict, months=None):
+    """
+    Resolve case-insensitive equality filters and a month list against inverted indexes.
+    Returns sorted row positions, or None when nothing is filtered (all rows).
+    """
+    postings = []
+    for col, value in filters.items():
+        if value is None or value == "":
+            continue
+        if col not in index:
+            raise KeyError(f"Column '{col}' is not indexed")
+        rows = index[col].get(str(value).lower())
+        if rows is None:
+            return EMPTY
+        postings.append(rows)
+    if months:
+        month_rows = [month_index[m] for m in as_months(months) if m in month_index]
+        if not month_rows:
+            return EMPTY
+        postings.append(union(month_rows))
+    if not postings:
+        return None
+    return intersect(postings)
@@ -1,25 +1,149 @@
 # app/llm_client.py
 import os
+import time
+import asyncio
+import threading
+import httpx
 from google import genai
 from google.genai import types as genai_types
 
+from app.metrics import LLM_CALL_SECONDS, LLM_TOKENS, PROMPT_TOKENS
+from app.prompt_encoding import estimate_tokens
+from app.llm_replay import offline_response, save_cassette
+from app.llm_gateway import gateway_call, LLMUnavailableError
+from app.concurrency import SingleFlight
+
+# Which model answers: "gemini", "record" (gemini, saving each response as a cassette),
+# "replay" (cassettes only, no network) or "stub" (canned local answers with simulated latency)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if not GEMINI_API_KEY:
-    raise RuntimeError("GEMINI_API_KEY is not set")
 
-client = genai.Client(api_key=GEMINI_API_KEY)
+# Upper bound on pooled connections the async client keeps open to Gemini
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+# Chunks a stub or replayed response is streamed in
+OFFLINE_STREAM_CHUNKS = 20
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client() -> genai.Client:
+    """The Gemini client, created on first use so offline backends never need an API key"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                if not GEMINI_API_KEY:
+                    raise RuntimeError("GEMINI_API_KEY is not set")
+                _client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options=genai_types.HttpOptions(
+                        async_client_args={
+                            "limits": httpx.Limits(
+                                max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                                keepalive_expiry=60,
+                            ),
+                        },
+                    ),
+                )
+    return _client
+
 DEFAULT_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
 
-def call_openai_json(prompt: str, model: str = DEFAULT_MODEL):
+JSON_CONFIG = genai_types.GenerateContentConfig(
+    response_mime_type="application/json",
+)
+
+def _offline() -> bool:
+    return LLM_BACKEND in ("replay", "stub")
+
+def _record_call(method: str, started: float, outcome: str, usage=None):
+    """Latency and token metrics for one model call"""
+    LLM_CALL_SECONDS.observe(time.perf_counter() - started, method=method, outcome=outcome)
+    if usage is not None:
+        if usage.prompt_token_count:
+            LLM_TOKENS.observe(usage.prompt_token_count, type="prompt")
+        if usage.candidates_token_count:
+            LLM_TOKENS.observe(usage.candidates_token_count, type="completion")
+
+# Concurrent calls with a byte-identical prompt share one request to the model
+llm_flight = SingleFlight("llm", copy_result=False)
+
+async def call_openai_json_async(prompt: str, model: str = DEFAULT_MODEL):
     """
-    Maintain the same function name used by main.py; returns a JSON string.
+    Returns the model's JSON string for `prompt`, sent over the client's pooled async connections.
     """
-    resp = client.models.generate_content(
+    return await llm_flight.run((model, prompt), _generate_async, prompt, model)
+
+async def _generate_async(prompt: str, model: str):
+    PROMPT_TOKENS.observe(estimate_tokens(prompt))
+    started = time.perf_counter()
+    usage = None
+    try:
+        async with gateway_call():
+            if _offline():
+                text, latency = offline_response(LLM_BACKEND, model, prompt)
+                await asyncio.sleep(latency)
+            else:
+                resp = await get_client().aio.models.generate_content(
+                    model=model,
+                    contents=prompt,
+                    config=JSON_CONFIG,
+                )
+                text, usage = resp.text, resp.usage_metadata
+                if LLM_BACKEND == "record":
+                    save_cassette(model, prompt, text, time.perf_counter() - started)
+    except LLMUnavailableError:
+        raise
+    except Exception:
+        _record_call("generate", started, "error")
+        raise
+    _record_call("generate", started, "ok", usage)
+    return text
+
+async def _offline_stream(prompt: str, model: str):
+    text, latency = offline_response(LLM_BACKEND, model, prompt)
+    size = len(text) // OFFLINE_STREAM_CHUNKS + 1
+    for start in range(0, len(text), size):
+        await asyncio.sleep(latency / OFFLINE_STREAM_CHUNKS)
+        yield text[start:start + size], None
+
+async def _gemini_stream(prompt: str, model: str):
+    stream = await get_client().aio.models.generate_content_stream(
         model=model,
         contents=prompt,
-        config=genai_types.GenerateContentConfig(
-            response_mime_type="application/json",
-        ),
+        config=JSON_CONFIG,
     )
-    # resp.text is a JSON string when response_mime_type is application/json
-    return resp.text
+    async for chunk in stream:
+        yield chunk.text, chunk.usage_metadata
+
+async def stream_openai_json_async(prompt: str, model: str = DEFAULT_MODEL):
+    """
+    Yield the JSON response text in chunks as the model produces it.
+    """
+    PROMPT_TOKENS.observe(estimate_tokens(prompt))
+    started = time.perf_counter()
+    usage = None
+    chunks = []
+    try:
+        async with gateway_call() as call:
+            source = _offline_stream(prompt, model) if _offline() else _gemini_stream(prompt, model)
+            async for text, chunk_usage in source:
+                # Usage arrives with the final chunk
+                usage = chunk_usage or usage
+                if text:
+                    chunks.append(text)
+                    try:
+                        yield text
+                    except BaseException:
+                        # Thrown in by the consumer, not raised by the model
+                        call.abandoned = True
+                        raise
+            if LLM_BACKEND == "record":
+                save_cassette(model, prompt, "".join(chunks), time.perf_counter() - started)
+    except LLMUnavailableError:
+        raise
+    except Exception:
+        _record_call("stream", started, "error")
+        raise
+    _record_call("stream", started, "ok", usage)
@@ -0,0 +1,336 @@
+# app/llm_gateway.py
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.metrics import Collected, LLM_REJECTIONS
+
+# Error messages that indicate a transient provider problem worth retrying
+RETRYABLE_ERRORS = ['503', 'overloaded', 'unavailable', 'timeout', 'connection', 'rate limit']
+# Error messages that mean the provider wants every caller to slow down, not just this one
+RATE_LIMIT_ERRORS = ['429', 'rate limit', 'resource_exhausted', 'quota']
+
+# Circuit breaker: trips when at least LLM_BREAKER_ERROR_RATE of the calls in the last
+# LLM_BREAKER_WINDOW seconds failed (and there were LLM_BREAKER_MIN_CALLS of them), stays
+# open for LLM_BREAKER_OPEN_SECONDS, then lets LLM_BREAKER_PROBES trial calls through
+LLM_BREAKER_WINDOW = float(os.getenv("LLM_BREAKER_WINDOW", "30"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_OPEN_SECONDS = float(os.getenv("LLM_BREAKER_OPEN_SECONDS", "15"))
+LLM_BREAKER_PROBES = int(os.getenv("LLM_BREAKER_PROBES", "3"))
+# Outstanding model calls: the limit starts at LLM_CONCURRENCY_INITIAL, grows by one per
+# limit's worth of successes and halves on overload errors, within [MIN, MAX]
+LLM_CONCURRENCY_INITIAL = int(os.getenv("LLM_CONCURRENCY_INITIAL", "32"))
+LLM_CONCURRENCY_MIN = int(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+LLM_CONCURRENCY_MAX = int(os.getenv("LLM_CONCURRENCY_MAX", os.getenv("LLM_MAX_CONNECTIONS", "200")))
+# Seconds a call may wait for a free slot before it fails fast
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "20"))
+# Retries shared by every request: each first attempt earns LLM_RETRY_RATIO of a retry, plus
+# LLM_RETRY_MIN_PER_SECOND so a quiet server can still retry, banking at most LLM_RETRY_BUDGET
+LLM_RETRY_RATIO = float(os.getenv("LLM_RETRY_RATIO", "0.2"))
+LLM_RETRY_MIN_PER_SECOND = float(os.getenv("LLM_RETRY_MIN_PER_SECOND", "1"))
+LLM_RETRY_BUDGET = float(os.getenv("LLM_RETRY_BUDGET", "20"))
+# One burst of overload errors from the same moment halves the limit once, not once per error
+DECREASE_INTERVAL = 1.0
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+class LLMUnavailableError(RuntimeError):
+    """The gateway refused a model call (circuit open or no free slot) without sending it"""
+
+def _matches(error, keywords) -> bool:
+    error_msg = str(error).lower()
+    return any(keyword in error_msg for keyword in keywords)
+
+def is_rate_limited(error) -> bool:
+    return _matches(error, RATE_LIMIT_ERRORS)
+
+def is_retryable(error) -> bool:
+    if isinstance(error, LLMUnavailableError):
+        return False
+    return _matches(error, RETRYABLE_ERRORS + RATE_LIMIT_ERRORS)
+
+def _http_status(error):
+    """HTTP status of a provider API error (google-genai's APIError.code), or None"""
+    code = getattr(error, "code", None)
+    return code if isinstance(code, int) and 100 <= code < 600 else None
+
+def is_provider_failure(error) -> bool:
+    """Overload, 5xx and transport errors say the provider is unhealthy; a 4xx or a local error doesn't"""
+    if isinstance(error, LLMUnavailableError):
+        return False
+    status = _http_status(error)
+    return (is_retryable(error) or (status is not None and status >= 500)
+            or isinstance(error, (ConnectionError, TimeoutError)))
+
+class CircuitBreaker:
+    """
+    Closed: every call goes through and its outcome is recorded. Open: calls are refused
+    until the cooldown ends. Half-open: a few trial calls decide whether to close or reopen.
+    """
+
+    def __init__(self, window=LLM_BREAKER_WINDOW, min_calls=LLM_BREAKER_MIN_CALLS, error_rate=LLM_BREAKER_ERROR_RATE,
+                 open_seconds=LLM_BREAKER_OPEN_SECONDS, probes=LLM_BREAKER_PROBES):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.state = CLOSED
+        self._outcomes = deque()  # (monotonic time, failed)
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self._lock = threading.Lock()
+
+    def _update(self, now: float):
+        if self.state == OPEN and now - self._opened_at >= self.open_seconds:
+            self.state = HALF_OPEN
+            self._probes_started = self._probes_passed = 0
+            logging.info("LLM circuit half-open, sending trial calls")
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self, now: float):
+        self.state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+
+    def available(self) -> bool:
+        """Whether a call made now would be let through (without reserving a trial call)"""
+        with self._lock:
+            self._update(time.monotonic())
+            return self.state == CLOSED or (self.state == HALF_OPEN and self._probes_started < self.probes)
+
+    def before_call(self):
+        """Raise LLMUnavailableError unless the call may go ahead"""
+        with self._lock:
+            self._update(time.monotonic())
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and self._probes_started < self.probes:
+                self._probes_started += 1
+                return
+        LLM_REJECTIONS.inc(reason="circuit_open")
+        raise LLMUnavailableError("LLM circuit is open, failing fast")
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = time.monotonic()
+            self._update(now)
+            if self.state == HALF_OPEN:
+                if not ok:
+                    logging.warning("LLM trial call failed, circuit open again")
+                    self._open(now)
+                    return
+                self._probes_passed += 1
+                if self._probes_passed >= self.probes:
+                    logging.info("LLM trial calls succeeded, circuit closed")
+                    self.state = CLOSED
+                return
+            if self.state == OPEN:
+                return
+            self._outcomes.append((now, not ok))
+            failures = sum(failed for _, failed in self._outcomes)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                logging.warning(f"LLM circuit open: {failures}/{len(self._outcomes)} calls failed "
+                                f"in the last {self.window:g}s")
+                self._open(now)
+
+    def abandon(self):
+        """A call admitted by before_call ended without an outcome (cancelled or never sent)"""
+        with self._lock:
+            if self.state == HALF_OPEN and self._probes_started > self._probes_passed:
+                self._probes_started -= 1
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on outstanding calls.
+    Callers beyond the limit queue in arrival order; a released slot goes to the oldest waiter.
+    """
+
+    def __init__(self, initial=LLM_CONCURRENCY_INITIAL, minimum=LLM_CONCURRENCY_MIN, maximum=LLM_CONCURRENCY_MAX,
+                 timeout=LLM_QUEUE_TIMEOUT):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.timeout = timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def _grant(self):
+        # Caller holds the lock
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            waiter.granted = True
+            self.in_flight += 1
+            waiter.wake()
+
+    def _try_acquire(self) -> bool:
+        if not self._waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return True
+        return False
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """Leave the queue; True if a slot was granted in the meantime and is now held"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            self._waiters.remove(waiter)
+        LLM_REJECTIONS.inc(reason="queue_timeout")
+        return False
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            if self._try_acquire():
+                return
+            waiter = _Waiter(wake)
+            self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                raise LLMUnavailableError(f"No LLM call slot free within {self.timeout:g}s")
+        except asyncio.CancelledError:
+            if self._give_up(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant()
+
+    def on_success(self):
+        """Additive increase, only while the limit is actually being used"""
+        with self._lock:
+            if self.in_flight >= self.limit / 2:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self._grant()
+
+    def on_overload(self):
+        """Multiplicative decrease"""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_INTERVAL:
+                return
+            self._last_decrease = now
+            self.limit = max(self.minimum, self.limit / 2)
+        logging.warning(f"LLM overloaded, concurrency limit lowered to {int(self.limit)}")
+
+class RetryBudget:
+    """Token bucket of retries shared by every request, so retries can't multiply load during an outage"""
+
+    def __init__(self, ratio=LLM_RETRY_RATIO, min_per_second=LLM_RETRY_MIN_PER_SECOND, capacity=LLM_RETRY_BUDGET):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.min_per_second)
+        self._updated = now
+
+    def deposit(self):
+        """Called once per request to the model (its first attempt)"""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        """Take one retry from the budget; False when it is spent"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+        LLM_REJECTIONS.inc(reason="retry_budget")
+        return False
+
+breaker = CircuitBreaker()
+limiter = AdaptiveLimiter()
+retry_budget = RetryBudget()
+
+def llm_available() -> bool:
+    """False while the breaker is open; callers can answer locally instead of waiting to be refused"""
+    return breaker.available()
+
+class GatewayCall:
+    """
+    One admitted model call. Set `abandoned` when an error comes from the caller's side
+    (such as an exception thrown into a stream by its consumer) so it isn't blamed on the provider.
+    """
+
+    def __init__(self):
+        self.abandoned = False
+
+def _record(error=None):
+    if error is None:
+        breaker.record(True)
+        limiter.on_success()
+    elif is_provider_failure(error):
+        breaker.record(False)
+        if is_retryable(error):
+            limiter.on_overload()
+    elif _http_status(error) is not None:
+        # The provider answered, it just refused this request (a 400 for a bad prompt, say)
+        breaker.record(True)
+    else:
+        # Never reached the provider, or failed on our side (a missing replay cassette, a bug)
+        breaker.abandon()
+
+@asynccontextmanager
+async def gateway_call():
+    """Admit one model call through the breaker and the limiter, and record how it went"""
+    breaker.before_call()
+    try:
+        await limiter.acquire()
+    except BaseException:
+        breaker.abandon()
+        raise
+    call = GatewayCall()
+    try:
+        yield call
+    except Exception as e:
+        if call.abandoned:
+            breaker.abandon()
+        else:
+            _record(e)
+        raise
+    except BaseException:
+        # Cancelled or closed early: says nothing about the provider
+        breaker.abandon()
+        raise
+    else:
+        _record()
+    finally:
+        limiter.release()
+
+Collected("marco_llm_circuit_open", "1 while the LLM circuit breaker is open, 0.5 while half-open", [],
+          lambda: {(): {CLOSED: 0, HALF_OPEN: 0.5, OPEN: 1}[breaker.state]})
+Collected("marco_llm_concurrency_limit", "Current adaptive limit on outstanding LLM calls", [],
+          lambda: {(): int(limiter.limit)})
+Collected("marco_llm_in_flight", "LLM calls currently outstanding", [], lambda: {(): limiter.in_flight})
+Collected("marco_llm_retry_budget", "Retries currently available in the shared budget", [],
+          lambda: {(): round(retry_budget.tokens, 2)})
@@ -0,0 +1,119 @@
+# app/llm_replay.py
+import os
+import re
+import json
+import random
+import hashlib
+import logging
+
+# Recorded responses, one JSON file per (model, prompt)
+LLM_CASSETTE_DIR = os.getenv(
+    "LLM_CASSETTE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "cassettes"),
+)
+# What replay does for a prompt with no cassette: "stub" answers locally, "error" fails the call
+LLM_REPLAY_MISS = os.getenv("LLM_REPLAY_MISS", "stub")
+# Set LLM_REPLAY_REALTIME=0 to replay cassettes instantly instead of at their recorded latency
+LLM_REPLAY_REALTIME = os.getenv("LLM_REPLAY_REALTIME", "1") != "0"
+# Simulated model latency for the stub backend: mean seconds and +/- fraction
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", "0.8"))
+LLM_STUB_JITTER = float(os.getenv("LLM_STUB_JITTER", "0.25"))
+
+QUESTION_PATTERN = re.compile(r'(?:User Question|Question|original question): "(.*?)"', re.DOTALL)
+LIST_PATTERN = "Available {name}: (.*)"
+PLAN_KEYS = ["brand_text", "region", "country_text", "kpi_text", "leg_cat_text", "market_type_text", "months"]
+
+class CassetteMissError(LookupError):
+    """Replay mode was asked for a prompt that was never recorded"""
+
+def cassette_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode()).hexdigest()[:32]
+
+def _cassette_path(model: str, prompt: str) -> str:
+    return os.path.join(LLM_CASSETTE_DIR, f"{cassette_key(model, prompt)}.json")
+
+def load_cassette(model: str, prompt: str):
+    """Recorded {"response", "latency_seconds", ...} for a prompt, or None"""
+    try:
+        with open(_cassette_path(model, prompt)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_cassette(model: str, prompt: str, response: str, latency: float):
+    os.makedirs(LLM_CASSETTE_DIR, exist_ok=True)
+    path = _cassette_path(model, prompt)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"model": model, "prompt": prompt, "response": response, "latency_seconds": round(latency, 3)}, f, indent=1)
+    os.replace(tmp_path, path)
+
+def stub_latency() -> float:
+    return max(0.0, LLM_STUB_LATENCY * (1 + random.uniform(-LLM_STUB_JITTER, LLM_STUB_JITTER)))
+
+def replay_response(model: str, prompt: str) -> tuple:
+    """(response text, seconds to wait before returning it) from the cassette for this prompt"""
+    cassette = load_cassette(model, prompt)
+    if cassette is not None:
+        return cassette["response"], cassette.get("latency_seconds", 0.0) if LLM_REPLAY_REALTIME else 0.0
+    if LLM_REPLAY_MISS != "stub":
+        raise CassetteMissError(f"No cassette for prompt {cassette_key(model, prompt)}")
+    logging.warning(f"No cassette for prompt {cassette_key(model, prompt)}, answering with the stub")
+    return stub_response(prompt), stub_latency()
+
+def offline_response(backend: str, model: str, prompt: str) -> tuple:
+    """(response text, simulated latency) for the stub and replay backends"""
+    if backend == "stub":
+        return stub_response(prompt), stub_latency()
+    return replay_response(model, prompt)
+
+def _available(prompt: str, name: str) -> list:
+    found = re.search(LIST_PATTERN.format(name=name), prompt)
+    if not found:
+        return []
+    return [item.strip() for item in found.group(1).split(",") if item.strip() and "other" not in item]
+
+def _stub_plan(prompt: str, question: str) -> dict:
+    """Query plan from the names the planner prompt lists that also appear in the question"""
+    lowered = question.lower()
+    def mentioned(name):
+        return next((item for item in _available(prompt, name) if item.lower() in lowered), None)
+    plan = dict.fromkeys(PLAN_KEYS)
+    plan.update({
+        "brand_text": mentioned("Brands"),
+        "region": mentioned("Regions"),
+        "country_text": mentioned("Countries"),
+        "kpi_text": mentioned("KPIs"),
+        "leg_cat_text": mentioned("Categories"),
+        "market_type_text": mentioned("Market Types"),
+        "analysis_type": "trend_analysis" if "trend" in lowered else "performance_overview",
+    })
+    return plan
+
+def _stub_answer(prompt: str, question: str) -> dict:
+    """A short answer with charts shaped like the analysis prompts ask for, seeded by the prompt"""
+    rng = random.Random(prompt)
+    labels = ["Oreo", "Milka", "LU", "Ritz", "Chips Ahoy!"]
+    months = ["Jan 2025", "Feb 2025", "Mar 2025", "Apr 2025", "May 2025", "Jun 2025"]
+    charts = [{
+        "chart_type": "bar",
+        "title": "Net Revenue by Brand",
+        "data": [{"label": label, "value": round(rng.uniform(50, 300), 2)} for label in labels],
+    }]
+    if "Create one simple chart" not in prompt:
+        charts.append({
+            "chart_type": "line",
+            "title": "Net Revenue Trend",
+            "data": [{"label": month, "Act": round(rng.uniform(100, 200), 2), "rf": round(rng.uniform(100, 200), 2),
+                      "py": round(rng.uniform(100, 200), 2)} for month in months],
+        })
+    return {"text_answer": f"Stub analysis for \"{question}\": Net Revenue is {rng.uniform(1, 20):.1f}% ahead of prior year.",
+            "charts": charts}
+
+def stub_response(prompt: str) -> str:
+    """Deterministic JSON response of the right shape for any of the app's prompts"""
+    found = QUESTION_PATTERN.search(prompt)
+    question = found.group(1) if found else ""
+    if "JSON Output:" in prompt and "analysis_type" in prompt:
+        return json.dumps(_stub_plan(prompt, question))
+    return json.dumps(_stub_answer(prompt, question))
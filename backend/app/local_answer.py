@@ -0,0 +1,138 @@
+# app/local_answer.py
+import os
+import re
+import logging
+import calendar
+
+from app.dataset import get_dataset
+
+# Set LOCAL_SIMPLE_ANSWERS=0 to always phrase simple answers with the LLM
+LOCAL_SIMPLE_ANSWERS = os.getenv("LOCAL_SIMPLE_ANSWERS", "1") != "0"
+# Largest KPI breakdown still answered from a template
+MAX_LOCAL_GROUPS = 4
+# Largest KPI breakdown shown when the LLM is unavailable
+MAX_FALLBACK_GROUPS = 12
+FALLBACK_NOTICE = "The analysis service is busy right now, so here are the headline figures instead of a full analysis.\n\n"
+
+# Questions that need ranking, comparison or narrative are left to the LLM
+UNSUPPORTED_PATTERN = re.compile(
+    r'\b(top|bottom|highest|lowest|best|worst|rank\w*|which|why|each|per|by (brand|region|country|category|month)|'
+    r'breakdown|trend\w*|growth|driv\w+|compare\w*|split|share)\b'
+)
+KPI_KEYWORDS = [
+    (r'\bnet revenue\b|\brevenue\b|\bsales\b', "net revenue"),
+    (r'\bgross profit\b', "gross profit"),
+    (r'\boperating income\b|\bearnings\b', "operating income"),
+    (r'\bvolume\b', "volume"),
+]
+# Plan filters named in the answer, in reading order
+SCOPE_COLUMNS = ["brand_text", "country_text", "region", "leg_cat_text", "market_type_text"]
+
+def _kpi_from_question(question: str, kpis: list):
+    """Resolve the KPI a question names, when it names exactly one that exists in the data"""
+    found = set()
+    for pattern, prefix in KPI_KEYWORDS:
+        if re.search(pattern, question):
+            found.update(kpi for kpi in kpis if kpi.lower().startswith(prefix))
+    return found.pop() if len(found) == 1 else None
+
+def _unit(kpi: str) -> str:
+    return " MM Kgs" if "kgs" in kpi.lower() else "M"
+
+def _pct(actual: float, base: float):
+    if not base:
+        return None
+    return (actual - base) / abs(base) * 100
+
+def _fmt_pct(value) -> str:
+    return "n/a" if value is None else f"{value:+.1f}%"
+
+def format_months(months) -> str:
+    months = sorted({int(m) for m in months})
+    names = [f"{calendar.month_abbr[m % 100]} {m // 100}" for m in months]
+    contiguous = all(b - a == 1 for a, b in zip(months, months[1:]))
+    if len(names) > 2 and contiguous:
+        return f"{names[0]} - {names[-1]}"
+    return ", ".join(names)
+
+def _scope(filters: dict) -> str:
+    parts = [str(filters[col]) for col in SCOPE_COLUMNS if filters.get(col)]
+    scope = " for " + ", ".join(parts) if parts else " for MDLZ"
+    if filters.get("months"):
+        scope += f" in {format_months(filters['months'])}"
+    return scope
+
+def _kpi_answer(question: str, filters: dict, max_groups: int):
+    """Actual vs RF vs PY per KPI for the filters, phrased from a template; None when the cube can't answer"""
+    filters = dict(filters)
+    dataset = filters.pop("dataset", None)
+    if dataset is None:
+        dataset = get_dataset()
+    if dataset.cube is None:
+        return None
+    if not filters.get("kpi_text"):
+        kpis = [str(kpi) for kpi in dataset.df["kpi_text"].cat.categories] if "kpi_text" in dataset.df else []
+        filters["kpi_text"] = _kpi_from_question(question, kpis)
+    months = filters.pop("months", None)
+    summary = dataset.cube.query(filters, months=months, group_by=["kpi_text"])
+    if summary is None or summary.empty or len(summary) > max_groups:
+        return None
+    filters["months"] = months
+
+    rows = []
+    for record in summary.to_dict(orient="records"):
+        kpi = str(record["kpi_text"])
+        rows.append((kpi, record["Act"], record["rf"], record["py"],
+                     _pct(record["Act"], record["rf"]), _pct(record["Act"], record["py"])))
+    scope = _scope(filters)
+
+    if len(rows) == 1:
+        kpi, act, rf, py, vs_rf, vs_py = rows[0]
+        unit = _unit(kpi)
+        text_answer = (f"{kpi}{scope} was {act:,.2f}{unit}, {_fmt_pct(vs_rf)} vs RF ({rf:,.2f}{unit}) "
+                       f"and {_fmt_pct(vs_py)} vs PY ({py:,.2f}{unit}).")
+        chart_data = [
+            {"label": "Actual", "value": round(act, 2)},
+            {"label": "Reforecast", "value": round(rf, 2)},
+            {"label": "Prior Year", "value": round(py, 2)},
+        ]
+        title = f"{kpi}{scope}"
+    else:
+        lines = [f"Key metrics{scope}:", "", "| KPI | Actual | vs RF | vs PY |", "|-----|--------|-------|-------|"]
+        for kpi, act, rf, py, vs_rf, vs_py in rows:
+            lines.append(f"| {kpi} | {act:,.2f}{_unit(kpi)} | {_fmt_pct(vs_rf)} | {_fmt_pct(vs_py)} |")
+        text_answer = "\n".join(lines)
+        chart_data = [{"label": kpi, "Act": round(act, 2), "rf": round(rf, 2), "py": round(py, 2)}
+                      for kpi, act, rf, py, _, _ in rows]
+        title = f"Actual vs RF vs PY{scope}"
+
+    logging.info(f"Answered locally from {len(rows)} cube row(s)")
+    return {
+        "text_answer": text_answer,
+        "charts": [{"chart_type": "bar", "title": title, "data": chart_data}],
+    }
+
+def local_simple_answer(user_question: str, filters: dict):
+    """
+    Answer a simple factual question from the aggregate cube without an LLM call.
+    Returns {"text_answer", "charts"} or None when the question needs the LLM.
+    """
+    if not LOCAL_SIMPLE_ANSWERS:
+        return None
+    question = user_question.lower()
+    if UNSUPPORTED_PATTERN.search(question):
+        return None
+    return _kpi_answer(question, filters, MAX_LOCAL_GROUPS)
+
+def local_fallback_answer(user_question: str, filters: dict):
+    """
+    Headline KPIs for any question's filters, for when the LLM can't be reached.
+    Marked degraded so it is never cached in place of a real analysis.
+    """
+    result = _kpi_answer(user_question.lower(), filters, MAX_FALLBACK_GROUPS)
+    if result is None:
+        return {"text_answer": FALLBACK_NOTICE + "There are no headline figures for this selection.", "charts": [],
+                "degraded": True}
+    result["text_answer"] = FALLBACK_NOTICE + result["text_answer"]
+    result["degraded"] = True
+    return result
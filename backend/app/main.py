@@ -4,34 +4,97 @@ load_dotenv()
 
 import pandas as pd
 import json
+import hashlib
 import logging
+import time
 import os
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Body, Request, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 
 from app.models import ChatRequest, RichChatResponse
 from app.data_loader import (
-    load_financials, get_dynamic_data, optimized_single_analysis, simple_fact_answer,
-    comprehensive_analysis, synthesize_comprehensive_analysis, 
+    get_dynamic_data, optimized_single_analysis_async, simple_fact_answer_async, aggregated_data_block,
+    comprehensive_analysis_async, synthesize_comprehensive_analysis_async,
     get_benchmark_data, get_performance_summary
 )
 from app.prompts import build_query_planner_prompt, build_insight_and_charting_prompt
-from app.llm_client import call_openai_json as call_gemini  # Uses your Gemini client
-from app.chart_generator import render_chart
+from app.prompt_encoding import encode_frame
+from app.reduction import AGGREGATE_PROMPTS
+from app.llm_client import call_openai_json_async as call_gemini_async  # Uses your Gemini client
+from app.chart_pool import render_chart_async, warm_chart_pool, shutdown_chart_pool
+from app.chart_specs import to_vega_lite
+from app.chart_generator import CHART_FORMATS, CHART_THUMBNAIL_WIDTH, chart_output_options
+from app.chart_store import chart_cache, chart_key, chart_url, get_chart, put_chart, put_recipe, get_recipe, chart_image, decode_chart
+from app.concurrency import run_cpu, SingleFlight
+from app.dataset import get_dataset, add_reload_listener, reload_dataset_in_background, start_dataset_watcher, reload_is_delegated
+from app.cache import TTLCache, SqliteStore, normalize_question
 from app.utils import clean_and_parse_json
 from app.question_classifier import classify_question_type  # NEW IMPORT
 from app.question_validator import is_valid_business_question, get_polite_refusal_message  # NEW IMPORT
+from app.query_planner import LOCAL_QUERY_PLANNER
+from app.local_answer import local_fallback_answer
+from app.llm_gateway import llm_available, LLMUnavailableError
+from app.streaming import ChatEventStream, emit, sse_event
+from app.profiling import profile_request, profile_path
+from app.metrics import Collected, stage_timer, render_metrics, FALLBACKS, ROWS_FETCHED, CHAT_REQUESTS, STAGE_SECONDS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-app = FastAPI(title="MDLZ Visual LLM Backend")
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+# Seconds between checks of the dataset file for a new drop; 0 disables the watcher.
+# Under gunicorn the watcher runs once in the master instead of in every worker
+DATASET_WATCH_INTERVAL = float(os.getenv("DATASET_WATCH_INTERVAL", "0"))
 
-# Pre-load data and schema
-df = load_financials()
-df_schema = df.head(0).to_string()
+# Query plans keyed by snapshot + normalized question; PLAN_CACHE_PATH (a sqlite file) keeps them across restarts
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH")
+plan_cache = TTLCache(
+    "plan",
+    max_entries=int(os.getenv("PLAN_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("PLAN_CACHE_TTL", "3600")),
+    store=SqliteStore(PLAN_CACHE_PATH, "plan") if PLAN_CACHE_PATH else None,
+)
+add_reload_listener(lambda old, new: plan_cache.clear())
+
+# Finished responses keyed by question, plan, question type and data fingerprint. Charts make
+# entries large, so the in-memory tier is bounded by bytes; RESPONSE_CACHE_PATH shares entries between
+# workers (each opens its own connection to the file)
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH")
+response_cache = TTLCache(
+    "response",
+    max_entries=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+    store=SqliteStore(RESPONSE_CACHE_PATH, "response") if RESPONSE_CACHE_PATH else None,
+    max_bytes=int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+)
+add_reload_listener(lambda old, new: response_cache.clear())
+
+# Work already running for an identical request is awaited instead of repeated: planning by
+# snapshot + normalized question, answers by response cache key, fetches by plan filters, charts by chart key
+plan_flight = SingleFlight("plan")
+answer_flight = SingleFlight("answer")
+fetch_flight = SingleFlight("fetch")
+chart_flight = SingleFlight("chart", copy_result=False)
+
+# Pre-load the shared dataset so the first request doesn't pay for it
+get_dataset()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    watch = DATASET_WATCH_INTERVAL > 0 and not reload_is_delegated()
+    watcher = start_dataset_watcher(DATASET_WATCH_INTERVAL) if watch else None
+    await warm_chart_pool()
+    yield
+    if watcher:
+        watcher.set()
+    shutdown_chart_pool()
+
+app = FastAPI(title="MDLZ Visual LLM Backend", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -43,181 +106,530 @@ app.add_middleware(
 )
 
 @app.post("/chat", response_model=RichChatResponse)
-def chat_endpoint(request: ChatRequest = Body(...)):
+async def chat_endpoint(http_request: Request, request: ChatRequest = Body(...)):
     """
-    Process a user's question with validation and routing for business relevance
+    Process a user's question with validation and routing for business relevance.
+    LLM calls are awaited and pandas/chart work runs on executors, so one worker
+    serves many questions concurrently. Admins can add `X-Profile: 1` (or ?profile=1)
+    to get a sampled profile of the request; its id comes back as profile_id.
     """
+    # Pin one snapshot for the whole request; a concurrent reload only affects later requests
+    dataset = get_dataset()
+    async with profile_request(_profile_requested(http_request)) as profiler:
+        with stage_timer("total"):
+            response = await _answer_question(request, dataset)
+    response.data_version = dataset.version
+    if profiler is not None:
+        response.profile_id = profiler.profile_id
+    return response
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(http_request: Request, request: ChatRequest = Body(...)):
+    """
+    /chat over Server-Sent Events. Emits `stage` events (validated, plan, rows, analysis),
+    `text` events with pieces of the answer as the model writes it, a `chart` event per
+    rendered chart (`chart_spec` in vega-lite mode) and finally `done` with the complete RichChatResponse. Clients should
+    replace the streamed text with done.text_answer, which wins if a fallback kicked in.
+    Charts are sent as they finish. Place them by the `chart` event's index, which is always the
+    chart's position among the chart specs; done.charts keeps that order but leaves out charts
+    that failed to render, so positions in it can be lower.
+    """
+    dataset = get_dataset()
+    events = ChatEventStream()
+    profile = _profile_requested(http_request)
+
+    async def run():
+        try:
+            async with profile_request(profile) as profiler:
+                with stage_timer("total"):
+                    response = await _answer_question(request, dataset, events)
+            response.data_version = dataset.version
+            if profiler is not None:
+                response.profile_id = profiler.profile_id
+            return response
+        finally:
+            await events.queue.put(None)
+
+    async def stream():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                item = await events.queue.get()
+                if item is None:
+                    break
+                yield sse_event(*item)
+            response = task.result()
+            # Cached, local and refusal answers arrive whole; send them through the same events
+            if not events.text_streamed and response.text_answer:
+                yield sse_event("text", {"delta": response.text_answer})
+            # Rendered charts were all sent live, labelled with their spec index. Whole answers only
+            # come from the response cache, which holds complete answers, so there the position in
+            # response.charts is the spec index too
+            full_urls = response.chart_full_urls or []
+            for index in range(len(response.charts or []) if events.charts_sent == 0 else 0):
+                chart = {"index": index, "image": response.charts[index]}
+                if index < len(full_urls):
+                    chart["full_url"] = full_urls[index]
+                yield sse_event("chart", chart)
+            for index in range(events.chart_specs_sent, len(response.chart_specs or [])):
+                yield sse_event("chart_spec", {"index": index, "spec": response.chart_specs[index]})
+            yield sse_event("done", jsonable_encoder(response))
+        finally:
+            # Client went away: stop working on its answer
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def _answer_question(request: ChatRequest, dataset, events: ChatEventStream = None) -> RichChatResponse:
     try:
         logging.info(f"Received new question: \"{request.message.text}\"")
         
         # STEP 0: VALIDATE QUESTION RELEVANCE - NEW ADDITION
-        is_valid, reason = is_valid_business_question(request.message.text)
+        with stage_timer("validation"):
+            is_valid, reason = is_valid_business_question(request.message.text)
         
         if not is_valid:
             logging.info(f"Question rejected: {reason}")
+            CHAT_REQUESTS.inc(path="refusal")
             refusal_response = get_polite_refusal_message(request.message.text, reason)
             return RichChatResponse(
                 text_answer=refusal_response["text_answer"],
                 charts=refusal_response["charts"]
             )
+        await emit(events, "stage", stage="validated")
+
+        # Step 1: Query Planning - plan cache, then local dictionary match, then Gemini JSON-only response
+        plan_key = f"{dataset.version}|{normalize_question(request.message.text)}"
+        query_plan = await plan_cache.get_async(plan_key)
+        if query_plan is not None:
+            logging.info(f"Plan cache hit: {query_plan}")
+        else:
+            # Identical questions arriving together share one planning run
+            query_plan, planning_failure = await plan_flight.run(plan_key, _plan_question, request.message.text, dataset, plan_key)
+            if planning_failure is not None:
+                CHAT_REQUESTS.inc(path="planning_failed")
+                return RichChatResponse(**planning_failure)
+
+        for key, value in list(query_plan.items()):
+            if value == 0:
+                query_plan[key] = None
+
+        # Classify up front so a repeated plan + question type is served from the response cache
+        with stage_timer("classification"):
+            question_type = classify_question_type(request.message.text)
+        logging.info(f"Question classified as: {question_type}")
+        await emit(events, "stage", stage="plan", plan=query_plan, question_type=question_type)
+        response_key = _response_cache_key(request.message.text, query_plan, question_type, dataset, _chart_options(request))
+        cached_response = await response_cache.get_async(response_key)
+        if cached_response is not None:
+            logging.info("Response cache hit")
+            CHAT_REQUESTS.inc(path="cached")
+            return RichChatResponse(**cached_response)
+        if events is not None:
+            # A stream's progress events belong to its own client, so streamed answers are never shared
+            return await _compute_answer(request, dataset, query_plan, question_type, response_key, events)
+        # Identical requests arriving together wait for the first one's answer
+        return await answer_flight.run(response_key, _compute_answer, request, dataset, query_plan, question_type,
+                                       response_key)
+
+    except Exception as e:
+        logging.critical(f"An unhandled exception occurred in the chat endpoint: {e}", exc_info=True)
+        CHAT_REQUESTS.inc(path="error")
+        return RichChatResponse(text_answer="", error=f"An unexpected server error occurred: {str(e)}")
+
+async def _plan_question(question: str, dataset, plan_key: str) -> tuple:
+    """
+    (query plan, None) from the local planner or else Gemini, cached under `plan_key`;
+    (None, RichChatResponse fields) when planning failed.
+    """
+    query_plan = None
+    if LOCAL_QUERY_PLANNER:
+        with stage_timer("planning_local"):
+            query_plan = await run_cpu(dataset.planner.plan, question)
+    if query_plan is None:
+        planner_prompt = build_query_planner_prompt(question, dataset.schema)
 
-        # Step 1: Query Planning (Gemini JSON-only response)
-        planner_prompt = build_query_planner_prompt(request.message.text, df_schema)
-        
         try:
-            query_plan_str = call_gemini(planner_prompt)
+            with stage_timer("planning_llm"):
+                query_plan_str = await call_gemini_async(planner_prompt)
             logging.info(f"LLM Query Plan Response (Raw): {query_plan_str}")
         except Exception as e:
             logging.error(f"Query planning failed: {e}")
-            return RichChatResponse(
-                text_answer="Sorry, I'm having trouble understanding your request. Please try rephrasing your question.",
-                error="Query planning service unavailable"
-            )
+            if isinstance(e, LLMUnavailableError):
+                return None, {"text_answer": "The analysis service is busy right now. Please try again in a minute.",
+                              "error": "Query planning service unavailable"}
+            return None, {"text_answer": "Sorry, I'm having trouble understanding your request. Please try rephrasing your question.",
+                          "error": "Query planning service unavailable"}
 
         try:
             query_plan = clean_and_parse_json(query_plan_str)
             logging.info(f"Successfully parsed query plan: {query_plan}")
         except (json.JSONDecodeError, ValueError) as e:
             logging.error(f"Failed to parse Query Plan JSON. Error: {e}. Raw response was: {query_plan_str}")
-            return RichChatResponse(
-                text_answer="Sorry, I had trouble understanding how to find the data for your question.",
-                error="Query plan generation failed"
-            )
+            return None, {"text_answer": "Sorry, I had trouble understanding how to find the data for your question.",
+                          "error": "Query plan generation failed"}
 
-        # Step 2: Fetch data
-        for key, value in list(query_plan.items()):
-            if value == 0:
-                query_plan[key] = None
+    if isinstance(query_plan, dict) and "text_answer" not in query_plan:
+        await plan_cache.set_async(plan_key, query_plan)
+    return query_plan, None
+
+async def _compute_answer(request: ChatRequest, dataset, query_plan: dict, question_type: str, response_key: str,
+                          events: ChatEventStream = None) -> RichChatResponse:
+    """Fetch, analyse and chart a planned question that missed the response cache"""
+    cacheable = True
+
+    # Step 2: Fetch data
 
-        fetched_df = get_dynamic_data(
-            brand_text=query_plan.get("brand_text"),
-            region=query_plan.get("region"),
-            country_text=query_plan.get("country_text"),
-            kpi_text=query_plan.get("kpi_text"),
-            leg_cat_text=query_plan.get("leg_cat_text"),
-            market_type_text=query_plan.get("market_type_text"),
-            months=query_plan.get("months")
+    filters = {
+        "brand_text": query_plan.get("brand_text"),
+        "region": query_plan.get("region"),
+        "country_text": query_plan.get("country_text"),
+        "kpi_text": query_plan.get("kpi_text"),
+        "leg_cat_text": query_plan.get("leg_cat_text"),
+        "market_type_text": query_plan.get("market_type_text"),
+        "months": query_plan.get("months"),
+        "dataset": dataset,
+    }
+    with stage_timer("fetch"):
+        # Questions with the same plan share one fetch; each gets its own copy of the frame
+        fetched_df = await fetch_flight.run(_fetch_key(filters), run_cpu, get_dynamic_data, **filters)
+    ROWS_FETCHED.inc(len(fetched_df))
+
+    if fetched_df.empty:
+        logging.warning(f"No data found for query plan: {query_plan}")
+        CHAT_REQUESTS.inc(path="no_data")
+        return RichChatResponse(
+            text_answer="I couldn't find any data matching your request. Please try asking about a different brand, country, or time period.",
+            error="No data found"
         )
+    else:
+        logging.info(f"Fetched {len(fetched_df)} rows for analysis")
+    await emit(events, "stage", stage="rows", rows=len(fetched_df))
 
-        if fetched_df.empty:
-            logging.warning(f"No data found for query plan: {query_plan}")
-            return RichChatResponse(
-                text_answer="I couldn't find any data matching your request. Please try asking about a different brand, country, or time period.",
-                error="No data found"
-            )
-        else:
-            logging.info(f"Fetched {len(fetched_df)} rows for analysis")
+    # Answer text is streamed straight from the model on /chat/stream
+    on_text = events.text if events is not None else None
+    await emit(events, "stage", stage="analysis")
 
-        # Step 3: Analysis - WITH QUESTION TYPE ROUTING
-        question_type = classify_question_type(request.message.text)
-        logging.info(f"Question classified as: {question_type}")
+    # Step 3: Analysis - WITH QUESTION TYPE ROUTING
+    llm_response_data = {}
+    analysis_started = time.perf_counter()
+    answer_path = question_type if question_type == 'simple' else 'single'
+    if not llm_available():
+        # Provider brownout: answer from the cube now rather than queue for a call that would be refused
+        logging.warning("LLM circuit open, answering from local data")
+        answer_path = "circuit_open"
+        FALLBACKS.inc(reason="circuit_open")
+        llm_response_data = await run_cpu(local_fallback_answer, request.message.text, filters)
+        text_answer = llm_response_data["text_answer"]
+        chart_specs = llm_response_data["charts"]
 
-        if question_type == 'simple':
-            # Fast path for simple questions
-            logging.info(f"Using simple answer path for {len(fetched_df)} rows")
-            try:
-                llm_response_data = simple_fact_answer(request.message.text, fetched_df)
-                text_answer = llm_response_data.get("text_answer", "Simple answer generated.")
-                chart_specs = llm_response_data.get("charts", [])
-                logging.info("Simple answer path completed successfully")
-            except Exception as e:
-                logging.error(f"Simple answer path failed: {e}")
-                text_answer = "The specific value you requested is not readily available in our current dataset."
-                chart_specs = []
+    elif question_type == 'simple':
+        # Fast path for simple questions
+        logging.info(f"Using simple answer path for {len(fetched_df)} rows")
+        try:
+            llm_response_data = await simple_fact_answer_async(request.message.text, fetched_df, filters)
+            text_answer = llm_response_data.get("text_answer", "Simple answer generated.")
+            chart_specs = llm_response_data.get("charts", [])
+            logging.info("Simple answer path completed successfully")
+        except Exception as e:
+            logging.error(f"Simple answer path failed: {e}")
+            FALLBACKS.inc(reason="simple_failed")
+            cacheable = False
+            text_answer = "The specific value you requested is not readily available in our current dataset."
+            chart_specs = []
 
-        elif len(fetched_df) > 1000:
-            # Only use multi-batch for very large datasets
-            logging.info(f"Very large dataset ({len(fetched_df)} rows), using multi-batch analysis")
-            try:
-                synthesis_data = comprehensive_analysis(request.message.text, fetched_df)
-                llm_response_data = synthesize_comprehensive_analysis(synthesis_data)
-                text_answer = llm_response_data.get("text_answer", "Comprehensive analysis completed.")
-                chart_specs = llm_response_data.get("charts", [])
-                logging.info(f"Multi-batch analysis completed across {synthesis_data['total_batches']} batches")
-            except Exception as e:
-                logging.error(f"Multi-batch analysis failed: {e}, falling back to optimized analysis")
-                llm_response_data = optimized_single_analysis(request.message.text, fetched_df.head(500))
-                text_answer = llm_response_data.get("text_answer", "Analysis completed with limited data.")
-                chart_specs = llm_response_data.get("charts", [])
-        else:
-            # Optimized path for your 750-row dataset - ANALYTICAL QUESTIONS
-            logging.info(f"Standard dataset ({len(fetched_df)} rows), using optimized single-call analysis")
+    elif len(fetched_df) > 1000 and not AGGREGATE_PROMPTS:
+        # Only use multi-batch for very large datasets; aggregated prompts fit any row count in one call
+        logging.info(f"Very large dataset ({len(fetched_df)} rows), using multi-batch analysis")
+        answer_path = "multi_batch"
+        try:
+            synthesis_data = await comprehensive_analysis_async(request.message.text, fetched_df)
+            llm_response_data = await synthesize_comprehensive_analysis_async(synthesis_data, on_text)
+            text_answer = llm_response_data.get("text_answer", "Comprehensive analysis completed.")
+            chart_specs = llm_response_data.get("charts", [])
+            logging.info(f"Multi-batch analysis completed across {synthesis_data['total_batches']} batches, "
+                         f"{len(synthesis_data.get('failed_batches', []))} failed")
+        except Exception as e:
+            logging.error(f"Multi-batch analysis failed: {e}, falling back to optimized analysis")
+            FALLBACKS.inc(reason="multi_batch_failed")
+            cacheable = False
+            llm_response_data = await optimized_single_analysis_async(request.message.text, fetched_df.head(500), query_plan, on_text)
+            text_answer = llm_response_data.get("text_answer", "Analysis completed with limited data.")
+            chart_specs = llm_response_data.get("charts", [])
+    else:
+        # Optimized path for your 750-row dataset - ANALYTICAL QUESTIONS
+        logging.info(f"Standard dataset ({len(fetched_df)} rows), using optimized single-call analysis")
+        
+        try:
+            llm_response_data = await optimized_single_analysis_async(request.message.text, fetched_df, query_plan, on_text)
             
+            # Add safety check
+            if llm_response_data is None:
+                llm_response_data = {"text_answer": "Service temporarily unavailable. Please try again.", "charts": [], "degraded": True}
+            
+            text_answer = llm_response_data.get("text_answer", "Analysis completed.")
+            chart_specs = llm_response_data.get("charts", [])
+            logging.info("Optimized single-call analysis completed successfully")
+        except Exception as e:
+            logging.error(f"Optimized analysis failed: {e}, trying fallback")
+            FALLBACKS.inc(reason="single_failed")
+            cacheable = False
             try:
-                llm_response_data = optimized_single_analysis(request.message.text, fetched_df)
-                
-                # Add safety check
-                if llm_response_data is None:
-                    llm_response_data = {"text_answer": "Service temporarily unavailable. Please try again.", "charts": []}
-                
-                text_answer = llm_response_data.get("text_answer", "Analysis completed.")
-                chart_specs = llm_response_data.get("charts", [])
-                logging.info("Optimized single-call analysis completed successfully")
-            except Exception as e:
-                logging.error(f"Optimized analysis failed: {e}, trying fallback")
-                try:
+                if AGGREGATE_PROMPTS:
+                    data_block = await run_cpu(aggregated_data_block, request.message.text, fetched_df, query_plan)
+                else:
                     # Fallback with smaller dataset
-                    limited_df = fetched_df.head(300)
-                    synthesis_prompt = build_insight_and_charting_prompt(
-                        request.message.text, limited_df.to_json(orient='records')
-                    )
-                    llm_response_str = call_gemini(synthesis_prompt)
-                    llm_response_data = clean_and_parse_json(llm_response_str)
-                    text_answer = llm_response_data.get("text_answer", "Analysis completed with limited data.")
-                    chart_specs = llm_response_data.get("charts", [])
-                except Exception as fallback_error:
-                    logging.error(f"Fallback analysis also failed: {fallback_error}")
-                    text_answer = "I encountered an issue analyzing your data. Please try with a more specific query."
-                    chart_specs = []
+                    data_block = await run_cpu(encode_frame, fetched_df.head(300), request.message.text, query_plan=query_plan)
+                synthesis_prompt = build_insight_and_charting_prompt(request.message.text, data_block)
+                llm_response_str = await call_gemini_async(synthesis_prompt)
+                llm_response_data = clean_and_parse_json(llm_response_str)
+                text_answer = llm_response_data.get("text_answer", "Analysis completed with limited data.")
+                chart_specs = llm_response_data.get("charts", [])
+            except Exception as fallback_error:
+                logging.error(f"Fallback analysis also failed: {fallback_error}")
+                FALLBACKS.inc(reason="fallback_failed")
+                text_answer = "I encountered an issue analyzing your data. Please try with a more specific query."
+                chart_specs = []
 
+    STAGE_SECONDS.observe(time.perf_counter() - analysis_started, stage="analysis")
+    CHAT_REQUESTS.inc(path=answer_path)
+    if llm_response_data.get("degraded"):
+        FALLBACKS.inc(reason="degraded")
+        cacheable = False
+
+    # Answers that weren't streamed go out before their charts
+    if events is not None and not events.text_streamed:
+        await events.text(text_answer)
+
+    chart_options = _chart_options(request)
+    if chart_options["mode"] == "vega-lite":
+        # Step 4: The client draws the charts; only translate the specs
+        with stage_timer("chart_specs"):
+            vega_lite_specs = await _vega_lite_specs(chart_specs, events)
+        logging.info(f"Final response - Text length: {len(text_answer)}, Chart specs count: {len(vega_lite_specs)}")
+        response = RichChatResponse(text_answer=text_answer, charts=[], chart_specs=vega_lite_specs)
+        complete = len(vega_lite_specs) == len(chart_specs)
+    else:
         # Step 4: Render charts to base64 - FIXED CHART HANDLING
-        rendered_charts = []
-        if chart_specs:
-            logging.info(f"Attempting to render {len(chart_specs)} charts.")
-            for i, spec in enumerate(chart_specs):
-                try:
-                    # Handle both string and dict chart specs
-                    if isinstance(spec, str):
-                        logging.info(f"Rendering chart {i}: String spec (length: {len(spec)})")
-                        # Try to parse string as JSON
-                        try:
-                            spec_dict = json.loads(spec)
-                            chart_image_base64 = render_chart(spec_dict)
-                        except json.JSONDecodeError:
-                            logging.warning(f"Chart {i} is a string but not valid JSON, skipping")
-                            continue
-                    elif isinstance(spec, dict):
-                        logging.info(f"Rendering chart {i}: {spec.get('title', 'No title')}")
-                        chart_image_base64 = render_chart(spec)
-                    else:
-                        logging.warning(f"Chart {i} is neither string nor dict: {type(spec)}")
-                        continue
-                        
-                    if chart_image_base64:
-                        rendered_charts.append(chart_image_base64)
-                        logging.info(f"Chart {i} rendered successfully, base64 length: {len(chart_image_base64)}")
-                    else:
-                        logging.warning(f"Chart {i} returned None - render_chart failed silently")
-                        
-                except Exception as e:
-                    logging.error(f"Error rendering chart {i}: {str(e)}", exc_info=True)
-                    continue
-            logging.info(f"Successfully rendered {len(rendered_charts)} out of {len(chart_specs)} charts.")
-        else:
-            logging.info("No chart specifications provided by LLM.")
+        rendered_charts, full_urls = await _render_charts(chart_specs, events, chart_options)
 
         # Step 5: Response
         logging.info(f"Final response - Text length: {len(text_answer)}, Charts count: {len(rendered_charts)}")
-        return RichChatResponse(text_answer=text_answer, charts=rendered_charts)
+        response = RichChatResponse(text_answer=text_answer, charts=rendered_charts, chart_full_urls=full_urls)
+        complete = len(rendered_charts) == len(chart_specs)
+    if cacheable and complete:
+        await response_cache.set_async(response_key, jsonable_encoder(response))
+    return response
 
-    except Exception as e:
-        logging.critical(f"An unhandled exception occurred in the chat endpoint: {e}", exc_info=True)
-        return RichChatResponse(text_answer="", error=f"An unexpected server error occurred: {str(e)}")
+def _chart_options(request: ChatRequest) -> dict:
+    """How the client wants charts delivered; part of the response cache key"""
+    output = chart_output_options(request.chart_format, request.chart_dpi, request.chart_width)
+    thumbnails = bool(request.chart_thumbnails)
+    return {
+        "mode": "vega-lite" if request.chart_mode == "vega-lite" else "image",
+        "urls": bool(request.chart_urls),
+        "output": chart_output_options(output["format"], width=CHART_THUMBNAIL_WIDTH) if thumbnails else output,
+        "full_output": output if thumbnails else None,
+    }
+
+async def _vega_lite_specs(chart_specs, events: ChatEventStream = None) -> list:
+    """Translate chart specs to Vega-Lite for client-side drawing; no server rendering involved"""
+    vega_lite_specs = []
+    for i, spec in enumerate(chart_specs or []):
+        spec = _chart_spec_dict(i, spec)
+        vega_lite_spec = to_vega_lite(spec) if spec is not None else None
+        if vega_lite_spec is None:
+            logging.warning(f"Chart {i} could not be translated to Vega-Lite, skipping")
+            continue
+        vega_lite_specs.append(vega_lite_spec)
+        if events is not None:
+            await events.chart_spec(vega_lite_spec)
+    return vega_lite_specs
+
+async def _render_chart_cached(key: str, spec: dict, output: dict):
+    """Data URI for `key`, from the chart cache or rendered now and cached; None if rendering failed"""
+    data_uri = await get_chart(key)
+    if data_uri:
+        return data_uri
+    # A chart requested by several answers at once is rendered once
+    return await chart_flight.run(key, _render_and_store_chart, key, spec, output)
+
+async def _render_and_store_chart(key: str, spec: dict, output: dict):
+    with stage_timer("chart_render"):
+        data_uri = await render_chart_async(spec, output)
+    if data_uri:
+        await put_chart(key, data_uri)
+    return data_uri
+
+async def _render_charts(chart_specs, events: ChatEventStream = None, options: dict = None) -> tuple:
+    """
+    Render all chart specs in parallel on the chart pool, streaming each one as it finishes.
+    Images are cached by spec hash and output options, so a repeated spec is rendered once;
+    with options["urls"] the chart URL is returned instead of the inline data URI.
+    Returns (charts, full_urls); full_urls is only filled for thumbnails, and those full-size
+    images are rendered when first requested rather than up front.
+    """
+    options = options or {}
+    output = options.get("output") or chart_output_options()
+    full_output = options.get("full_output")
+    if not chart_specs:
+        logging.info("No chart specifications provided by LLM.")
+        return [], []
+    logging.info(f"Attempting to render {len(chart_specs)} charts as {output['format']} at {output['dpi']} dpi.")
+
+    async def render(i, spec):
+        spec = _chart_spec_dict(i, spec)
+        if spec is None:
+            return None
+        key = chart_key(spec, output)
+        await put_recipe(key, spec, output)
+        chart_image_base64 = await _render_chart_cached(key, spec, output)
+        if not chart_image_base64:
+            logging.warning(f"Chart {i} returned None - render_chart failed silently")
+            return None
+        logging.info(f"Chart {i} ready, base64 length: {len(chart_image_base64)}")
+        chart = chart_url(key, output["format"]) if options.get("urls") else chart_image_base64
+        full_url = None
+        if full_output:
+            full_key = chart_key(spec, full_output)
+            await put_recipe(full_key, spec, full_output)
+            full_url = chart_url(full_key, full_output["format"])
+        if events is not None:
+            await events.chart(i, chart, full_url)
+        return chart, full_url
+
+    # Results come back in spec order whatever order the renders finish in
+    results = [result for result in await asyncio.gather(*(render(i, spec) for i, spec in enumerate(chart_specs))) if result]
+    rendered_charts = [chart for chart, _ in results]
+    full_urls = [full_url for _, full_url in results if full_url]
+    logging.info(f"Successfully rendered {len(rendered_charts)} out of {len(chart_specs)} charts.")
+    return rendered_charts, full_urls
+
+def _chart_spec_dict(i: int, spec):
+    """Normalize an LLM chart spec to a dict, or None if it can't be rendered"""
+    # Handle both string and dict chart specs
+    if isinstance(spec, str):
+        logging.info(f"Rendering chart {i}: String spec (length: {len(spec)})")
+        # Try to parse string as JSON
+        try:
+            spec = json.loads(spec)
+        except json.JSONDecodeError:
+            logging.warning(f"Chart {i} is a string but not valid JSON, skipping")
+            return None
+        if not isinstance(spec, dict):
+            logging.warning(f"Chart {i} is a JSON string but not an object, skipping")
+            return None
+        return spec
+    if isinstance(spec, dict):
+        logging.info(f"Rendering chart {i}: {spec.get('title', 'No title')}")
+        return spec
+    logging.warning(f"Chart {i} is neither string nor dict: {type(spec)}")
+    return None
+
+def _fetch_key(filters: dict) -> str:
+    dataset = filters["dataset"]
+    plan_filters = {col: value for col, value in filters.items() if col != "dataset"}
+    return f"{dataset.version}|{json.dumps(plan_filters, sort_keys=True, default=str)}"
+
+def _response_cache_key(question: str, query_plan: dict, question_type: str, dataset, chart_options: dict = None) -> str:
+    key = json.dumps(
+        [normalize_question(question), query_plan, question_type, dataset.fingerprint, chart_options],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
 
 # Health check
 @app.get("/api/health")
 def healthcheck():
-    return {"status": "ok", "message": "MDLZ Visual LLM Backend is running."}
+    return {"status": "ok", "message": "MDLZ Visual LLM Backend is running.", "data_version": get_dataset().version}
+
+@app.get("/api/charts/{name}")
+async def get_chart_image(name: str, request: Request):
+    """
+    Serve a chart by its content hash; the bytes behind a key never change. Charts that were
+    only promised (full-size versions of thumbnails, or images evicted from the cache) are
+    rendered from their stored recipe on first request.
+    """
+    key, _, fmt = name.partition(".")
+    if fmt not in CHART_FORMATS:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    # Only a chart this server can produce is confirmed as unchanged
+    image = await chart_image(key)
+    recipe = None
+    if image is None:
+        recipe = await get_recipe(key)
+        if recipe is None or recipe["options"]["format"] != fmt:
+            raise HTTPException(status_code=404, detail="Chart not found")
+    elif image[1] != CHART_FORMATS[fmt]:
+        raise HTTPException(status_code=404, detail="Chart not found")
+    if request.headers.get("If-None-Match") == etag:
+        return Response(status_code=304, headers=headers)
+    if image is None:
+        image = decode_chart(await _render_chart_cached(key, recipe["spec"], recipe["options"]))
+        if image is None:
+            raise HTTPException(status_code=500, detail="Chart could not be rendered")
+    content, media_type = image
+    return Response(content=content, media_type=media_type, headers=headers)
+
+def _is_admin(request: Request) -> bool:
+    return bool(ADMIN_TOKEN) and request.headers.get("X-Admin-Token") == ADMIN_TOKEN
+
+def _require_admin(request: Request):
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+def _profile_requested(request: Request) -> bool:
+    """Profiling is opt-in per request and only honoured for admin callers"""
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    return flag in ("1", "true") and _is_admin(request)
+
+@app.get("/api/admin/dataset")
+def dataset_status(request: Request):
+    _require_admin(request)
+    return get_dataset().describe()
+
+@app.get("/api/admin/cache")
+def cache_status(request: Request):
+    _require_admin(request)
+    return {"plan": plan_cache.stats(), "response": response_cache.stats(), "chart": chart_cache.stats()}
+
+def _cache_stat(stat: str):
+    def collect():
+        return {(name,): cache.stats()[stat] for name, cache in
+                (("plan", plan_cache), ("response", response_cache), ("chart", chart_cache))}
+    return collect
+
+Collected("marco_cache_hits_total", "Cache lookups that found an entry", ["cache"], _cache_stat("hits"), kind="counter")
+Collected("marco_cache_misses_total", "Cache lookups that found nothing", ["cache"], _cache_stat("misses"), kind="counter")
+Collected("marco_cache_entries", "Entries held in memory by each cache", ["cache"], _cache_stat("entries"))
+
+@app.get("/api/metrics")
+def metrics():
+    """Prometheus scrape target; each web worker process reports its own counts"""
+    return Response(content=render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request):
+    """Folded stacks of a profiled request, ready for flamegraph.pl or speedscope"""
+    _require_admin(request)
+    path = profile_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain", filename=f"{profile_id}.folded")
+
+@app.post("/api/admin/reload", status_code=202)
+def reload_data(request: Request):
+    """
+    Rebuild the dataset in the background; in-flight requests finish on the current snapshot.
+    Under gunicorn the master reloads and replaces every worker, not just the one answering.
+    """
+    _require_admin(request)
+    reload_dataset_in_background()
+    return {"status": "reloading", "current": get_dataset().describe()}
 
 # Static handling and 404 fallback
 @app.exception_handler(404)
@@ -230,6 +642,8 @@ async def not_found_exception_handler(request: Request, exc: HTTPException):
     if not path.startswith("/api/"):
         if os.path.exists("static/index.html"):
             return FileResponse('static/index.html')
-    return {"detail": "Not Found"}
+    return JSONResponse({"detail": "Not Found"}, status_code=404)
 
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+# The built frontend only exists in the image; API-only runs (tests, benchmarks) go without it
+if os.path.isdir("static"):
+    app.mount("/", StaticFiles(directory="static", html=True), name="static")
@@ -0,0 +1,143 @@
+# app/metrics.py
+import time
+import threading
+import functools
+from contextlib import contextmanager
+
+# Seconds; spans a cached lookup up to a slow multi-batch LLM analysis
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+_registry = []
+_lock = threading.Lock()
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> list:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines += self._samples()
+        return "\n".join(lines)
+
+class Counter(_Metric):
+    """Monotonic count, optionally split by labels"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list:
+        with _lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in items]
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram in the Prometheus layout, with _sum and _count"""
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with _lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        return self._values.get(self._key(labels), (None, 0.0, 0))[2]
+
+    def _samples(self) -> list:
+        with _lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                le = 'le="' + _number(float(bound)) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {bucket_count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Collected(_Metric):
+    """Values read from somewhere else (e.g. cache stats) each time metrics are rendered"""
+
+    def __init__(self, name: str, help_text: str, labelnames, collect, kind: str = "gauge"):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.collect = collect
+
+    def _samples(self) -> list:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in sorted(self.collect().items())]
+
+def render_metrics() -> str:
+    """Every registered metric in the Prometheus text exposition format"""
+    return "\n".join(metric.render() for metric in _registry) + "\n"
+
+STAGE_SECONDS = Histogram("marco_stage_duration_seconds", "Time spent in each /chat pipeline stage", ["stage"])
+LLM_CALL_SECONDS = Histogram("marco_llm_call_duration_seconds", "Latency of single Gemini calls", ["method", "outcome"])
+LLM_RETRIES = Counter("marco_llm_retries_total", "LLM calls retried after a transient error", ["reason"])
+LLM_REJECTIONS = Counter("marco_llm_rejected_total", "LLM calls or retries the gateway refused before reaching the model", ["reason"])
+LLM_TOKENS = Histogram("marco_llm_tokens", "Tokens per Gemini call as reported by the API", ["type"], TOKEN_BUCKETS)
+PROMPT_TOKENS = Histogram("marco_prompt_size_tokens", "Estimated size of each prompt sent to Gemini", (), TOKEN_BUCKETS)
+FALLBACKS = Counter("marco_fallbacks_total", "Answers that left the preferred path", ["reason"])
+ROWS_FETCHED = Counter("marco_rows_fetched_total", "Dataset rows fetched for analysis")
+CHAT_REQUESTS = Counter("marco_chat_requests_total", "Answered chat requests by the path that produced them", ["path"])
+COALESCED = Counter("marco_coalesced_total", "Callers that shared an identical in-flight computation instead of running their own", ["flight"])
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time the enclosed block into STAGE_SECONDS; usable around awaits as well"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def timed(stage: str):
+    """Decorator form of stage_timer for plain functions"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage_timer(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -17,6 +17,12 @@ class ChatRequest(BaseModel):
     message: LastUserMessage
     history: List[Message]
     system_prompt: Optional[str] = None
+    chart_urls: Optional[bool] = False # Return /api/charts/{hash}.png URLs instead of inline data URIs
+    chart_mode: Optional[str] = "image" # "image" renders images; "vega-lite" returns chart_specs for the client to draw
+    chart_format: Optional[str] = None # "png", "webp" or "svg"; defaults to CHART_FORMAT
+    chart_dpi: Optional[int] = None # Resolution of the 12x7 inch figure; defaults to CHART_DPI
+    chart_width: Optional[int] = None # Approximate pixel width; overrides chart_dpi
+    chart_thumbnails: Optional[bool] = False # Return small charts plus chart_full_urls rendered on first request
 
 class ChatResponse(BaseModel):
     response: str
@@ -24,5 +30,9 @@ class ChatResponse(BaseModel):
 
 class RichChatResponse(BaseModel):
     text_answer: str
-    charts: Optional[List[str]] = [] # List of base64 encoded chart images
+    charts: Optional[List[str]] = [] # Base64 data URIs, or chart URLs when the request set chart_urls
     error: Optional[str] = None
+    data_version: Optional[str] = None # Dataset snapshot that answered the question
+    chart_specs: Optional[List[dict]] = [] # Vega-Lite specs when the request set chart_mode="vega-lite"
+    chart_full_urls: Optional[List[str]] = [] # Full-size versions of thumbnail charts, in the same order
+    profile_id: Optional[str] = None # Set when an admin asked for this request to be profiled
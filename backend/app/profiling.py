@@ -0,0 +1,132 @@
+# app/profiling.py
+import os
+import sys
+import time
+import uuid
+import asyncio
+import logging
+import tempfile
+import threading
+import contextvars
+from collections import Counter
+from contextlib import asynccontextmanager
+
+# Set PROFILING=0 to ignore profile requests entirely
+PROFILING = os.getenv("PROFILING", "1") != "0"
+# Folded-stack profiles are written here as <profile_id>.folded
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "marco_profiles"))
+# Seconds between samples of the sampled threads' stacks
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
+# Minimum seconds between two profiled requests in one worker; requests inside the window run unprofiled
+PROFILE_MIN_INTERVAL = float(os.getenv("PROFILE_MIN_INTERVAL", "60"))
+# Sampling stops after this many seconds even if the request is still running
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "120"))
+PROFILE_ID_CHARS = set("0123456789abcdefT-")
+
+# True while the current request is being profiled; chart_pool renders in-process so charts are sampled too
+profiling_active = contextvars.ContextVar("profiling_active", default=False)
+
+_lock = threading.Lock()
+_last_started = 0.0
+_running = False
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class SamplingProfiler:
+    """
+    Samples the stacks of the event loop thread and the CPU executor threads every
+    PROFILE_INTERVAL seconds and writes them in the folded format read by flamegraph.pl
+    and speedscope. Other requests sharing those threads show up in the profile too.
+    """
+
+    def __init__(self, loop_thread_id: int):
+        self.profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.path = os.path.join(PROFILE_DIR, f"{self.profile_id}.folded")
+        self.samples = Counter()
+        self._loop_thread_id = loop_thread_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _sampled_threads(self) -> dict:
+        return {thread.ident: thread.name for thread in threading.enumerate()
+                if thread.ident == self._loop_thread_id or thread.name.startswith("cpu")}
+
+    def _run(self):
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(PROFILE_INTERVAL) and time.monotonic() < deadline:
+            threads = self._sampled_threads()
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id not in threads:
+                    continue
+                # Idle executor threads are parked in _worker waiting for work
+                if thread_id != self._loop_thread_id and frame.f_code.co_name == "_worker":
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(threads[thread_id])
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(self.path, "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logging.info(f"Profile {self.profile_id}: {sum(self.samples.values())} samples over "
+                     f"{time.perf_counter() - self._started:.2f}s written to {self.path}")
+
+def _acquire() -> bool:
+    """Claim the profiler if none is running and the rate limit allows another profile"""
+    global _last_started, _running
+    with _lock:
+        now = time.monotonic()
+        if _running or now - _last_started < PROFILE_MIN_INTERVAL:
+            return False
+        _running, _last_started = True, now
+        return True
+
+def _release():
+    global _running
+    with _lock:
+        _running = False
+
+@asynccontextmanager
+async def profile_request(requested: bool):
+    """
+    Profile the enclosed request when `requested` and the rate limit allows it.
+    Yields the SamplingProfiler (whose profile_id goes back to the caller) or None.
+    Stopping joins the sampler and writes the profile, so it runs off the event loop.
+    """
+    if not (PROFILING and requested and _acquire()):
+        if requested:
+            logging.info("Profile requested but skipped (disabled, already running or rate limited)")
+        yield None
+        return
+    profiler = SamplingProfiler(threading.get_ident())
+    token = profiling_active.set(True)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiling_active.reset(token)
+        try:
+            await asyncio.to_thread(profiler.stop)
+        except OSError as e:
+            logging.error(f"Could not write profile {profiler.profile_id}: {e}")
+        _release()
+
+def profile_path(profile_id: str):
+    """Path of a written profile, or None for unknown or malformed ids"""
+    if not profile_id or not set(profile_id) <= PROFILE_ID_CHARS:
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    return path if os.path.isfile(path) else None
@@ -0,0 +1,111 @@
+# app/prompt_encoding.py
+import os
+import re
+import logging
+import pandas as pd
+
+from app.reduction import plan_granularity
+
+# Rough size limit for the data block of one analysis prompt, in estimated tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "24000"))
+# Bookkeeping columns and codes that duplicate a *_text column; dropped unless the plan filters or groups on them
+IRRELEVANT_COLUMNS = [
+    "load_date", "version", "year", "timeframe", "reporting level", "bu", "leg_cat",
+    "country", "bsp", "ac",
+]
+# Year-to-date measures are only kept when the question asks about YTD
+YTD_COLUMNS = ["act_ytd", "py_ytd", "rf_ytd"]
+YTD_PATTERN = re.compile(r"\bytd\b|year[\s-]+to[\s-]+date", re.IGNORECASE)
+DECIMALS = 2
+# Average characters per token for CSV-like text, used for the size estimate
+CHARS_PER_TOKEN = 4
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate; good enough to compare a prompt against the budget"""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def plan_columns(df: pd.DataFrame, user_question: str = "", query_plan: dict = None) -> tuple:
+    """
+    (filtered, grouped): the columns a query plan pins to a single value, mapped to that
+    value, and the columns the answer is broken down by (the plan's group_by, or else the
+    slicing dimension and month the question needs).
+    """
+    query_plan = query_plan or {}
+    filtered = {col: value for col, value in query_plan.items()
+                if col in df.columns and isinstance(value, (str, int, float)) and value != ""}
+    months = query_plan.get("months")
+    if "month" in df.columns and isinstance(months, list) and len(months) == 1:
+        filtered["month"] = months[0]
+    group_by = query_plan.get("group_by")
+    if group_by:
+        grouped = {group_by} if isinstance(group_by, str) else set(group_by)
+    else:
+        dimension, by_month = plan_granularity(df, user_question or "", query_plan)
+        grouped = {dimension} if dimension else set()
+        if by_month:
+            grouped.add("month")
+    return filtered, grouped & set(df.columns)
+
+def prune_columns(df: pd.DataFrame, user_question: str = "", query_plan: dict = None) -> tuple:
+    """
+    Drop columns that carry no information for the question: those the plan pins to one value,
+    bookkeeping columns and duplicate codes the plan doesn't use, YTD measures unless asked for,
+    and any other column with a single value.
+    Returns (frame, constants) where constants maps each dropped single-valued column to its value.
+    """
+    filtered, grouped = plan_columns(df, user_question, query_plan)
+    constants = {}
+    for col, value in filtered.items():
+        if col not in grouped:
+            present = df[col].dropna()
+            constants[col] = present.iloc[0] if present.nunique() == 1 else value
+    drop = [col for col in IRRELEVANT_COLUMNS if col in df.columns and col not in grouped and col not in filtered]
+    if not YTD_PATTERN.search(user_question or ""):
+        drop += [col for col in YTD_COLUMNS if col in df.columns]
+    df = df.drop(columns=drop + list(constants))
+
+    if len(df) > 1:
+        for col in df.columns:
+            values = df[col].dropna().unique()
+            if len(values) == 1 and df[col].notna().all():
+                constants[col] = values[0]
+    return df.drop(columns=[col for col in constants if col in df.columns]), constants
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return f"{round(value, DECIMALS):g}"
+    return str(value)
+
+def encode_frame(df: pd.DataFrame, user_question: str = "", token_budget: int = PROMPT_TOKEN_BUDGET,
+                 query_plan: dict = None) -> str:
+    """
+    Serialize rows for an LLM prompt as CSV: columns that carry no information for the question
+    and plan are removed (constants are stated once above the table) and measures are rounded.
+    Rows that don't fit the token budget are cut from the end and the cut is stated in the block.
+    """
+    total_rows = len(df)
+    df, constants = prune_columns(df, user_question, query_plan)
+    measures = df.select_dtypes("number").columns.difference(["month"])
+    df = df.copy()
+    df[measures] = df[measures].astype("float64").round(DECIMALS)
+
+    header = []
+    if constants:
+        header.append("Same for every row: " + "; ".join(f"{col}={_format_value(v)}" for col, v in constants.items()))
+    table = df.to_csv(index=False, float_format=f"%.{DECIMALS}f").strip()
+    lines = table.split("\n")
+
+    budget_chars = token_budget * CHARS_PER_TOKEN - sum(len(line) + 1 for line in header) - 80
+    if len(table) > budget_chars:
+        kept, used = 1, len(lines[0]) + 1
+        while kept < len(lines) and used + len(lines[kept]) + 1 <= budget_chars:
+            used += len(lines[kept]) + 1
+            kept += 1
+        logging.warning(f"Prompt data for {total_rows} rows exceeds the {token_budget} token budget, keeping {kept - 1} rows")
+        lines = lines[:kept]
+        header.append(f"Showing the first {kept - 1} of {total_rows} rows (token budget).")
+
+    block = "\n".join(header + lines)
+    logging.info(f"Encoded {total_rows} rows x {len(df.columns)} columns for the prompt "
+                 f"(~{estimate_tokens(block)} tokens, {len(constants)} constant columns folded)")
+    return block
@@ -86,12 +86,13 @@ Use actual numbers from the data. Keep it short and factual.
 RESPOND WITH PURE JSON ONLY:
 """
 
-def build_insight_and_charting_prompt(user_question: str, data_json: str):
+def build_insight_and_charting_prompt(user_question: str, data_block: str):
     prompt = f"""
 You are a senior business analyst for Mondelez International.
 
 User Question: "{user_question}"
-Data: """ + data_json + """
+Data (CSV with a header row; Act = actual, rf = reforecast, py = prior year; month is YYYYMM):
+""" + data_block + """
 
 CRITICAL INSTRUCTIONS:
 - Respond with EXACTLY ONE JSON object and NOTHING ELSE
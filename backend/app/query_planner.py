@@ -0,0 +1,277 @@
+# app/query_planner.py
+import os
+import re
+import logging
+from collections import deque
+
+# Set LOCAL_QUERY_PLANNER=0 to always plan with the LLM
+LOCAL_QUERY_PLANNER = os.getenv("LOCAL_QUERY_PLANNER", "1") != "0"
+
+# Plan keys resolved from the dataset's distinct values
+PLAN_COLUMNS = ["brand_text", "region", "country_text", "kpi_text", "leg_cat_text", "market_type_text"]
+
+# Extra phrasings, mapped onto values only when those values exist in the data
+ALIASES = {
+    "kpi_text": {
+        "net revenue": "Net Revenue", "revenue": "Net Revenue", "sales": "Net Revenue", "nr": "Net Revenue",
+        "gross profit": "Gross Profit (MM) Kgs", "gp": "Gross Profit (MM) Kgs",
+        "operating income": "Operating Income", "oi": "Operating Income", "earnings": "Operating Income",
+        "volume": "Volume (MM) Kgs",
+    },
+    "region": {"europe": "EU", "latin america": "LA", "latam": "LA"},
+    "country_text": {"uk": "United Kingdom", "britain": "United Kingdom", "great britain": "United Kingdom"},
+    "leg_cat_text": {
+        "biscuits": "Bisc & Bkd Sn", "biscuit": "Bisc & Bkd Sn", "baked snacks": "Bisc & Bkd Sn",
+        "chocolate": "Chocolate", "candy": "Candy", "gum & candy": "Candy",
+        "beverages": "Beverages", "beverage": "Beverages", "meals": "Meals", "cheese & grocery": "Meals",
+    },
+    "market_type_text": {
+        "developed markets": "Developed Markets", "developed market": "Developed Markets",
+        "emerging markets": "Emerging Markets", "emerging market": "Emerging Markets",
+    },
+}
+
+# Catch-all members that read like ordinary phrases must match with their original casing
+CASE_SENSITIVE_VALUES = {"All Other", "No Product", "No Category", "Planning Adj", "Planning adjustment"}
+
+MONTHS = {name: i for i, name in enumerate(
+    ["january", "february", "march", "april", "may", "june", "july",
+     "august", "september", "october", "november", "december"], 1)}
+MONTHS.update({name[:3]: i for name, i in list(MONTHS.items())})
+MONTHS["sept"] = 9
+
+PERIOD_PATTERN = re.compile(
+    r"\b(?:(?P<month>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?"
+    r"|(?P<quarter>q[1-4])|(?P<half>h[12])|(?P<ordinal>first|second|1st|2nd) half"
+    r"|(?P<todate>mtd|qtd|ytd)|(?P<fy>fy|full year))"
+    r"(?:\s*'?(?P<year>20\d\d|\d\d)\b)?"
+    r"|\b(?P<bare_year>20\d\d)\b"
+)
+MONTH_RANGE_PATTERN = re.compile(
+    r"\b(?P<first>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\.?\s*(?:-|–|to|through|until)\s*"
+    r"(?P<last>" + "|".join(sorted(MONTHS, key=len, reverse=True)) + r")\b"
+)
+# Relative periods depend on "today" and are left to the LLM planner
+RELATIVE_PERIOD_PATTERN = re.compile(r"\b(last|previous|prior|this|current|next|past)\s+(\d+\s+)?(month|quarter|year|half|week)s?\b")
+# "may" is also a verb; only read it as a month when it is followed by a year or preceded by "in"/"of"
+AMBIGUOUS_MONTHS = {"may", "mar", "jun", "dec", "sep"}
+
+# Capitalized words that never name a data entity, so leaving them unmatched is fine
+KNOWN_WORDS = {
+    "what", "how", "which", "who", "why", "when", "where", "show", "give", "tell", "list", "compare",
+    "summarize", "analyze", "analyse", "is", "are", "was", "were", "the", "me", "for", "in", "of",
+    "mdlz", "mondelez", "international", "kpi", "kpis", "i", "and", "vs", "versus", "please", "can",
+    "could", "total", "top", "bottom", "rf", "py", "act", "actual", "actuals", "plan", "reforecast",
+    "performance", "trend", "trends", "p&l", "pnl", "all", "regions", "brands", "key", "region",
+    "mtd", "qtd", "ytd", "fy", "q1", "q2", "q3", "q4", "h1", "h2", "m", "mm", "kgs",
+}
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds every occurrence of every pattern in one pass over the text"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for pattern in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append(pattern)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(char, 0)
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def finditer(self, text: str):
+        """Yield (start, end, pattern) for every match, overlapping ones included"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for pattern in self.output[state]:
+                yield i - len(pattern) + 1, i + 1, pattern
+
+def _is_word_boundary(text: str, start: int, end: int) -> bool:
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not before.isalnum() and not after.isalnum()
+
+class LocalQueryPlanner:
+    """
+    Builds the same plan dict as build_query_planner_prompt from a dictionary match of the
+    dataset's own dimension values and aliases. plan() returns None whenever the match is
+    ambiguous or leaves unrecognized entity-like words, so the caller can defer to the LLM.
+    """
+
+    def __init__(self, df):
+        self.terms = {}
+        for col in PLAN_COLUMNS:
+            if col not in df.columns:
+                continue
+            values = {str(value) for value in df[col].dropna().unique()}
+            for value in values:
+                self._add_term(value, col, value)
+            by_lower = {value.lower(): value for value in values}
+            for alias, target in ALIASES.get(col, {}).items():
+                if target.lower() in by_lower:
+                    self._add_term(alias, col, by_lower[target.lower()])
+        self.matcher = AhoCorasick(self.terms)
+
+        months = sorted({int(month) for month in df["month"].dropna().unique()}) if "month" in df.columns else []
+        self.months = months
+        self.default_year = months[-1] // 100 if months else None
+        # "To date" periods run up to the month of the latest load
+        self.current_month = _load_month(df) or (months[-1] if months else None)
+
+    def _add_term(self, phrase: str, col: str, value: str):
+        key = _normalize(phrase)
+        if not key:
+            return
+        # Acronym-like terms ("LA", "LU", "HQ", alias "UK") must match with their original casing
+        if len(key) <= 3:
+            case_sensitive = phrase if phrase != phrase.lower() else phrase.upper()
+        else:
+            case_sensitive = phrase if phrase in CASE_SENSITIVE_VALUES else None
+        self.terms.setdefault(key, set()).add((col, value, case_sensitive))
+
+    def _match_entities(self, question: str):
+        text = _normalize(question)
+        original = _clean(question)
+        candidates = [
+            (start, end, pattern) for start, end, pattern in self.matcher.finditer(text)
+            if _is_word_boundary(text, start, end)
+        ]
+        # Leftmost-longest, non-overlapping
+        candidates.sort(key=lambda match: (match[0], -(match[1] - match[0])))
+        matches, covered_until = [], 0
+        for start, end, pattern in candidates:
+            if start < covered_until:
+                continue
+            entries = {
+                (col, value) for col, value, case_sensitive in self.terms[pattern]
+                if case_sensitive is None or original[start:end] == case_sensitive
+            }
+            if entries:
+                matches.append((start, end, entries))
+                covered_until = end
+        return text, matches
+
+    def parse_months(self, question: str):
+        """Resolve month, quarter, half-year and to-date expressions to YYYYMM integers"""
+        text = _normalize(question)
+        result = set()
+        for match in PERIOD_PATTERN.finditer(text):
+            year = match.group("year") or match.group("bare_year")
+            year = (int(year) + 2000 if len(year) == 2 else int(year)) if year else self.default_year
+            if year is None:
+                continue
+            if match.group("month"):
+                name = match.group("month")
+                preceding = text[:match.start()].rstrip().rsplit(" ", 1)[-1]
+                if name in AMBIGUOUS_MONTHS and not match.group("year") and preceding not in ("in", "of", "for", "during"):
+                    continue
+                result.add(year * 100 + MONTHS[name])
+            elif match.group("quarter"):
+                first = (int(match.group("quarter")[1]) - 1) * 3 + 1
+                result.update(year * 100 + m for m in range(first, first + 3))
+            elif match.group("half") or match.group("ordinal"):
+                second = (match.group("half") or match.group("ordinal")) in ("h2", "second", "2nd")
+                result.update(year * 100 + m for m in (range(7, 13) if second else range(1, 7)))
+            elif match.group("todate"):
+                if self.current_month is None:
+                    continue
+                current = self.current_month
+                kind = match.group("todate")
+                first = current if kind == "mtd" else (current - (current % 100 - 1) % 3 if kind == "qtd" else current - current % 100 + 1)
+                result.update(range(first, current + 1))
+            elif match.group("fy") or match.group("bare_year"):
+                result.update(year * 100 + m for m in range(1, 13))
+        for match in MONTH_RANGE_PATTERN.finditer(text):
+            year = self.default_year
+            first, last = MONTHS[match.group("first")], MONTHS[match.group("last")]
+            if year is not None and first <= last:
+                result.update(year * 100 + m for m in range(first, last + 1))
+        if not result:
+            return None
+        available = [month for month in sorted(result) if not self.months or month in self.months]
+        # A whole year that the data fully covers adds no filter
+        if self.months and available == self.months and len(result) >= 12:
+            return None
+        return available or sorted(result)
+
+    def plan(self, question: str):
+        """Return a query plan dict, or None when the question should go to the LLM planner"""
+        text, matches = self._match_entities(question)
+        plan = {col: None for col in PLAN_COLUMNS}
+        for start, end, entries in matches:
+            if len({col for col, _ in entries}) > 1:
+                logging.info(f"Local planner: '{text[start:end]}' is ambiguous across {sorted(entries)}")
+                return None
+            col, value = next(iter(entries))
+            if len(entries) > 1 or (plan[col] is not None and plan[col] != value):
+                logging.info(f"Local planner: several values for {col}, deferring to the LLM planner")
+                return None
+            plan[col] = value
+
+        if self._has_unrecognized_entities(question, matches):
+            return None
+        if RELATIVE_PERIOD_PATTERN.search(text):
+            logging.info("Local planner: relative time period, deferring to the LLM planner")
+            return None
+
+        plan["months"] = self.parse_months(question)
+        plan["analysis_type"] = _analysis_type(text)
+        logging.info(f"Local planner resolved: {plan}")
+        return plan
+
+    def _has_unrecognized_entities(self, question: str, matches) -> bool:
+        """Capitalized words outside any match may be entities we don't know (typos, new brands)"""
+        original = _clean(question)
+        covered = [(start, end) for start, end, _ in matches]
+        for word in re.finditer(r"[A-Za-z][\w&'!-]*", original):
+            if word.start() == 0 or not word.group()[0].isupper():
+                continue
+            if any(start <= word.start() < end for start, end in covered):
+                continue
+            token = word.group().lower().strip("'!")
+            if token in KNOWN_WORDS or token in MONTHS or PERIOD_PATTERN.fullmatch(token):
+                continue
+            logging.info(f"Local planner: unrecognized entity '{word.group()}', deferring to the LLM planner")
+            return True
+        return False
+
+def _clean(text: str) -> str:
+    return re.sub(r"\s+", " ", text.replace("’", "'"))
+
+def _normalize(text: str) -> str:
+    return _clean(text).lower()
+
+def _load_month(df):
+    if "load_date" not in df.columns or not len(df):
+        return None
+    latest = str(max(str(value) for value in df["load_date"].dropna().unique()))
+    match = re.match(r"(\d{4})-(\d{2})", latest)
+    return int(match.group(1)) * 100 + int(match.group(2)) if match else None
+
+def _analysis_type(text: str) -> str:
+    if re.search(r"\b(p&l|pnl|p and l|profit and loss)\b", text):
+        return "pnl_analysis"
+    if re.search(r"\btrends?\b|over time|month over month|monthly", text):
+        return "trend_analysis"
+    if re.search(r"\bcategor(y|ies)\b", text):
+        return "category_analysis"
+    return "performance_overview"
@@ -0,0 +1,118 @@
+# app/reduction.py
+import os
+import re
+import logging
+import pandas as pd
+
+from app.cube import CUBE_MEASURES
+
+# Set AGGREGATE_PROMPTS=0 to send sampled raw rows to the analysis LLM instead of aggregates
+AGGREGATE_PROMPTS = os.getenv("AGGREGATE_PROMPTS", "1") != "0"
+# Members of the slicing dimension kept by name; the rest are summed into OTHER_LABEL
+REDUCTION_TOP_N = int(os.getenv("REDUCTION_TOP_N", "10"))
+# Most aggregate rows sent in one prompt
+REDUCTION_MAX_ROWS = int(os.getenv("REDUCTION_MAX_ROWS", "200"))
+OTHER_LABEL = "Other"
+TOTAL_LABEL = "Total"
+
+# Words that name a slicing dimension, checked in order
+DIMENSION_KEYWORDS = [
+    (r"\bbrands?\b", "brand_text"),
+    (r"\bcountr(y|ies)\b", "country_text"),
+    (r"\bregions?\b", "region"),
+    (r"\bcategor(y|ies)\b", "leg_cat_text"),
+    (r"\b(developed|emerging) markets?\b|\bmarket types?\b", "market_type_text"),
+]
+# Default drill-down when the question names no dimension: one level below the filters
+DRILL_DOWN = ["region", "country_text", "brand_text"]
+TIME_PATTERN = re.compile(r"\btrends?\b|\bmonth(ly|s)?\b|over time|\bmom\b")
+
+def plan_granularity(df: pd.DataFrame, user_question: str, query_plan: dict = None) -> tuple:
+    """Pick the (slicing dimension, include month) a question needs"""
+    query_plan = query_plan or {}
+    question = user_question.lower()
+    dimension = next((col for pattern, col in DIMENSION_KEYWORDS if re.search(pattern, question)), None)
+    if dimension is None and query_plan.get("analysis_type") == "category_analysis":
+        dimension = "leg_cat_text"
+    if dimension is None:
+        # Drill one level below the deepest filtered level, not into a level above it
+        filtered = [level for level, col in enumerate(DRILL_DOWN) if query_plan.get(col)]
+        below = DRILL_DOWN[filtered[-1] + 1:] if filtered else DRILL_DOWN
+        dimension = next((col for col in below if col in df.columns), None)
+    if dimension is not None and (dimension not in df.columns or df[dimension].nunique() < 2):
+        dimension = None
+
+    months = df["month"].nunique() if "month" in df.columns else 0
+    by_month = months > 1 and (bool(TIME_PATTERN.search(question)) or query_plan.get("analysis_type") == "trend_analysis")
+    return dimension, by_month
+
+def _with_variances(frame: pd.DataFrame) -> pd.DataFrame:
+    frame = frame.copy()
+    frame[CUBE_MEASURES] = frame[CUBE_MEASURES].round(2)
+    frame["vs_rf"] = (frame["Act"] - frame["rf"]).round(2)
+    frame["vs_py"] = (frame["Act"] - frame["py"]).round(2)
+    frame["vs_rf_pct"] = (frame["vs_rf"] / frame["rf"].abs().where(frame["rf"] != 0) * 100).round(1)
+    frame["vs_py_pct"] = (frame["vs_py"] / frame["py"].abs().where(frame["py"] != 0) * 100).round(1)
+    return frame
+
+def _top_members(df: pd.DataFrame, dimension: str, top_n: int) -> list:
+    """
+    Members to keep by name, largest first. A member's size is its share of each KPI's absolute
+    actuals summed over all KPIs, so every KPI counts without mixing units; when there are
+    no more than top_n members, all of them are kept.
+    """
+    magnitude = df["Act"].abs()
+    if "kpi_text" in df.columns:
+        kpi_totals = magnitude.groupby(df["kpi_text"], observed=True).transform("sum")
+        magnitude = (magnitude / kpi_totals.where(kpi_totals != 0)).fillna(0)
+    totals = magnitude.groupby(df[dimension], observed=True).sum().sort_values(ascending=False, kind="stable")
+    return list(totals.index[:top_n])
+
+def _aggregate(df: pd.DataFrame, dimension: str, by_month: bool, top_n: int) -> pd.DataFrame:
+    keys = [col for col in ("kpi_text",) if col in df.columns]
+    if by_month:
+        keys.append("month")
+    frames = []
+    if dimension:
+        top = _top_members(df, dimension, top_n)
+        labelled = df[keys + CUBE_MEASURES].copy()
+        labelled[dimension] = df[dimension].astype(str).where(df[dimension].isin(top), OTHER_LABEL)
+        detail = labelled.groupby(keys + [dimension], observed=True, sort=False)[CUBE_MEASURES].sum().reset_index()
+        # Named members first in rank order, the Other bucket last
+        order = {str(member): rank for rank, member in enumerate(top)}
+        detail["_rank"] = detail[dimension].map(order).fillna(len(order))
+        detail = detail.sort_values(keys + ["_rank"]).drop(columns="_rank")
+        frames.append(detail)
+    # Exact totals over every fetched row, not just the named members
+    totals = df.groupby(keys, observed=True)[CUBE_MEASURES].sum().reset_index() if keys else df[CUBE_MEASURES].sum().to_frame().T
+    if dimension:
+        totals[dimension] = TOTAL_LABEL
+    frames.append(totals)
+    result = pd.concat(frames, ignore_index=True)
+    columns = keys + ([dimension] if dimension else []) + CUBE_MEASURES
+    return _with_variances(result[columns])
+
+def reduce_for_prompt(df: pd.DataFrame, user_question: str, query_plan: dict = None,
+                      max_rows: int = REDUCTION_MAX_ROWS, top_n: int = REDUCTION_TOP_N) -> pd.DataFrame:
+    """
+    Aggregate fetched rows to the granularity the question needs: sums of Act/rf/py by KPI
+    (and month for trends) for the top-N members of one slicing dimension plus an Other
+    bucket, exact totals, and precomputed variances. Narrows top-N, then drops the month
+    split, until the result fits in max_rows.
+    """
+    if df.empty or not set(CUBE_MEASURES) <= set(df.columns):
+        return df
+    dimension, by_month = plan_granularity(df, user_question, query_plan)
+    while True:
+        reduced = _aggregate(df, dimension, by_month, top_n)
+        if len(reduced) <= max_rows:
+            break
+        if dimension and top_n > 1:
+            top_n = max(1, top_n // 2)
+        elif by_month:
+            by_month = False
+        else:
+            break
+    logging.info(f"Reduced {len(df)} rows to {len(reduced)} aggregate rows "
+                 f"(dimension={dimension}, by_month={by_month}, top_n={top_n})")
+    return reduced
@@ -0,0 +1,93 @@
+# app/streaming.py
+import json
+import re
+import asyncio
+
+TEXT_ANSWER_START = re.compile(r'"text_answer"\s*:\s*"')
+JSON_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+class TextAnswerExtractor:
+    """
+    Incrementally pull the decoded "text_answer" string out of a JSON document that
+    arrives in chunks. feed() returns whatever new answer text the chunk completed.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = None  # index just past the opening quote once the key has been seen
+        self.done = False
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        self._buffer += chunk
+        if self._pos is None:
+            found = TEXT_ANSWER_START.search(self._buffer)
+            if not found:
+                return ""
+            self._pos = found.end()
+
+        out = []
+        buffer, pos = self._buffer, self._pos
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char == '"':
+                self.done = True
+                pos += 1
+                break
+            if char != "\\":
+                out.append(char)
+                pos += 1
+                continue
+            # Escapes split across chunks wait for the next chunk
+            if pos + 1 >= len(buffer):
+                break
+            code = buffer[pos + 1]
+            if code == "u":
+                if pos + 6 > len(buffer):
+                    break
+                out.append(chr(int(buffer[pos + 2:pos + 6], 16)))
+                pos += 6
+            else:
+                out.append(JSON_ESCAPES.get(code, code))
+                pos += 2
+        self._pos = pos
+        return "".join(out)
+
+class ChatEventStream:
+    """Collects pipeline events for one /chat/stream request and remembers what was already sent"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue()
+        self.text_streamed = False
+        self.charts_sent = 0
+        self.chart_specs_sent = 0
+
+    async def emit(self, event: str, data: dict):
+        await self.queue.put((event, data))
+
+    async def text(self, delta: str):
+        if delta:
+            self.text_streamed = True
+            await self.emit("text", {"delta": delta})
+
+    async def chart(self, index: int, image: str, full_url: str = None):
+        """Charts finish in any order; `index` is the chart's position among the requested specs"""
+        data = {"index": index, "image": image}
+        if full_url:
+            data["full_url"] = full_url
+        await self.emit("chart", data)
+        self.charts_sent += 1
+
+    async def chart_spec(self, spec: dict):
+        await self.emit("chart_spec", {"index": self.chart_specs_sent, "spec": spec})
+        self.chart_specs_sent += 1
+
+async def emit(events: ChatEventStream, event: str, **data):
+    """Send a stage event when the request is being streamed; a no-op for plain /chat"""
+    if events is not None:
+        await events.emit(event, data)
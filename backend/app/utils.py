@@ -2,6 +2,9 @@ import json
 import re
 import logging
 
+from app.metrics import timed
+
+@timed("parse")
 def clean_and_parse_json(text: str):
     """Enhanced JSON parsing with better error handling"""
     if not text:
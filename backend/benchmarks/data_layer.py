@@ -0,0 +1,186 @@
+# benchmarks/data_layer.py
+"""
+Time the data-layer loader functions on generated extracts of increasing size, with
+peak traced memory per call and the private vs file-backed resident memory added by
+loading, and write a report that later runs can be compared to.
+
+    cd backend
+    python -m benchmarks.data_layer                              # 10k and 1m rows
+    python -m benchmarks.data_layer --sizes 10k,1m,10m --json baseline.json
+    python -m benchmarks.data_layer --compare baseline.json
+
+Extracts come from benchmarks.synthetic_data and are cached under data/. The LLM is
+the zero-latency stub, so comprehensive_analysis_async measures batching and prompt building only.
+"""
+import os
+import gc
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import statistics
+import tracemalloc
+
+# The batching benchmark must never reach a real model
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("LLM_STUB_LATENCY", "0")
+
+import numpy as np
+import pandas as pd
+
+from app.dataset import FinancialDataset, load_financials
+from app.data_loader import (
+    get_dynamic_data, get_performance_summary, get_benchmark_data, get_aggregated_data,
+    aggregated_data_block, comprehensive_analysis_async,
+)
+from benchmarks.synthetic_data import SIZES, parse_size, size_label, ensure_dataset
+
+QUESTION = "How is Net Revenue trending by country for this brand?"
+
+def _top(df: pd.DataFrame, col: str):
+    return str(df[col].value_counts().index[0])
+
+def cases(dataset: FinancialDataset, batch_rows: int) -> list:
+    """(name, callable) pairs; filter values are picked from the data so every size returns rows"""
+    df = dataset.df
+    brand, country, kpi, region = _top(df, "brand_text"), _top(df, "country_text"), _top(df, "kpi_text"), _top(df, "region")
+    months = sorted(int(month) for month in df["month"].unique())[-3:]
+    brand_filters = {"brand_text": brand, "dataset": dataset}
+    fetched = get_dynamic_data(**brand_filters)
+    plan = {"brand_text": brand, "analysis_type": "trend_analysis"}
+    return [
+        ("get_dynamic_data[brand]", lambda: get_dynamic_data(**brand_filters)),
+        ("get_dynamic_data[brand+country+kpi]",
+         lambda: get_dynamic_data(brand_text=brand, country_text=country, kpi_text=kpi, dataset=dataset)),
+        ("get_dynamic_data[region+months]", lambda: get_dynamic_data(region=region, months=months, dataset=dataset)),
+        ("get_dynamic_data[all]", lambda: get_dynamic_data(dataset=dataset)),
+        ("get_performance_summary[brand]", lambda: get_performance_summary(dict(brand_filters))),
+        ("get_benchmark_data[brand, py]", lambda: get_benchmark_data({**brand_filters, "months": months})),
+        ("get_aggregated_data[brand by region]",
+         lambda: get_aggregated_data(["region"], {"Act": "sum", "rf": "sum", "py": "sum"}, **brand_filters)),
+        ("aggregated_data_block[brand]", lambda: aggregated_data_block(QUESTION, fetched, plan)),
+        (f"comprehensive_analysis[{batch_rows} rows]", 
+         lambda: asyncio.run(comprehensive_analysis_async(QUESTION, fetched.head(batch_rows)))),
+    ]
+
+def _rows(result) -> int:
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    if isinstance(result, str):
+        return result.count("\n")
+    if isinstance(result, dict):
+        return result.get("total_batches", 0)
+    return 0
+
+def measure(func, repeats: int) -> dict:
+    """Median/min wall time over `repeats` untraced runs, then one traced run for peak memory"""
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "rows": _rows(result),
+        "median_ms": statistics.median(timings) * 1000,
+        "min_ms": min(timings) * 1000,
+        "peak_mb": peak / 1e6,
+    }
+
+def _resident_mb() -> dict:
+    """Private (anonymous) and file-backed resident memory of this process; empty without /proc"""
+    try:
+        with open("/proc/self/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return {"anon": int(fields["RssAnon"].split()[0]) / 1024, "file": int(fields["RssFile"].split()[0]) / 1024}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+def run_size(rows: int, repeats: int, batch_rows: int, seed: int) -> dict:
+    path = ensure_dataset(rows, seed)
+    # Loading and indexing happen once per snapshot, so they are timed once (and traced while timed)
+    results = {}
+    gc.collect()
+    resident_before = _resident_mb()
+    tracemalloc.start()
+    started = time.perf_counter()
+    df = load_financials(path)
+    load_ms = (time.perf_counter() - started) * 1000
+    _, load_peak = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    dataset = FinancialDataset(df, source=path)
+    build_ms = (time.perf_counter() - started) * 1000
+    _, build_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # Memory-mapped Arrow columns show up as file-backed (shareable) pages rather than private ones
+    resident_after = _resident_mb()
+    resident = {kind: resident_after[kind] - resident_before[kind] for kind in resident_after}
+
+    results["load_financials"] = {"rows": len(df), "median_ms": load_ms, "min_ms": load_ms, "peak_mb": load_peak / 1e6}
+    results["FinancialDataset"] = {"rows": len(df), "median_ms": build_ms, "min_ms": build_ms, "peak_mb": build_peak / 1e6}
+    for name, func in cases(dataset, batch_rows):
+        results[name] = measure(func, repeats)
+        if results[name]["rows"] == 0:
+            raise RuntimeError(f"{name} returned no rows on {size_label(rows)} rows, so it would only time an empty path")
+    return {"rows": rows, "frame_mb": dataset.memory_bytes / 1e6, "resident_mb": resident, "results": results}
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+        "platform": platform.platform(), "cpus": os.cpu_count(),
+    }
+
+def print_report(report: dict, baseline: dict = None):
+    base = {(size["rows"], name): stats for size in (baseline or {}).get("sizes", []) for name, stats in size["results"].items()}
+    for size in report["sizes"]:
+        resident = size.get("resident_mb") or {}
+        loaded = (f"; load added {resident['anon']:.1f} MB private, {resident['file']:.1f} MB file-backed resident"
+                  if resident else "")
+        print(f"\n=== {size_label(size['rows'])} rows ({size['frame_mb']:.1f} MB in memory{loaded}) ===")
+        header = f"{'case':42}{'rows out':>10}{'median ms':>11}{'min ms':>10}{'peak MB':>9}"
+        print(header + (f"{'vs base':>9}" if baseline else ""))
+        for name, stats in size["results"].items():
+            line = (f"{name:42}{stats['rows']:10d}{stats['median_ms']:11.1f}{stats['min_ms']:10.1f}"
+                    f"{stats['peak_mb']:9.1f}")
+            previous = base.get((size["rows"], name))
+            if previous and previous["median_ms"] > 0:
+                line += f"{stats['median_ms'] / previous['median_ms']:8.2f}x"
+            print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10k,1m", help=f"comma-separated row counts ({', '.join(SIZES)} or numbers)")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--batch-rows", type=int, default=20_000, help="rows given to comprehensive_analysis_async")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--compare", help="earlier --json report to show ratios against")
+    args = parser.parse_args(argv)
+    # The loaders log every call; keep the report readable
+    logging.getLogger().setLevel(logging.WARNING)
+
+    report = {"environment": environment(), "sizes": []}
+    for size in args.sizes.split(","):
+        report["sizes"].append(run_size(parse_size(size), args.repeats, args.batch_rows, args.seed))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(f"python {report['environment']['python']}, pandas {report['environment']['pandas']}, "
+          f"{report['environment']['cpus']} cpus")
+    print_report(report, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.json}")
+
+if __name__ == "__main__":
+    main()
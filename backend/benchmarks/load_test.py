@@ -0,0 +1,198 @@
+# benchmarks/load_test.py
+"""
+Drive /chat at increasing concurrency with a realistic question mix and report
+throughput plus p50/p95/p99 latency end to end and for each pipeline stage.
+
+    cd backend
+    python -m benchmarks.load_test                       # in-process, stub LLM
+    LLM_BACKEND=replay python -m benchmarks.load_test    # in-process, recorded cassettes
+    python -m benchmarks.load_test --url http://localhost:8000 --levels 8,32
+
+In-process runs default to LLM_BACKEND=stub and clear the caches before every
+level so levels are comparable. Stage percentiles are estimated from the
+/api/metrics histograms, so they are bucket-accurate rather than exact.
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+from collections import defaultdict
+
+# Offline defaults; must be set before the app is imported
+os.environ.setdefault("LLM_BACKEND", "stub")
+os.environ.setdefault("CHART_CACHE_PATH", "")
+
+import httpx
+
+from benchmarks.questions import question_mix
+
+STAGE_METRICS = {
+    "marco_stage_duration_seconds": "stage",
+    "marco_llm_call_duration_seconds": None,  # every model call, reported as llm_call
+}
+PERCENTILES = (50, 95, 99)
+NO_DATA_ERROR = "No data found"
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of raw samples"""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def _parse_labels(text: str) -> dict:
+    labels = {}
+    for pair in text.split('",'):
+        key, _, value = pair.partition('="')
+        labels[key] = value.rstrip('"')
+    return labels
+
+def parse_stage_buckets(metrics_text: str) -> dict:
+    """{stage: {upper bound: cumulative count}} from the Prometheus exposition"""
+    buckets = defaultdict(lambda: defaultdict(float))
+    for line in metrics_text.splitlines():
+        name, _, rest = line.partition("_bucket{")
+        if name not in STAGE_METRICS or not rest:
+            continue
+        labels_text, _, value = rest.rpartition("} ")
+        labels = _parse_labels(labels_text)
+        stage = labels.get(STAGE_METRICS[name]) if STAGE_METRICS[name] else "llm_call"
+        bound = float("inf") if labels["le"] == "+Inf" else float(labels["le"])
+        buckets[stage][bound] += float(value)
+    return buckets
+
+def histogram_quantile(buckets: dict, quantile: float) -> float:
+    """Linear interpolation inside the bucket holding the quantile, like PromQL histogram_quantile"""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]] if bounds else 0
+    if total <= 0:
+        return float("nan")
+    rank = quantile * total
+    lower, below = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= rank:
+            if bound == float("inf"):
+                return lower
+            return lower + (bound - lower) * ((rank - below) / (count - below) if count > below else 1)
+        lower, below = bound, count
+    return lower
+
+def stage_report(before: dict, after: dict) -> dict:
+    """Per-stage count and percentiles for the observations made between two scrapes"""
+    report = {}
+    for stage, buckets in sorted(after.items()):
+        delta = {bound: count - before.get(stage, {}).get(bound, 0) for bound, count in buckets.items()}
+        count = delta.get(float("inf"), 0)
+        if count <= 0:
+            continue
+        report[stage] = {"count": int(count), **{f"p{pct}": histogram_quantile(delta, pct / 100) for pct in PERCENTILES}}
+    return report
+
+async def run_level(client: httpx.AsyncClient, questions: list, concurrency: int) -> dict:
+    """Closed loop: `concurrency` workers each send their next question as soon as the previous one returns"""
+    pending = list(questions)
+    latencies, by_kind, outcomes = [], defaultdict(list), defaultdict(int)
+
+    async def worker():
+        while pending:
+            kind, question = pending.pop()
+            started = time.perf_counter()
+            try:
+                response = await client.post("/chat", json={"message": {"text": question, "files": []}, "history": []})
+                error = response.json().get("error") if response.status_code == 200 else f"HTTP {response.status_code}"
+            except httpx.HTTPError as e:
+                error = type(e).__name__
+            elapsed = time.perf_counter() - started
+            latencies.append(elapsed)
+            by_kind[kind].append(elapsed)
+            # Questions about combinations the data doesn't have are answered, not failed
+            outcomes["no_data" if error == NO_DATA_ERROR else "error" if error else "ok"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - started
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": outcomes["error"],
+        "no_data": outcomes["no_data"],
+        "throughput_rps": len(latencies) / wall if wall else 0.0,
+        **{f"p{pct}": percentile(latencies, pct) for pct in PERCENTILES},
+        "by_kind": {kind: {f"p{pct}": percentile(values, pct) for pct in PERCENTILES} | {"count": len(values)}
+                    for kind, values in sorted(by_kind.items())},
+    }
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:8.0f}"
+
+def print_level(result: dict):
+    print(f"\n=== concurrency {result['concurrency']}: {result['requests']} requests, {result['errors']} errors, {result['no_data']} without data, "
+          f"{result['throughput_rps']:.2f} req/s ===")
+    print(f"{'':24}{'count':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    print(f"{'end to end':24}{result['requests']:8d}{_ms(result['p50'])} {_ms(result['p95'])} {_ms(result['p99'])}")
+    for kind, stats in result["by_kind"].items():
+        print(f"{'  ' + kind:24}{stats['count']:8d}{_ms(stats['p50'])} {_ms(stats['p95'])} {_ms(stats['p99'])}")
+    for stage, stats in result["stages"].items():
+        print(f"{'stage ' + stage:24}{stats['count']:8d}{_ms(stats['p50'])} {_ms(stats['p95'])} {_ms(stats['p99'])}")
+
+def _clear_caches():
+    from app.main import plan_cache, response_cache
+    from app.chart_store import chart_cache
+    for cache in (plan_cache, response_cache, chart_cache):
+        cache.clear()
+
+async def main(args) -> list:
+    levels = [int(level) for level in args.levels.split(",")]
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+    else:
+        from app.main import app
+        from app.chart_pool import warm_chart_pool, shutdown_chart_pool
+        await warm_chart_pool()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=args.timeout)
+    print(f"LLM backend: {os.environ['LLM_BACKEND'] if not args.url else 'server-side'}; levels {levels}, "
+          f"{args.requests} requests per level")
+
+    results = []
+    try:
+        if args.warmup:
+            await run_level(client, question_mix(args.warmup, seed=args.seed + 1000), min(levels))
+        for level in levels:
+            if not args.url and not args.keep_cache:
+                _clear_caches()
+            before = parse_stage_buckets((await client.get("/api/metrics")).text)
+            result = await run_level(client, question_mix(args.requests, seed=args.seed + level), level)
+            after = parse_stage_buckets((await client.get("/api/metrics")).text)
+            result["stages"] = stage_report(before, after)
+            print_level(result)
+            results.append(result)
+    finally:
+        await client.aclose()
+        if not args.url:
+            shutdown_chart_pool()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"llm_backend": os.environ["LLM_BACKEND"], "levels": results}, f, indent=2)
+        print(f"\nWrote {args.json}")
+    return results
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--levels", default="1,4,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per level")
+    parser.add_argument("--warmup", type=int, default=10, help="requests sent before the first level")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the question mix")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--keep-cache", action="store_true", help="don't clear caches between in-process levels")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    results = asyncio.run(main(parse_args()))
+    sys.exit(1 if any(result["errors"] == result["requests"] for result in results) else 0)
@@ -0,0 +1,63 @@
+# benchmarks/questions.py
+import random
+
+BRANDS = ["Oreo", "Chips Ahoy!", "Milka", "Ritz"]
+METRICS = ["Net Revenue", "Gross Profit", "Operating Income", "Volume"]
+TIME_PERIODS = ["MTD", "QTD", "YTD", "Month"]
+REGIONS = ["HQ", "LA", "AMEA", "EU", "All Regions"]
+COUNTRIES = ["France", "United Kingdom", "Germany", "United States"]
+CATEGORIES = ["Chocolate", "Biscuits", "Cakes and Pastries", "Beverages", "Candy"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+# The FAQ templates offered by the frontend (src/pages/StateOfEnterprise.js)
+FAQ_TEMPLATES = [
+    ("What are the top {metric} drivers in {country} for {brand} in {time}?", {}),
+    ("Which {brand} sub-brand is driving {metric} growth in {time}?", {}),
+    ("What is the {brand} {metric} trend in {time}?", {}),
+    ("Summarize MDLZ performance in {region} for {metric} over {time}.", {"metric": METRICS + ["All Metrics"]}),
+    ("Which {brand} are driving growth in {region} region?", {"brand": BRANDS + ["brands"]}),
+    ("Analyze performance trends for {brand} in the {category} category", {"brand": BRANDS + ["key brands"]}),
+    ("Compare Q1 vs Q2 performance for {brand} across {region} regions", {"brand": BRANDS + ["all brands"]}),
+    ("Show me benchmark analysis for {brand}", {"brand": BRANDS + ["Key Brands"]}),
+]
+SIMPLE_TEMPLATES = [
+    "What is {metric} for {brand} in {month} 2025?",
+    "What was {brand} {metric} in {month} 2025?",
+]
+ANALYTICAL_TEMPLATES = [
+    "How did {brand} perform against reforecast in {region}?",
+    "Why is {metric} down in {country} this year?",
+    "Compare {brand} and {other_brand} {metric} across regions",
+]
+OFF_TOPIC = [
+    "What's the weather in Paris tomorrow?",
+    "Who won the football match last night?",
+    "Give me a recipe for chocolate cake",
+]
+# Share of each kind in the generated mix
+MIX = [("faq", 0.6), ("simple", 0.25), ("analytical", 0.1), ("off_topic", 0.05)]
+
+def _fill(template: str, rng: random.Random, options: dict = None) -> str:
+    choices = {
+        "brand": BRANDS, "other_brand": BRANDS, "metric": METRICS, "time": TIME_PERIODS, "region": REGIONS,
+        "country": COUNTRIES, "category": CATEGORIES, "month": MONTHS,
+    }
+    choices.update(options or {})
+    return template.format(**{key: rng.choice(values) for key, values in choices.items()})
+
+def question_mix(count: int, seed: int = 0) -> list:
+    """`count` (kind, question) pairs drawn from the FAQ templates and the other question kinds"""
+    rng = random.Random(seed)
+    kinds, weights = zip(*MIX)
+    questions = []
+    for kind in rng.choices(kinds, weights, k=count):
+        if kind == "faq":
+            template, options = rng.choice(FAQ_TEMPLATES)
+            questions.append((kind, _fill(template, rng, options)))
+        elif kind == "simple":
+            questions.append((kind, _fill(rng.choice(SIMPLE_TEMPLATES), rng)))
+        elif kind == "analytical":
+            questions.append((kind, _fill(rng.choice(ANALYTICAL_TEMPLATES), rng)))
+        else:
+            questions.append((kind, rng.choice(OFF_TOPIC)))
+    return questions
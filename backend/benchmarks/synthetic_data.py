@@ -0,0 +1,164 @@
+# benchmarks/synthetic_data.py
+"""
+Generate financials extracts of any size with the schema and dimension values of
+data/synthetic_financials.csv, for benchmarking at production scale.
+
+    cd backend
+    python -m benchmarks.synthetic_data --rows 1000000            # data/synthetic_1m.arrow
+    python -m benchmarks.synthetic_data --rows 10k --format csv
+
+Every row takes a whole dimension combination from a seed row, so codes keep their
+descriptions and brands only appear in the countries and categories they really sell in.
+Combinations follow a Zipf-like distribution, led by popular brands, countries and
+business units, so a few hold most rows as in a real extract. Rows span the seed year and
+the YEARS - 1 years before it, so prior-year lookups find real months. Measures are
+log-normal per KPI, with reforecast and prior year correlated to actuals.
+"""
+import os
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+from app.dataset import DATA_PATH, SCHEMA, DIMENSION_COLUMNS, load_financials, write_binary
+
+OUTPUT_DIR = os.path.dirname(DATA_PATH)
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+# How much each dimension's popular members push their combinations up the ranking;
+# dimensions not listed don't affect it
+SKEW = {
+    "brand_text": 1.1, "country": 1.2, "bu": 1.0, "bsp": 1.1, "area": 1.0, "region": 0.6,
+    "leg_cat": 0.8, "brand_segment_text": 0.8, "sub_category_text": 0.8, "market_type_text": 0.5,
+}
+# Zipf exponent over the ranked combinations
+COMBINATION_SKEW = 0.8
+# Years of months generated, ending with the seed extract's year
+YEARS = 2
+# Typical size of each KPI relative to Net Revenue (median actuals in the seed extract),
+# keyed by kpi_text, and the log-normal spread
+KPI_SCALE = {"Net Revenue": 1.0, "Gross Profit (MM) Kgs": 0.21, "Operating Income": 0.19, "Volume (MM) Kgs": 0.1}
+DEFAULT_KPI_SCALE = 0.6
+MEASURE_SIGMA = 1.1
+# Rows generated per chunk, which bounds peak memory for the large sizes
+CHUNK_ROWS = 1_000_000
+
+def parse_size(text: str) -> int:
+    text = text.lower().replace("_", "")
+    if text in SIZES:
+        return SIZES[text]
+    for suffix, factor in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-len(suffix)]) * factor)
+    return int(text)
+
+def size_label(rows: int) -> str:
+    for label, size in SIZES.items():
+        if rows == size:
+            return label
+    return str(rows)
+
+def _zipf_weights(count: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    """Zipf weights over members in a random (but seeded) order"""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return rng.permutation(weights / weights.sum())
+
+def _combinations(seed_df: pd.DataFrame) -> pd.DataFrame:
+    """Distinct dimension combinations of the seed extract"""
+    return seed_df[DIMENSION_COLUMNS].astype(str).drop_duplicates().reset_index(drop=True)
+
+def _combination_weights(combinations: pd.DataFrame, rng: np.random.Generator) -> np.ndarray:
+    """
+    Zipf weights over the combinations, ranked by the product of their members' Zipf weights
+    in each skewed dimension. Weighting by that product directly would leave a handful of
+    combinations with almost every row.
+    """
+    score = np.ones(len(combinations))
+    for col, exponent in SKEW.items():
+        codes, members = pd.factorize(combinations[col])
+        score *= _zipf_weights(len(members), exponent, rng)[codes]
+    ranks = np.empty(len(combinations), dtype="int64")
+    ranks[np.argsort(-score, kind="stable")] = np.arange(len(combinations))
+    weights = 1.0 / (ranks + 1.0) ** COMBINATION_SKEW
+    return weights / weights.sum()
+
+def _chunk(rows: int, combinations: pd.DataFrame, weights: np.ndarray, months: np.ndarray,
+           rng: np.random.Generator) -> pd.DataFrame:
+    picks = rng.choice(len(combinations), size=rows, p=weights)
+    columns = {}
+    for col in combinations.columns:
+        codes, categories = pd.factorize(combinations[col])
+        columns[col] = pd.Categorical.from_codes(codes[picks], categories=categories)
+    month = rng.choice(months, size=rows)
+    columns["year"] = (month // 100).astype("int16")
+    columns["month"] = month.astype("int32")
+
+    kpi = np.asarray(columns["kpi_text"])
+    scale = np.array([KPI_SCALE.get(value, DEFAULT_KPI_SCALE) for value in kpi])
+    act = rng.lognormal(mean=3.6, sigma=MEASURE_SIGMA, size=rows) * scale
+    month_of_year = (month % 100).astype("float64")
+    measures = {
+        "Act": act,
+        "rf": act * rng.normal(1.0, 0.08, rows),
+        "py": act * rng.normal(0.95, 0.12, rows),
+        "ac": act * rng.normal(1.0, 0.05, rows),
+    }
+    # Year-to-date figures grow with the month
+    measures["act_ytd"] = measures["Act"] * month_of_year * rng.normal(1.0, 0.1, rows)
+    measures["py_ytd"] = measures["py"] * month_of_year * rng.normal(1.0, 0.1, rows)
+    measures["rf_ytd"] = measures["rf"] * month_of_year * rng.normal(1.0, 0.1, rows)
+    for col, values in measures.items():
+        columns[col] = np.round(values, 2).astype("float32")
+    return pd.DataFrame(columns)
+
+def generate(rows: int, seed: int = 0, seed_path: str = DATA_PATH) -> pd.DataFrame:
+    """A frame of `rows` rows in the compact dataset schema, reproducible for a given seed"""
+    seed_df = load_financials(seed_path)
+    rng = np.random.default_rng(seed)
+    combinations = _combinations(seed_df)
+    weights = _combination_weights(combinations, rng)
+    seed_months = np.sort(seed_df["month"].unique()).astype("int64")
+    months = np.concatenate([seed_months - 100 * years_back for years_back in range(YEARS - 1, -1, -1)])
+
+    chunks = []
+    for start in range(0, rows, CHUNK_ROWS):
+        chunks.append(_chunk(min(CHUNK_ROWS, rows - start), combinations, weights, months, rng))
+    df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+    # Same categories in every chunk, so concat keeps the categoricals
+    df = df[list(seed_df.columns)]
+    return df.astype({col: dtype for col, dtype in SCHEMA.items() if col in df.columns})
+
+def default_output(rows: int, fmt: str = "arrow") -> str:
+    return os.path.join(OUTPUT_DIR, f"synthetic_{size_label(rows)}.{fmt}")
+
+def write(df: pd.DataFrame, path: str):
+    if path.endswith(".csv"):
+        df.to_csv(path, index=False, float_format="%.2f")
+    else:
+        write_binary(df, path)
+
+def ensure_dataset(rows: int, seed: int = 0) -> str:
+    """Path of a generated Arrow extract with `rows` rows, generating it on first use"""
+    path = default_output(rows)
+    if not os.path.exists(path):
+        started = time.time()
+        write(generate(rows, seed), path)
+        logging.info(f"Generated {rows} rows into {path} in {time.time() - started:.1f}s")
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10k", help="row count: 10k, 1m, 10m or any number")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--format", choices=["arrow", "csv"], default="arrow")
+    parser.add_argument("--output", help="file to write (default data/synthetic_<rows>.<format>)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rows = parse_size(args.rows)
+    path = args.output or default_output(rows, args.format)
+    started = time.time()
+    write(generate(rows, args.seed), path)
+    logging.info(f"Wrote {rows} rows to {path} ({os.path.getsize(path) / 1e6:.1f} MB) in {time.time() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
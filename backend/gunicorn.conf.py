@@ -0,0 +1,48 @@
+# gunicorn.conf.py
+# Multi-worker mode: the app (and with it the dataset, its indexes and the chart
+# stack) is imported once in the master and forked into every worker, so the
+# read-only columns are shared copy-on-write instead of loaded per worker.
+# When the dataset comes from the Arrow file, its numeric columns are views of the
+# memory-mapped file, so those pages are additionally shared through the OS page cache.
+#
+# Reloads are cluster-wide: POST /api/admin/reload and the dataset watcher send
+# SIGHUP to the master, which loads the new snapshot once and replaces every
+# worker with a fresh fork of it, so all workers serve the same data_version.
+#
+#     gunicorn -c gunicorn.conf.py app.main:app
+import gc
+import multiprocessing
+import os
+import signal
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+# WEB_CONCURRENCY=0 runs one worker per core
+workers = int(os.getenv("WEB_CONCURRENCY", "1")) or multiprocessing.cpu_count()
+worker_class = "uvicorn_worker.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+def when_ready(server):
+    # One watcher for the whole cluster, in the master; a new drop triggers the same reload as HUP
+    from app.main import DATASET_WATCH_INTERVAL
+    from app.dataset import start_dataset_watcher
+    if DATASET_WATCH_INTERVAL > 0:
+        start_dataset_watcher(DATASET_WATCH_INTERVAL, on_change=lambda: os.kill(os.getpid(), signal.SIGHUP))
+
+def on_reload(server):
+    # SIGHUP: swap the snapshot in the master before gunicorn forks the replacement workers
+    from app.dataset import reload_dataset
+    try:
+        reload_dataset()
+    except Exception as e:
+        server.log.error(f"Dataset reload failed, keeping current snapshot: {e}")
+
+def pre_fork(server, worker):
+    # Move everything allocated by the preload into the permanent generation so
+    # the cyclic GC in each worker doesn't touch (and thereby copy) those pages
+    gc.freeze()
+
+def post_fork(server, worker):
+    # Workers ask the master to reload rather than swapping a private copy
+    from app.dataset import set_reload_trigger
+    set_reload_trigger(lambda: os.kill(server.pid, signal.SIGHUP))
@@ -1,19 +1,79 @@
+import json
+import asyncio
+
+import httpx
+
+import pytest
 from fastapi.testclient import TestClient
+
+from app import llm_client, llm_replay, main
 from app.main import app
 
-client = TestClient(app)
+PAYLOAD = {
+    "message": {"text": "How was France performance?", "files": []},
+    "history": [],
+    "system_prompt": None
+}
+
+@pytest.fixture
+def client(monkeypatch):
+    # Canned local answers: no API key or network needed
+    monkeypatch.setattr(llm_client, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(llm_replay, "LLM_STUB_LATENCY", 0)
+    main.plan_cache.clear()
+    main.response_cache.clear()
+    with TestClient(app) as client:
+        yield client
+
+def _sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
 
-def test_healthcheck():
-    r = client.get("/")
+def test_healthcheck(client):
+    r = client.get("/api/health")
     assert r.status_code == 200
     assert r.json().get("status") == "ok"
 
-def test_chat():
-    payload = {
-        "message": {"text": "How was France performance?", "files": []},
-        "history": [],
-        "system_prompt": None
-    }
-    r = client.post("/chat", json=payload)
+def test_chat(client):
+    r = client.post("/chat", json=PAYLOAD)
     assert r.status_code == 200
-    assert "response" in r.json()
+    body = r.json()
+    assert body["text_answer"] and body["error"] is None
+    assert body["charts"]
+    assert body["data_version"] == main.get_dataset().version
+
+def test_chat_stream(client):
+    r = client.post("/chat/stream", json=PAYLOAD)
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/event-stream")
+    events = _sse_events(r.text)
+    names = [name for name, _ in events]
+    assert names[-1] == "done" and names.count("done") == 1
+    assert "text" in names
+    assert "plan" in [data["stage"] for name, data in events if name == "stage"]
+    done = events[-1][1]
+    assert done["text_answer"] and done["error"] is None
+    # Every rendered chart was streamed, labelled by its position among the specs
+    indexes = [data["index"] for name, data in events if name == "chart"]
+    assert len(indexes) == len(set(indexes)) >= len(done["charts"])
+
+def test_concurrent_identical_streams_each_get_their_events(client):
+    async def both():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as http:
+            return await asyncio.gather(*(http.post("/chat/stream", json=PAYLOAD) for _ in range(2)))
+
+    for r in asyncio.run(both()):
+        events = _sse_events(r.text)
+        stages = [data["stage"] for name, data in events if name == "stage"]
+        assert stages == ["validated", "plan", "rows", "analysis"]
+        names = [name for name, _ in events]
+        assert names.count("text") > 1 and "chart" in names and names.count("done") == 1
+
+def test_unknown_chart_is_not_confirmed_unchanged(client):
+    key = "0" * 64
+    r = client.get(f"/api/charts/{key}.webp", headers={"If-None-Match": f'"{key}"'})
+    assert r.status_code == 404
@@ -0,0 +1,83 @@
+import os
+import asyncio
+import time
+from app.cache import TTLCache, SqliteStore, normalize_question
+
+def test_normalize_question():
+    assert normalize_question("  What is  Oreo's NET revenue? ") == "what is oreo s net revenue"
+
+def test_lru_eviction_and_ttl():
+    cache = TTLCache("test", max_entries=2, ttl=0.05)
+    cache.set("a", {"v": 1})
+    cache.set("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}
+    cache.set("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+def test_sqlite_store_survives_new_cache(tmp_path):
+    path = str(tmp_path / "cache.db")
+    TTLCache("plan", store=SqliteStore(path, "plan")).set("q", {"brand_text": "Oreo"})
+    assert TTLCache("plan", store=SqliteStore(path, "plan")).get("q") == {"brand_text": "Oreo"}
+
+def test_sqlite_store_opens_own_connection_after_fork(tmp_path):
+    store = SqliteStore(str(tmp_path / "cache.db"), "plan")
+    store.set("parent", "p", time.time() + 60)
+    pid = os.fork()
+    if pid == 0:
+        # The forked child must not reuse the parent's connection
+        ok = store.get("parent")[0] == "p" and store._connection() is not store._connections[os.getppid()]
+        store.set("child", "c", time.time() + 60)
+        os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert status == 0
+    assert store.get("child")[0] == "c"
+    assert list(store._connections) == [os.getpid()]
+
+def test_async_access_goes_through_store(tmp_path):
+    path = str(tmp_path / "cache.db")
+
+    async def run():
+        await TTLCache("plan", store=SqliteStore(path, "plan")).set_async("q", {"brand_text": "Oreo"})
+        fresh = TTLCache("plan", store=SqliteStore(path, "plan"))
+        assert await fresh.get_async("q") == {"brand_text": "Oreo"}
+        # Now served from memory
+        assert await fresh.get_async("q") == {"brand_text": "Oreo"}
+        assert await fresh.get_async("missing") is None
+        return fresh.stats()
+
+    stats = asyncio.run(run())
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+def test_store_keeps_expiry_and_limits(tmp_path):
+    path = str(tmp_path / "cache.db")
+    writer = TTLCache("chart", max_entries=3, ttl=60, store=SqliteStore(path, "chart"))
+    for key in "abcd":
+        writer.set(key, {"chart": key * 10})
+    store = SqliteStore(path, "chart")
+    # The oldest entry made room on disk too
+    assert store.get("a") is None
+    value, expires_at = store.get("d")
+    reader = TTLCache("chart", ttl=3600, store=store)
+    assert reader.get("d") == value
+    # Promoted entries expire when they would have on disk, not a fresh TTL later
+    assert reader._entries["d"][1] == expires_at
+
+    sized = SqliteStore(path, "sized", max_bytes=100)
+    for key in "abc":
+        sized.set(key, "x" * 40, time.time() + 60)
+    assert sized.get("a") is None and sized.get("c") is not None
+
+def test_size_aware_eviction():
+    cache = TTLCache("response", max_entries=100, max_bytes=250)
+    cache.set("a", {"chart": "x" * 100})
+    cache.set("b", {"chart": "y" * 100})
+    cache.set("c", {"chart": "z" * 100})
+    assert cache.get("a") is None
+    assert cache.get("c") is not None
+    assert cache.stats()["bytes"] <= 250
+    cache.set("huge", {"chart": "w" * 1000})
+    assert cache.get("huge") is None
@@ -0,0 +1,50 @@
+import time
+import asyncio
+
+import matplotlib.pyplot as plt
+
+from app.chart_generator import render_chart
+import app.chart_pool as chart_pool
+from app.chart_pool import render_chart_async, shutdown_chart_pool, get_chart_pool
+
+SPEC = {"chart_type": "bar", "title": "Net Revenue", "data": [{"label": "Oreo", "value": 1.5}, {"label": "Milka", "value": 2.5}]}
+
+def test_render_chart_leaves_no_pyplot_figures():
+    chart = render_chart(SPEC)
+    assert chart.startswith("data:image/png;base64,")
+    assert plt.get_fignums() == []
+
+def test_pool_renders_charts_in_order():
+    async def render_all():
+        try:
+            return await asyncio.gather(render_chart_async(SPEC), render_chart_async({**SPEC, "data": []}))
+        finally:
+            shutdown_chart_pool()
+
+    chart, empty = asyncio.run(render_all())
+    assert chart == render_chart(SPEC)
+    assert empty is None
+
+def _hang(chart_spec, options=None):
+    time.sleep(60)
+
+def test_timed_out_render_recycles_pool(monkeypatch):
+    monkeypatch.setattr(chart_pool, "render_chart", _hang)
+    monkeypatch.setattr(chart_pool, "CHART_RENDER_TIMEOUT", 0.5)
+
+    async def render():
+        try:
+            hung_pool = get_chart_pool()
+            task = asyncio.ensure_future(render_chart_async(SPEC))
+            await asyncio.sleep(0.2)
+            processes = list(hung_pool._processes.values())
+            return await task, hung_pool, get_chart_pool(), processes
+        finally:
+            shutdown_chart_pool()
+
+    result, hung_pool, new_pool, processes = asyncio.run(render())
+    assert result is None
+    assert new_pool is not hung_pool and processes
+    # The hung render doesn't keep its process
+    time.sleep(0.5)
+    assert not any(process.is_alive() for process in processes)
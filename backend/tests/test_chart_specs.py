@@ -0,0 +1,34 @@
+from app.chart_specs import to_vega_lite
+
+SPECS = {
+    "bar": [{"label": "Oreo", "value": 1.5}],
+    "line": [{"label": "Jan", "Act": 1, "rf": 2, "py": 3}],
+    "combination": [{"label": "Jan", "Revenue": 10, "Volume": 2}],
+    "stacked_bar": [{"label": "EU", "Chocolate": 1, "Biscuits": 2}],
+    "pie": [{"label": "Oreo", "value": 3}, {"label": "Milka", "value": 0}],
+    "scatter": [{"label": "Oreo", "x": 1, "y": 2}, {"label": "Milka", "x": 2, "y": 5}],
+    "box": [{"category": "EU", "values": "[1, 2, 3]"}],
+    "waterfall": [{"label": "Start", "value": 10}, {"label": "Price", "value": -4}],
+}
+
+def test_every_chart_type_translates():
+    for chart_type, data in SPECS.items():
+        spec = to_vega_lite({"chart_type": chart_type, "title": chart_type, "data": data})
+        assert spec["$schema"].endswith("vega-lite/v5.json"), chart_type
+        assert "mark" in spec or "layer" in spec, chart_type
+        assert spec["data"]["values"], chart_type
+
+def test_data_is_cleaned_and_benchmark_is_layered():
+    spec = to_vega_lite({
+        "chart_type": "bar",
+        "title": "Net Revenue",
+        "data": [{"label": 2025, "value": "12.5"}, {"label": "PY", "value": None}, "junk", {"label": None, "value": 1}],
+        "benchmark_data": [{"label": 2025, "value": 11}],
+    })
+    assert spec["data"]["values"] == [{"label": "2025", "value": 12.5}, {"label": "PY", "value": 0.0}]
+    assert len(spec["layer"]) == 2
+    assert spec["layer"][1]["data"]["values"] == [{"label": "2025", "value": 11.0}]
+
+def test_pie_drops_non_positive_slices_and_empty_specs_are_rejected():
+    assert to_vega_lite({"chart_type": "pie", "data": SPECS["pie"]})["data"]["values"] == [{"label": "Oreo", "value": 3.0}]
+    assert to_vega_lite({"chart_type": "bar", "data": []}) is None
@@ -0,0 +1,30 @@
+import base64
+import asyncio
+
+from app.chart_generator import chart_output_options, render_chart
+from app.chart_store import chart_key, chart_image, put_chart, chart_url, put_recipe, get_recipe
+
+def test_chart_key_ignores_key_order():
+    a = {"title": "Net Revenue", "data": [{"label": "Oreo", "value": 1.5}], "chart_type": "bar"}
+    b = {"chart_type": "bar", "data": [{"value": 1.5, "label": "Oreo"}], "title": "Net Revenue"}
+    assert chart_key(a) == chart_key(b)
+    assert chart_key(a) != chart_key({**a, "title": "Gross Profit"})
+    assert chart_key(a) != chart_key(a, chart_output_options("webp"))
+    assert chart_url(chart_key(a)) == f"/api/charts/{chart_key(a)}.png"
+
+def test_chart_image_round_trip():
+    png = b"\x89PNG\r\n\x1a\nfake"
+    key = chart_key({"test": "round trip"})
+    asyncio.run(put_chart(key, "data:image/png;base64," + base64.b64encode(png).decode()))
+    assert asyncio.run(chart_image(key)) == (png, "image/png")
+    assert asyncio.run(chart_image("../etc/passwd")) is None
+
+def test_chart_output_options_and_recipes():
+    assert chart_output_options("GIF", 1000) == {"format": "png", "dpi": 200}
+    assert chart_output_options("webp", width=600) == {"format": "webp", "dpi": 50}
+    spec = {"chart_type": "bar", "title": "Net Revenue", "data": [{"label": "Oreo", "value": 1.5}]}
+    svg = chart_output_options("svg")
+    asyncio.run(put_recipe(chart_key(spec, svg), spec, svg))
+    assert asyncio.run(get_recipe(chart_key(spec, svg))) == {"spec": spec, "options": svg}
+    assert render_chart(spec, chart_output_options("webp", 40)).startswith("data:image/webp;base64,")
+    assert render_chart(spec, svg).startswith("data:image/svg+xml;base64,")
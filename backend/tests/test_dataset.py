@@ -0,0 +1,115 @@
+import numpy as np
+from app.dataset import get_dataset, DIMENSION_COLUMNS, MEASURE_COLUMNS
+
+def test_dataset_schema():
+    dataset = get_dataset()
+    assert dataset is get_dataset()
+    for col in DIMENSION_COLUMNS:
+        assert dataset.df[col].dtype == "category"
+    for col in MEASURE_COLUMNS:
+        assert dataset.df[col].dtype == "float32"
+
+def test_take_widens_measures():
+    dataset = get_dataset()
+    rows = dataset.take(dataset.match({"region": "EU"}))
+    assert len(rows) > 0
+    assert (rows["region"] == "EU").all()
+    assert rows["Act"].dtype == "float64"
+
+def test_match_agrees_with_scan():
+    dataset = get_dataset()
+    df = dataset.df
+    positions = dataset.match({"region": "eu", "kpi_text": "NET REVENUE"}, months=[202507, 202508])
+    expected = np.flatnonzero(
+        (df["region"] == "EU") & (df["kpi_text"] == "Net Revenue") & df["month"].isin([202507, 202508])
+    )
+    assert np.array_equal(positions, expected)
+
+def test_match_unknown_value_is_empty():
+    dataset = get_dataset()
+    assert len(dataset.match({"brand_text": "Not A Brand", "region": "EU"})) == 0
+    assert len(dataset.match({}, months=[199901])) == 0
+    assert dataset.match({"brand_text": None}) is None
+
+def test_reload_swaps_snapshot(tmp_path):
+    from app.dataset import add_reload_listener, reload_dataset, DATA_PATH
+    old = get_dataset()
+    assert old.version == "public.RF08@2025-07-01"
+    drop = tmp_path / "financials.csv"
+    drop.write_text(open(DATA_PATH).read().replace("public.RF08", "public.RF09"))
+    swaps = []
+    add_reload_listener(lambda before, after: swaps.append((before.version, after.version)))
+    try:
+        new = reload_dataset(str(drop))
+        assert get_dataset() is new
+        assert new.version == "public.RF09@2025-07-01"
+        assert swaps[-1] == ("public.RF08@2025-07-01", "public.RF09@2025-07-01")
+        # The pinned old snapshot keeps answering unchanged
+        assert len(old.match({"region": "EU"})) == len(new.match({"region": "EU"}))
+    finally:
+        reload_dataset(DATA_PATH)
+
+def test_watcher_rebuilds_binary_from_csv(tmp_path, monkeypatch):
+    import threading
+    import app.dataset as dataset_module
+    from app.dataset import DATA_PATH, load_financials, start_dataset_watcher, write_binary
+    csv_path, arrow_path = tmp_path / "financials.csv", tmp_path / "financials.arrow"
+    csv_path.write_text(open(DATA_PATH).read())
+    write_binary(load_financials(str(csv_path)), str(arrow_path))
+    monkeypatch.setattr(dataset_module, "DATA_PATH", str(csv_path))
+    monkeypatch.setattr(dataset_module, "BINARY_DATA_PATH", str(arrow_path))
+    changed = threading.Event()
+    stop = start_dataset_watcher(0.02, on_change=changed.set)
+    try:
+        csv_path.write_text(open(DATA_PATH).read().replace("public.RF08", "public.RF09"))
+        assert changed.wait(5)
+        # The Arrow copy follows the new extract before anything reloads
+        assert set(load_financials(str(arrow_path))["version"].astype(str)) == {"public.RF09"}
+    finally:
+        stop.set()
+
+def test_reload_can_be_handed_off():
+    from app.dataset import reload_dataset_in_background, reload_is_delegated, set_reload_trigger
+    requests = []
+    set_reload_trigger(lambda: requests.append(True))
+    try:
+        assert reload_is_delegated()
+        assert reload_dataset_in_background() is None
+        assert requests == [True]
+    finally:
+        set_reload_trigger(None)
+    assert not reload_is_delegated()
+
+def test_binary_round_trip(tmp_path):
+    from app.convert_dataset import convert
+    from app.dataset import DATA_PATH, load_financials
+    output = convert(DATA_PATH, str(tmp_path / "financials.arrow"))
+    csv_df = load_financials(DATA_PATH)
+    binary_df = load_financials(output)
+    assert list(binary_df.columns) == list(csv_df.columns)
+    assert (binary_df.dtypes == csv_df.dtypes).all()
+    assert binary_df["Act"].sum() == csv_df["Act"].sum()
+    # Measures are views of the memory-mapped file, not private copies
+    assert not binary_df["Act"].to_numpy().flags.owndata
+
+def test_cube_matches_raw_rollup():
+    dataset = get_dataset()
+    filters = {"region": "eu", "kpi_text": "Net Revenue"}
+    cube_result = dataset.cube.query(filters, months=[202507, 202508], group_by=["brand_text"])
+    raw = dataset.take(dataset.match(filters, months=[202507, 202508]))
+    expected = raw.groupby("brand_text", observed=True)[["Act", "rf", "py"]].sum().round(2).reset_index()
+    assert cube_result["brand_text"].tolist() == expected["brand_text"].tolist()
+    assert np.allclose(cube_result[["Act", "rf", "py"]], expected[["Act", "rf", "py"]])
+    assert dataset.cube.query({"bu_text": "DACH"}) is None
+    assert dataset.cube.query({"brand_text": "Not A Brand"}).empty
+
+def test_aggregates_accept_a_single_group_by_column():
+    from app.data_loader import get_aggregated_data
+    dataset = get_dataset()
+    assert dataset.cube.query({"kpi_text": "Net Revenue"}, group_by="region").equals(
+        dataset.cube.query({"kpi_text": "Net Revenue"}, group_by=["region"]))
+    by_region = get_aggregated_data("region", {"Act": "sum", "rf": "sum", "py": "sum"}, kpi_text="Net Revenue", dataset=dataset)
+    assert list(by_region.columns) == ["region", "Act", "rf", "py"]
+    assert set(by_region["region"]) == {"EU", "AMEA", "HQ", "LA"}
+    # The pandas fallback (non-sum aggregates) takes the same form
+    assert list(get_aggregated_data("region", {"Act": "mean"}, dataset=dataset).columns) == ["region", "Act"]
@@ -0,0 +1,98 @@
+import time
+import asyncio
+import pytest
+
+from app import llm_client, llm_gateway, llm_replay
+from app.llm_gateway import CircuitBreaker, AdaptiveLimiter, RetryBudget, LLMUnavailableError, OPEN, HALF_OPEN, CLOSED
+from app.llm_gateway import gateway_call
+from app.local_answer import local_fallback_answer
+
+def test_breaker_opens_on_errors_and_closes_after_trial_calls():
+    breaker = CircuitBreaker(window=60, min_calls=4, error_rate=0.5, open_seconds=0.05, probes=2)
+    for ok in (True, False, True, False):
+        breaker.before_call()
+        breaker.record(ok)
+    assert breaker.state == OPEN
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    # Only `probes` trial calls are let through
+    with pytest.raises(LLMUnavailableError):
+        breaker.before_call()
+    breaker.record(True)
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+class _APIError(Exception):
+    def __init__(self, code, message):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+def test_only_provider_failures_count_against_the_breaker(monkeypatch):
+    breaker = CircuitBreaker(window=60, min_calls=1, error_rate=0.5, open_seconds=60, probes=1)
+    monkeypatch.setattr(llm_gateway, "breaker", breaker)
+    monkeypatch.setattr(llm_gateway, "limiter", AdaptiveLimiter(initial=4, minimum=1, maximum=4, timeout=1))
+    monkeypatch.setattr(llm_client, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(llm_replay, "LLM_STUB_LATENCY", 0)
+
+    async def fail_with(error):
+        with pytest.raises(type(error)):
+            async with gateway_call():
+                raise error
+
+    async def consumer_throws():
+        stream = llm_client.stream_openai_json_async("Question: \"Oreo?\"")
+        await stream.__anext__()
+        with pytest.raises(KeyError):
+            await stream.athrow(KeyError("consumer gave up"))
+
+    async def scenario():
+        # A rejected prompt, a missing cassette and an error from a stream's consumer
+        await fail_with(_APIError(400, "INVALID_ARGUMENT"))
+        await fail_with(llm_replay.CassetteMissError("no cassette"))
+        await consumer_throws()
+        assert breaker.state == CLOSED
+        assert not any(failed for _, failed in breaker._outcomes)
+        await fail_with(_APIError(500, "INTERNAL"))
+        assert breaker.state == OPEN
+
+    asyncio.run(scenario())
+
+def test_limiter_queues_beyond_the_limit_and_adapts():
+    limiter = AdaptiveLimiter(initial=2, minimum=1, maximum=4, timeout=0.05)
+
+    async def scenario():
+        await limiter.acquire()
+        await limiter.acquire()
+        with pytest.raises(LLMUnavailableError):
+            await limiter.acquire()
+        waiting = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        await waiting
+        assert limiter.in_flight == 2
+
+    asyncio.run(scenario())
+    limiter.on_overload()
+    assert limiter.limit == 1
+    for _ in range(3):
+        limiter.on_success()
+    assert limiter.limit > 1
+
+def test_retry_budget_is_shared_and_refills():
+    budget = RetryBudget(ratio=0.5, min_per_second=0, capacity=1)
+    assert budget.try_withdraw()
+    assert not budget.try_withdraw()
+    budget.deposit()
+    budget.deposit()
+    assert budget.try_withdraw()
+
+def test_fallback_answer_is_degraded():
+    result = local_fallback_answer("Why is Oreo growing?", {"brand_text": "Oreo"})
+    assert result["degraded"]
+    assert "headline figures" in result["text_answer"]
+    assert result["charts"]
@@ -0,0 +1,35 @@
+import json
+import asyncio
+
+import pytest
+
+from app import llm_client, llm_replay
+from app.prompts import build_query_planner_prompt, build_simple_answer_prompt
+
+def test_stub_answers_each_prompt_shape():
+    plan = json.loads(llm_replay.stub_response(build_query_planner_prompt("What is the Oreo Net Revenue trend in QTD?", "schema")))
+    assert plan["brand_text"] == "Oreo" and plan["kpi_text"] == "Net Revenue"
+    assert plan["analysis_type"] == "trend_analysis"
+
+    answer = json.loads(llm_replay.stub_response(build_simple_answer_prompt("What is Net Revenue for Milka?", "[]")))
+    assert "Milka" in answer["text_answer"] and len(answer["charts"]) == 1
+
+def test_record_then_replay(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_replay, "LLM_CASSETTE_DIR", str(tmp_path))
+    llm_replay.save_cassette("model", "prompt", '{"text_answer": "recorded"}', 1.5)
+    assert llm_replay.replay_response("model", "prompt") == ('{"text_answer": "recorded"}', 1.5)
+
+    monkeypatch.setattr(llm_replay, "LLM_REPLAY_MISS", "error")
+    with pytest.raises(llm_replay.CassetteMissError):
+        llm_replay.replay_response("model", "never recorded")
+
+def test_stub_backend_needs_no_api_key(monkeypatch):
+    monkeypatch.setattr(llm_client, "LLM_BACKEND", "stub")
+    monkeypatch.setattr(llm_replay, "LLM_STUB_LATENCY", 0)
+
+    async def stream():
+        return "".join([chunk async for chunk in llm_client.stream_openai_json_async("Question: \"Oreo?\"")])
+
+    streamed = asyncio.run(stream())
+    assert streamed == asyncio.run(llm_client.call_openai_json_async("Question: \"Oreo?\""))
+    assert json.loads(streamed)["charts"]
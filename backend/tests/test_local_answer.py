@@ -0,0 +1,17 @@
+from app.dataset import get_dataset
+from app.local_answer import local_simple_answer, format_months
+
+def test_single_kpi_answer_matches_cube():
+    result = local_simple_answer("What is the net revenue of Oreo in July?", {"brand_text": "Oreo", "months": [202507]})
+    summary = get_dataset().cube.query({"brand_text": "Oreo", "kpi_text": "Net Revenue"}, months=[202507], group_by=["kpi_text"])
+    act = summary["Act"].iloc[0]
+    assert f"{act:,.2f}M" in result["text_answer"]
+    assert result["charts"][0]["data"][0] == {"label": "Actual", "value": round(act, 2)}
+
+def test_ranking_questions_are_left_to_the_llm():
+    assert local_simple_answer("What are the top brands by revenue?", {}) is None
+    assert local_simple_answer("What is the revenue of Not A Brand?", {"brand_text": "Not A Brand"}) is None
+
+def test_format_months():
+    assert format_months([202503, 202501, 202502]) == "Jan 2025 - Mar 2025"
+    assert format_months([202501, 202507]) == "Jan 2025, Jul 2025"
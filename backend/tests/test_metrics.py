@@ -0,0 +1,26 @@
+from app.metrics import Counter, Histogram, render_metrics, stage_timer, STAGE_SECONDS
+
+def test_counter_and_histogram_exposition():
+    requests = Counter("test_requests_total", "Requests", ["path"])
+    requests.inc(path="simple")
+    requests.inc(2, path="simple")
+    latency = Histogram("test_latency_seconds", "Latency", ["stage"], buckets=(0.1, 1))
+    latency.observe(0.05, stage="fetch")
+    latency.observe(0.5, stage="fetch")
+
+    text = render_metrics()
+    assert "# TYPE test_requests_total counter" in text
+    assert 'test_requests_total{path="simple"} 3' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="1"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="fetch",le="+Inf"} 2' in text
+    assert 'test_latency_seconds_count{stage="fetch"} 2' in text
+
+def test_stage_timer_records_on_error():
+    before = STAGE_SECONDS.count(stage="test_stage")
+    try:
+        with stage_timer("test_stage"):
+            raise ValueError("boom")
+    except ValueError:
+        pass
+    assert STAGE_SECONDS.count(stage="test_stage") == before + 1
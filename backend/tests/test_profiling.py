@@ -0,0 +1,45 @@
+import os
+import time
+import asyncio
+import threading
+
+from app import profiling
+from app.profiling import profile_request, profile_path
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(1000))
+
+def test_profile_written_and_rate_limited(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "_last_started", 0.0)
+    stopped_on = []
+    stop = profiling.SamplingProfiler.stop
+
+    def recording_stop(self):
+        stopped_on.append(threading.get_ident())
+        stop(self)
+
+    monkeypatch.setattr(profiling.SamplingProfiler, "stop", recording_stop)
+
+    async def profiled():
+        async with profile_request(True) as profiler:
+            assert profiling.profiling_active.get()
+            _busy(0.1)
+        assert not profiling.profiling_active.get()
+        # Joining the sampler and writing the file stays off the event loop
+        assert stopped_on and stopped_on[0] != threading.get_ident()
+        # A second profile inside PROFILE_MIN_INTERVAL runs unprofiled
+        async with profile_request(True) as second:
+            assert second is None
+        return profiler
+
+    profiler = asyncio.run(profiled())
+    assert profiler is not None
+    path = profile_path(profiler.profile_id)
+    assert path == os.path.join(str(tmp_path), f"{profiler.profile_id}.folded")
+    lines = open(path).read().splitlines()
+    assert any("_busy" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert profile_path("../../etc/passwd") is None
@@ -0,0 +1,46 @@
+import pandas as pd
+
+from app.prompt_encoding import encode_frame, estimate_tokens, prune_columns
+
+def _frame():
+    return pd.DataFrame({
+        "load_date": ["2025-07-01"] * 3,
+        "brand_text": ["Oreo"] * 3,
+        "country_text": ["UK", "France", "Spain"],
+        "month": [202501, 202502, 202503],
+        "Act": [1.234567, 2.0, 3.5],
+        "act_ytd": [1.0, 2.0, 3.0],
+    })
+
+def test_drops_irrelevant_and_folds_constant_columns():
+    df, constants = prune_columns(_frame(), "revenue by country")
+    assert list(df.columns) == ["country_text", "month", "Act"]
+    assert constants == {"brand_text": "Oreo"}
+    df, _ = prune_columns(_frame(), "What is YTD revenue?")
+    assert "act_ytd" in df.columns
+
+def test_drops_follow_the_plan():
+    df = _frame().assign(country=["GB", "FR", "ES"], load_date=["2025-07-01", "2025-08-01", "2025-08-01"])
+    # The plan's group-by survives even though codes are normally dropped
+    pruned, _ = prune_columns(df, "revenue", {"group_by": "country"})
+    assert "country" in pruned.columns and "load_date" not in pruned.columns
+    # A filtered column is stated once, whatever the rows look like
+    pruned, constants = prune_columns(df.assign(brand_text=["Oreo", "OREO", "oreo"]), "revenue", {"brand_text": "Oreo"})
+    assert "brand_text" not in pruned.columns and constants["brand_text"] == "Oreo"
+    # Without an explicit group-by, the dimension the question slices by is kept
+    pruned, _ = prune_columns(df, "revenue by country", {"group_by": None})
+    assert "country_text" in pruned.columns
+
+def test_encodes_csv_with_rounded_measures():
+    block = encode_frame(_frame(), "revenue by country")
+    lines = block.split("\n")
+    assert lines[0] == "Same for every row: brand_text=Oreo"
+    assert lines[1] == "country_text,month,Act"
+    assert lines[2] == "UK,202501,1.23"
+    assert estimate_tokens(block) < estimate_tokens(_frame().to_json(orient="records")) / 2
+
+def test_token_budget_truncates_rows():
+    df = pd.concat([_frame()] * 100, ignore_index=True)
+    block = encode_frame(df, "revenue", token_budget=100)
+    assert "of 300 rows" in block
+    assert estimate_tokens(block) <= 100
@@ -0,0 +1,22 @@
+from app.dataset import get_dataset
+from app.query_planner import AhoCorasick
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick(["he", "she", "his", "hers"])
+    assert sorted(matcher.finditer("ushers")) == [(1, 4, "she"), (2, 4, "he"), (2, 6, "hers")]
+
+def test_plan_resolves_entities_and_periods():
+    planner = get_dataset().planner
+    plan = planner.plan("What is the net revenue of Oreo in France for Q1?")
+    assert plan["brand_text"] == "Oreo"
+    assert plan["country_text"] == "France"
+    assert plan["kpi_text"] == "Net Revenue"
+    assert plan["months"] == [202501, 202502, 202503]
+    assert planner.plan("Volume in LA from Jan to Mar")["region"] == "LA"
+
+def test_plan_defers_ambiguous_questions():
+    planner = get_dataset().planner
+    # Two brands, an unknown entity, and a relative period all need the LLM planner
+    assert planner.plan("Net revenue for Cadbury Purple and Milka") is None
+    assert planner.plan("What is Oreo revenue in United States?") is None
+    assert planner.plan("How was revenue last quarter in Europe?") is None
@@ -0,0 +1,35 @@
+from app.dataset import get_dataset
+from app.reduction import reduce_for_prompt, plan_granularity, OTHER_LABEL, TOTAL_LABEL
+
+def test_totals_are_exact_and_other_bucket_closes_the_gap():
+    df = get_dataset().take()
+    reduced = reduce_for_prompt(df, "How are brands performing?", {}, top_n=5)
+    net_revenue = reduced[reduced["kpi_text"] == "Net Revenue"]
+    total = net_revenue[net_revenue["brand_text"] == TOTAL_LABEL]["Act"].iloc[0]
+    expected = df[df["kpi_text"] == "Net Revenue"]["Act"].sum()
+    assert abs(total - expected) < 0.01
+    members = net_revenue[net_revenue["brand_text"] != TOTAL_LABEL]
+    assert len(members) == 6 and members["brand_text"].iloc[-1] == OTHER_LABEL
+    assert abs(members["Act"].sum() - expected) < 0.05
+    row = members.iloc[0]
+    assert abs(row["vs_rf"] - (row["Act"] - row["rf"])) < 0.01
+
+def test_granularity_follows_question_and_plan():
+    df = get_dataset().take()
+    assert plan_granularity(df, "Revenue trend by country", {}) == ("country_text", True)
+    assert plan_granularity(df, "How is MDLZ doing?", {"analysis_type": "performance_overview"}) == ("region", False)
+    assert plan_granularity(df, "How is MDLZ doing?", {"region": "EU"}) == ("country_text", False)
+    # Below the filter, never above it
+    assert plan_granularity(df, "How is MDLZ doing?", {"country_text": "France"}) == ("brand_text", False)
+
+def test_members_without_lead_kpi_keep_their_name():
+    df = get_dataset().take()
+    df = df[~((df["region"] == "AMEA") & (df["kpi_text"] == "Net Revenue"))]
+    reduced = reduce_for_prompt(df, "How are regions performing?", {})
+    assert OTHER_LABEL not in set(reduced["region"])
+    assert "AMEA" in set(reduced[reduced["kpi_text"] == "Volume (MM) Kgs"]["region"])
+
+def test_row_budget_is_respected():
+    df = get_dataset().take()
+    reduced = reduce_for_prompt(df, "Monthly trend by brand", {}, max_rows=60)
+    assert len(reduced) <= 60
@@ -0,0 +1,88 @@
+import asyncio
+import pytest
+import pandas as pd
+
+from app.concurrency import SingleFlight
+from app.metrics import COALESCED
+
+def test_identical_calls_share_one_run():
+    flight = SingleFlight("test_share")
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return {"key": key}
+
+    async def scenario():
+        return await asyncio.gather(flight.run("a", work, "a"), flight.run("a", work, "a"), flight.run("b", work, "b"))
+
+    first, second, other = asyncio.run(scenario())
+    assert sorted(calls) == ["a", "b"]
+    assert first == second == {"key": "a"} and first is not second
+    assert other == {"key": "b"}
+    assert COALESCED.value(flight="test_share") == 1
+    assert flight.in_flight() == 0
+
+def test_coalesced_callers_can_change_their_frames():
+    flight = SingleFlight("test_frames")
+    source = pd.DataFrame({"brand_text": ["Oreo", "Milka"], "Act": [1.0, 2.0]})
+
+    async def fetch():
+        await asyncio.sleep(0.01)
+        return source
+
+    async def scenario():
+        return await asyncio.gather(flight.run("k", fetch), flight.run("k", fetch))
+
+    first, second = asyncio.run(scenario())
+    first["Act"] *= 10
+    second.loc[0, "Act"] = -1.0
+    second.drop(columns="brand_text", inplace=True)
+    assert first["Act"].tolist() == [10.0, 20.0] and list(first.columns) == ["brand_text", "Act"]
+    assert second["Act"].tolist() == [-1.0, 2.0]
+    assert source["Act"].tolist() == [1.0, 2.0]
+    assert COALESCED.value(flight="test_frames") == 1
+
+def test_failures_are_shared_and_not_remembered():
+    flight = SingleFlight("test_fail")
+    attempts = []
+
+    async def work():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        results = await asyncio.gather(flight.run("k", work), flight.run("k", work), return_exceptions=True)
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await flight.run("k", work)
+
+    asyncio.run(scenario())
+    assert len(attempts) == 2
+
+def test_work_continues_while_anyone_waits():
+    flight = SingleFlight("test_cancel")
+    finished = []
+
+    async def work():
+        await asyncio.sleep(0.02)
+        finished.append(True)
+        return "done"
+
+    async def scenario():
+        leader = asyncio.ensure_future(flight.run("k", work))
+        follower = asyncio.ensure_future(flight.run("k", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+        assert await follower == "done"
+
+        # Nobody left waiting: the work is cancelled
+        lone = asyncio.ensure_future(flight.run("k", work))
+        await asyncio.sleep(0)
+        lone.cancel()
+        await asyncio.sleep(0.03)
+
+    asyncio.run(scenario())
+    assert finished == [True]
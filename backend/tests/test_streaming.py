@@ -0,0 +1,35 @@
+import json
+import asyncio
+
+from app.streaming import TextAnswerExtractor, ChatEventStream, sse_event
+
+def test_extracts_text_answer_across_chunk_boundaries():
+    document = json.dumps({"text_answer": "## Summary\n\"Oreo\" grew 5% – café", "charts": [{"title": "x"}]})
+    extractor = TextAnswerExtractor()
+    pieces = [extractor.feed(document[i:i + 3]) for i in range(0, len(document), 3)]
+    assert "".join(pieces) == "## Summary\n\"Oreo\" grew 5% – café"
+    assert extractor.done
+    assert extractor.feed('more') == ""
+
+def test_sse_event_format():
+    assert sse_event("stage", {"stage": "plan"}) == 'event: stage\ndata: {"stage": "plan"}\n\n'
+
+def test_chart_events_carry_spec_index(monkeypatch):
+    import app.main as main
+
+    async def render(key, spec, output):
+        await asyncio.sleep(spec["delay"])
+        return f"data:image/png;base64,{spec['title']}"
+
+    monkeypatch.setattr(main, "_render_chart_cached", render)
+
+    async def run():
+        events = ChatEventStream()
+        specs = [{"title": "slow", "delay": 0.05}, {"title": "fast", "delay": 0}]
+        charts, _ = await main._render_charts(specs, events)
+        return charts, [events.queue.get_nowait()[1] for _ in range(events.queue.qsize())]
+
+    charts, sent = asyncio.run(run())
+    # Events arrive in completion order but point at the spec each chart came from
+    assert [event["index"] for event in sent] == [1, 0]
+    assert [charts[event["index"]] for event in sent] == [event["image"] for event in sent]
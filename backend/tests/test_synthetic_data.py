@@ -0,0 +1,37 @@
+from app.dataset import load_financials, FinancialDataset, DIMENSION_COLUMNS
+from app.data_loader import get_dynamic_data, get_benchmark_data
+from benchmarks.synthetic_data import generate, parse_size, KPI_SCALE, YEARS
+
+def test_generated_extract_matches_seed_schema():
+    seed = load_financials()
+    df = generate(5000, seed=1)
+    assert len(df) == 5000
+    assert list(df.columns) == list(seed.columns)
+    assert (df.dtypes == seed.dtypes).all()
+    for col in ("brand_text", "country_text", "region", "kpi_text"):
+        assert set(df[col].astype(str)) <= set(seed[col].astype(str))
+    # Every row is a combination of dimension values seen together in the seed extract
+    seed_rows = set(map(tuple, seed[DIMENSION_COLUMNS].astype(str).values))
+    assert set(map(tuple, df[DIMENSION_COLUMNS].astype(str).values)) <= seed_rows
+    # Skewed: the biggest brand holds far more than a uniform share
+    assert df["brand_text"].value_counts(normalize=True).iloc[0] > 3 / seed["brand_text"].nunique()
+    assert len(get_dynamic_data(brand_text=str(df["brand_text"].iloc[0]), dataset=FinancialDataset(df))) > 0
+
+def test_prior_year_months_are_generated():
+    seed = load_financials()
+    df = generate(5000, seed=3)
+    assert df["year"].nunique() == YEARS
+    assert set(df["month"]) == {month - 100 * back for month in set(seed["month"]) for back in range(YEARS)}
+    dataset = FinancialDataset(df)
+    latest = sorted(set(seed["month"]))[-3:]
+    prior = get_benchmark_data({"months": latest, "dataset": dataset})
+    assert len(prior) > 0 and set(prior["month"]) == {month - 100 for month in latest}
+
+def test_every_seed_kpi_has_its_own_scale():
+    seed = load_financials()
+    assert set(seed["kpi_text"].astype(str)) <= set(KPI_SCALE)
+    medians = generate(20000, seed=2).groupby("kpi_text", observed=True)["Act"].median()
+    assert medians["Volume (MM) Kgs"] < medians["Operating Income"] < medians["Net Revenue"]
+
+def test_parse_size():
+    assert parse_size("10k") == 10_000 and parse_size("10m") == 10_000_000 and parse_size("2.5k") == 2500
@@ -90,11 +90,20 @@ const faqs = [
 ];
 
 
+// Progress shown while /chat/stream works through the pipeline
+const STAGE_MESSAGES = {
+  validated: "Understanding your question...",
+  plan: "Finding the right data...",
+  rows: "Crunching the numbers...",
+  analysis: "Generating insights, please wait...",
+};
+
 function StateOfEnterprise() {
   const [chatInput, setChatInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState(null);
   const [llmResponse, setLlmResponse] = useState(null);
+  const [stage, setStage] = useState(null);
 
   const handleSendRequest = async () => {
     if (!chatInput.trim()) return;
@@ -102,14 +111,18 @@ function StateOfEnterprise() {
     setIsLoading(true);
     setError(null);
     setLlmResponse(null);
+    setStage(null);
 
     try {
-      const response = await fetch(`${API_URL}/chat`, {
+      // Streaming endpoint: text and charts are shown as soon as the backend produces them
+      const response = await fetch(`${API_URL}/chat/stream`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({
           message: { text: chatInput, files: [] },
           history: [],
+          chart_urls: true,
+          chart_format: "webp",
         }),
       });
 
@@ -117,26 +130,58 @@ function StateOfEnterprise() {
         throw new Error(`HTTP error! Status: ${response.status}`);
       }
 
-      const data = await response.json();
-      
-      console.log('Backend response:', data);
-      console.log('Charts data:', data.charts);
-      if (data.charts) {
-        data.charts.forEach((chart, i) => {
-          console.log(`Chart ${i}:`, typeof chart, chart?.substring(0, 50) + '...');
-        });
-      }
-      
-      if (data.error) {
-        setError(data.error);
-      } else {
-        const processedData = { ...data };
-        if (processedData.charts && processedData.charts.length > 0) {
-          processedData.charts = processedData.charts.filter(chart => {
-            return typeof chart === 'string' && chart.startsWith('data:image');
-          });
+      // Charts come back as cacheable /api/charts/{hash}.webp URLs
+      const chartSrc = (chart) => (chart.startsWith('/api/charts/') ? `${API_URL}${chart}` : chart);
+      const isChart = (chart) => typeof chart === 'string' && (chart.startsWith('data:image') || chart.startsWith('/api/charts/'));
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      let text = "";
+      // Indexed by the chart's position among the answer's chart specs, not by arrival order
+      const charts = [];
+      const shownCharts = () => charts.filter(Boolean);
+
+      const handleEvent = (event, data) => {
+        if (event === "stage") {
+          setStage(data.stage);
+        } else if (event === "text") {
+          text += data.delta;
+          setLlmResponse({ text_answer: text, charts: shownCharts() });
+        } else if (event === "chart") {
+          if (isChart(data.image)) {
+            charts[data.index] = chartSrc(data.image);
+            setLlmResponse({ text_answer: text, charts: shownCharts() });
+          }
+        } else if (event === "done") {
+          console.log('Backend response:', data);
+          if (data.error) {
+            setLlmResponse(null);
+            setError(data.error);
+          } else {
+            const processedData = { ...data };
+            if (processedData.charts && processedData.charts.length > 0) {
+              processedData.charts = processedData.charts.filter(isChart).map(chartSrc);
+            }
+            setLlmResponse(processedData);
+          }
+        }
+      };
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split("\n\n");
+        buffer = messages.pop();
+        for (const message of messages) {
+          const lines = message.split("\n");
+          const eventLine = lines.find(line => line.startsWith("event: "));
+          const dataLine = lines.find(line => line.startsWith("data: "));
+          if (eventLine && dataLine) {
+            handleEvent(eventLine.slice(7), JSON.parse(dataLine.slice(6)));
+          }
         }
-        setLlmResponse(processedData);
       }
 
     } catch (e) {
@@ -383,14 +428,14 @@ function StateOfEnterprise() {
             maxWidth: '1000px',
             margin: '0 auto'
           }}>
-            {isLoading && (
+            {isLoading && !llmResponse && (
               <div style={{ textAlign: 'center', padding: '40px' }}>
                 <div style={{ 
                   fontSize: '18px', 
                   color: '#6f42c1',
                   marginBottom: '10px'
                 }}>
-                  Generating insights, please wait...
+                  {STAGE_MESSAGES[stage] || "Generating insights, please wait..."}
                 </div>
               </div>
             )}